@@ -0,0 +1,117 @@
+import os
+import shutil
+import subprocess
+import tarfile
+import threading
+import time
+import zipfile
+try: import zstandard
+except ImportError: zstandard = None # optional, `pip install zstandard` for tar.zst archives
+
+"""
+Streaming archive export of a pull
+
+Every student's resolved commit is streamed out of `git archive` straight into one archive per assignment
+(`<assignment>-<timestamp>.<format>` in the pull folder), so no working tree is written to disk. Files are copied
+member by member in fixed-size chunks, so memory stays bounded no matter how large a repository is.
+"""
+
+ARCHIVE_FORMATS = ['tar.zst', 'tar.gz', 'zip']
+CHUNK_SIZE = 1024 * 1024
+
+def get_archive_pathspecs(paths:list) -> list:
+    """Gets the `git archive` pathspecs of the graded paths of an assignment (glob patterns, see `paths` in config.yml)
+    """
+    return [f":(glob){path.strip().strip('/')}" for path in paths or []]
+
+
+class PullArchive:
+    def __init__(self, base_path:str, archive_format:str):
+        """Archive that the repositories of a pull are streamed into
+
+        Args:
+            base_path (str): path of the archive without the extension
+            archive_format (str): one of ARCHIVE_FORMATS. tar.zst falls back to tar.gz when zstandard is not installed
+        """
+        if archive_format not in ARCHIVE_FORMATS: raise ValueError(f"Unknown archive format `{archive_format}` (use one of {', '.join(ARCHIVE_FORMATS)})")
+        self.fallback = archive_format == 'tar.zst' and zstandard is None
+        self.format = 'tar.gz' if self.fallback else archive_format
+        self.path = f"{base_path}.{self.format}"
+        self.repositories = 0
+        self.__lock = threading.Lock() # members of one repository are written at a time
+        self.__file = open(self.path, 'wb')
+        self.__compressor = None
+        if self.format == 'zip':
+            self.__archive = zipfile.ZipFile(self.__file, 'w', compression=zipfile.ZIP_DEFLATED, allowZip64=True)
+        elif self.format == 'tar.zst':
+            self.__compressor = zstandard.ZstdCompressor().stream_writer(self.__file, closefd=False)
+            self.__archive = tarfile.open(fileobj=self.__compressor, mode='w|', format=tarfile.PAX_FORMAT)
+        else:
+            self.__archive = tarfile.open(fileobj=self.__file, mode='w|gz', format=tarfile.PAX_FORMAT)
+
+    def add_repository(self, prefix:str, repo_path:str, revision:str='HEAD', paths:list=None) -> int:
+        """Streams a commit of a repository into the archive (`git archive`)
+
+        Args:
+            prefix (str): folder of the repository inside the archive (i.e. `<assignment>-<student>`)
+            repo_path (str): path of the (bare) repository
+            revision (str): commit to export
+            paths (list): only export these graded paths (glob patterns)
+
+        Raises:
+            GitArchiveError: git could not archive the commit
+
+        Returns:
+            int: number of files written
+        """
+        process = subprocess.Popen(['git', 'archive', '--format=tar', revision, '--', *get_archive_pathspecs(paths)], cwd=repo_path,
+                                   stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        files = 0
+        try:
+            with self.__lock, tarfile.open(fileobj=process.stdout, mode='r|') as source:
+                for member in source:
+                    member.name = f"{prefix}/{member.name}"
+                    self.__add_member(member, source.extractfile(member) if member.isfile() else None)
+                    files += member.isfile()
+        except tarfile.ReadError: pass # empty output, git failed (the error is raised below)
+        finally:
+            process.stdout.close()
+            stderr = process.stderr.read().decode(errors='replace')
+            returncode = process.wait()
+        if returncode != 0: raise GitArchiveError(stderr)
+        self.repositories += 1
+        return files
+
+    def add_file(self, arcname:str, file_path:str):
+        """Adds a file from disk to the archive (i.e. the README.md log of the pull)
+        """
+        with self.__lock:
+            if self.format == 'zip': self.__archive.write(file_path, arcname)
+            else: self.__archive.add(file_path, arcname)
+
+    def __add_member(self, member:tarfile.TarInfo, contents):
+        if self.format != 'zip':
+            self.__archive.addfile(member, contents)
+            return
+        if member.isdir(): return # folders are implied by the paths of their files
+        info = zipfile.ZipInfo(member.name, time.localtime(member.mtime)[:6])
+        info.external_attr = (member.mode & 0xFFFF) << 16
+        info.compress_type = zipfile.ZIP_DEFLATED
+        with self.__archive.open(info, 'w', force_zip64=True) as destination:
+            if member.issym(): destination.write(member.linkname.encode()) # zip has no portable links, keep the target as text
+            elif contents: shutil.copyfileobj(contents, destination, CHUNK_SIZE)
+
+    def close(self):
+        with self.__lock:
+            self.__archive.close()
+            if self.__compressor: self.__compressor.close()
+            self.__file.close()
+
+    def get_size(self) -> int:
+        return os.path.getsize(self.path)
+
+
+class GitArchiveError(Exception):
+    def __init__(self, stderr:str):
+        super().__init__(stderr)
+        self.stderr = stderr
@@ -0,0 +1,105 @@
+import asyncio
+import os
+import repo_utils
+
+"""
+Git engine built on asyncio subprocesses
+
+Every git command runs as a coroutine, so a single thread can drive hundreds of transfers at the same time.
+stderr is read line by line while the command runs and classified with the same error types as `repo_utils.parse_git_stderr`.
+"""
+
+class GitResult:
+    def __init__(self, args:tuple, returncode:int, stdout:str, stderr_dict:dict):
+        """Result of a git command
+
+        Args:
+            args (tuple): arguments passed to git
+            returncode (int): exit code of git
+            stdout (str): stdout of git
+            stderr_dict (dict): the full `stderr` and the first message of each type of error (see repo_utils.parse_git_stderr)
+        """
+        self.args = args
+        self.returncode = returncode
+        self.stdout = stdout
+        self.stderr_dict = stderr_dict
+
+    @property
+    def ok(self) -> bool:
+        return self.returncode == 0
+
+    @property
+    def stderr(self) -> str:
+        return self.stderr_dict['stderr']
+
+    def __repr__(self):
+        return f"GitResult(args={self.args}, returncode={self.returncode})"
+
+
+class AsyncGitEngine:
+    def __init__(self, max_concurrent:int, timeout:float=None):
+        """Runs git commands as asyncio subprocesses
+
+        Args:
+            max_concurrent (int): maximum number of git processes running at the same time
+            timeout (float): seconds before a git process is killed (no timeout by default)
+        """
+        self.__max_concurrent = max(1, int(max_concurrent))
+        self.__semaphore = None # created lazily so it belongs to the running event loop
+        self.__timeout = timeout
+        self.__env = {**os.environ, 'GIT_TERMINAL_PROMPT': '0'} # never block on a credential prompt
+
+    async def run(self, *args, cwd:str=None) -> GitResult:
+        """Runs a git command
+
+        Args:
+            *args: arguments passed to git
+            cwd (str): working directory of the command
+
+        Returns:
+            GitResult: result of the command (never raises on a git error)
+        """
+        if self.__semaphore is None: self.__semaphore = asyncio.Semaphore(self.__max_concurrent)
+        async with self.__semaphore:
+            process = await asyncio.create_subprocess_exec('git', *args, cwd=cwd, env=self.__env, stdin=asyncio.subprocess.DEVNULL,
+                                                           stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE)
+            stderr_lines = []
+            stderr_dict = dict()
+
+            async def read_stderr():
+                async for raw_line in process.stderr:
+                    line = raw_line.decode(errors='replace')
+                    stderr_lines.append(line)
+                    repo_utils.classify_git_stderr_line(line, stderr_dict)
+
+            try:
+                stdout, _ = await asyncio.wait_for(asyncio.gather(process.stdout.read(), read_stderr()), self.__timeout)
+            except asyncio.TimeoutError:
+                process.kill()
+                await process.wait()
+                stderr_lines.append(f"fatal: git {args[0]} timed out after {self.__timeout}s\n")
+                repo_utils.classify_git_stderr_line(stderr_lines[-1], stderr_dict)
+                stdout = b''
+            returncode = await process.wait()
+
+        stderr_dict['stderr'] = ''.join(stderr_lines)
+        return GitResult(args, returncode, stdout.decode(errors='replace'), stderr_dict)
+
+    async def clone(self, clone_url:str, clone_path:str, *options) -> GitResult:
+        """Clones a repository (`git clone [options] <url> <path>`)
+        """
+        return await self.run('clone', *options, '--', clone_url, clone_path)
+
+    async def fetch(self, repo_path:str, *options) -> GitResult:
+        """Fetches into a repository (`git fetch [options]`)
+        """
+        return await self.run('fetch', *options, cwd=repo_path)
+
+    async def rev_parse(self, repo_path:str, revision:str='HEAD') -> str:
+        """Resolves a revision to a commit hash
+
+        Returns:
+            str: commit hash, or None if the revision does not exist (i.e. empty repository)
+        """
+        result = await self.run('rev-parse', '--verify', '--quiet', f"{revision}^{{commit}}", cwd=repo_path)
+        return result.stdout.strip() if result.ok else None
@@ -0,0 +1,13 @@
+"""
+Reproducible benchmarks of the clone pipeline
+
+- synthetic_org: generates a local GitHub-Classroom-like organization (bare repositories + roster csv)
+- run_pipeline: runs the real cloneRepos pipeline against the synthetic organization over file:// urls
+- submission_memory, sparse_checkout: focused benchmarks of a single optimization
+- fault_server, clone_faults: local git server that injects failures, and a check of the retry engine against it
+- github_stub, api_discovery: local stub of the GitHub API, and a check of the API client (pagination, ETag cache, roster merge) against it
+- watch_webhook: check of the watcher against signed push webhooks and unreachable repositories
+- startup: import time of cloneRepos (lazy and eager pull modules), yaml loading with and without libyaml, and the cached token check
+
+Run from the repository root, i.e. `py benchmarks/run_pipeline.py --students 50 300 1000`
+"""
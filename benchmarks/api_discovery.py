@@ -0,0 +1,116 @@
+import argparse
+import csv
+import os
+import shutil
+import sys
+import tempfile
+import time
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from benchmarks.github_stub import GitHubStubServer
+
+"""
+Discovers the repositories of an assignment through the GitHub API stub and checks the API client
+
+    cold        the first discovery downloads every page, the pages after the first one at the same time
+    warm        repeating it only sends conditional requests, answered with 304 Not Modified (no rate limit used)
+    merge       students missing from the roster are added by their git identifier, the template and the repositories of
+                an assignment that extends the name of this one (`unit03-part2-<identifier>`) are left out
+
+Exits with 1 when a check fails.
+
+Usage:
+    py benchmarks/api_discovery.py [--students N] [--other-repositories N] [--latency SECONDS]
+"""
+
+def create_organization(students:int, other_repositories:int, assignment:str) -> tuple:
+    """Generates the repositories of a stub organization (the assignment, its template, repositories of other assignments and of
+    an assignment whose name starts with the name of this one)
+
+    Returns:
+        tuple: repositories (list of dict) and git identifiers of the students of the assignment
+    """
+    identifiers = [f"student{i:04d}" for i in range(students)]
+    repositories = [{'name': f"{assignment}-{identifier}", 'pushed_at': f"2024-03-{1 + i % 28:02d}T12:00:00Z"} for i, identifier in enumerate(identifiers)]
+    repositories.append({'name': f"{assignment}-template", 'is_template': True})
+    repositories += [{'name': f"other{i % 7}-student{i:04d}", 'pushed_at': "2024-01-01T12:00:00Z"} for i in range(other_repositories)]
+    repositories += [{'name': f"{assignment}-part2-{identifier}", 'pushed_at': "2024-04-01T12:00:00Z"} for identifier in identifiers[::10]]
+    return repositories, identifiers
+
+def run(args, work_path:str) -> bool:
+    """Runs the discoveries and checks the results
+
+    Returns:
+        bool: whether every check passed
+    """
+    import cloneRepos
+    import github_api
+
+    assignment = "unit03"
+    other_assignments = [f"{assignment}-part2"] # shares the prefix of the assignment
+    repositories, identifiers = create_organization(args.students, args.other_repositories, assignment)
+    server = GitHubStubServer({'bench-org': repositories}, latency=args.latency)
+    server.start()
+
+    # the roster misses a few students, who are only found in the organization
+    roster_path = f"{work_path}/roster.csv"
+    rostered = identifiers[:-args.unrostered]
+    with open(roster_path, 'w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(['identifier', 'github_username', 'github_id', 'name'])
+        for i, identifier in enumerate(rostered): writer.writerow([f"Last{i}, First", identifier, i, ''])
+
+    cloneRepos.CONFIG = {'github_classic_token': server.token, 'github_api_url': server.get_api_url(), 'github_cache_path': f"{work_path}/github_cache.db",
+                         'assignments': {name: None for name in other_assignments}}
+    organization = {'name': "Bench Org", 'identifier': 'bench-org', 'roster_path': roster_path, 'discover_repositories': True}
+    try:
+        timings = dict()
+        for name, max_workers in (('sequential', 1), ('cold', github_api.DEFAULT_MAX_WORKERS)):
+            cache = github_api.ResponseCache(f"{work_path}/{name}.db")
+            client = github_api.GitHubClient(server.token, server.get_api_url(), cache, max_workers)
+            started = time.perf_counter()
+            discovered = client.discover_students('bench-org', assignment, other_assignments)
+            timings[name] = time.perf_counter() - started
+            client.close()
+        requests_before, not_modified_before = server.requests, server.not_modified
+        client = github_api.GitHubClient(server.token, server.get_api_url(), cache)
+        started = time.perf_counter()
+        warm = client.discover_students('bench-org', assignment, other_assignments)
+        timings['warm'] = time.perf_counter() - started
+        warm_requests, warm_not_modified = server.requests - requests_before, server.not_modified - not_modified_before
+        client.close()
+        cache.close()
+        students = cloneRepos.get_students(organization, assignment, dict())
+    finally: server.stop()
+
+    pages = -(-len(repositories) // github_api.PER_PAGE)
+    checks = [
+        ("every student repository is discovered, the template and the other assignment are left out", discovered == sorted(identifiers)),
+        ("the warm discovery finds the same repositories", warm == discovered),
+        ("the warm discovery only sends conditional requests answered with 304", warm_requests == pages and warm_not_modified == pages),
+        ("students missing from the roster are added by their git identifier", all(students.get(identifier) == identifier for identifier in identifiers[-args.unrostered:])),
+        ("rostered students keep their name", all(students[identifier] == f"Last{i}-First" for i, identifier in enumerate(rostered))),
+        ("the configured assignment that extends the name adds no students", not any(identifier.startswith('part2-') for identifier in students)),
+    ]
+    print(f"\n{len(repositories)} repositories ({pages} pages, {args.latency * 1000:.0f}ms latency): "
+          f"sequential {timings['sequential']:.2f}s, concurrent {timings['cold']:.2f}s, warm {timings['warm']:.2f}s "
+          f"({warm_not_modified}/{warm_requests} not modified, {server.remaining} requests of rate limit left)")
+    for description, passed in checks: print(f"\t{'PASS' if passed else 'FAIL'} {description}")
+    return all(passed for _, passed in checks)
+
+def main():
+    parser = argparse.ArgumentParser(description="Checks the GitHub API client against a local stub of the API")
+    parser.add_argument('--students', type=int, default=600)
+    parser.add_argument('--other-repositories', type=int, default=1200, help="repositories of other assignments in the organization")
+    parser.add_argument('--unrostered', type=int, default=5, help="students of the assignment missing from the roster")
+    parser.add_argument('--latency', type=float, default=0.05, help="seconds every API response is delayed by")
+    args = parser.parse_args()
+    if args.students <= args.unrostered: parser.error("--students must be larger than --unrostered")
+
+    work_path = tempfile.mkdtemp(prefix="api-discovery-")
+    try: passed = run(args, work_path)
+    finally: shutil.rmtree(work_path, ignore_errors=True)
+    sys.exit(0 if passed else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import yaml
+from benchmarks import synthetic_org
+from benchmarks.fault_server import FaultInjectingGitServer
+
+"""
+Pulls a synthetic organization through the fault-injecting git server and checks how the retry engine handles every failure
+
+    transient   503/500 errors and dropped connections on the first attempts: cloned after retries
+    throttled   secondary rate limits on many repositories at once: the circuit breaker pauses the clones, then they succeed
+    permanent   `Repository not found.` on every attempt: not retried, reported as not cloned
+
+Exits with 1 when a repository does not end up as expected.
+
+Usage:
+    py benchmarks/clone_faults.py [--students N] [--engine gitpython|async] [--keep]
+"""
+
+def get_fault_schedule(assignment:str, students:list, max_retries:int) -> dict:
+    """Spreads the faults over the students (the first ones are transient, the next ones throttled and the last one permanent)
+
+    Returns:
+        dict: `faults` (repository name -> faults), `cloned` and `not_cloned` (expected git identifiers)
+    """
+    transient = [['unavailable'], ['server_error', 'reset'], ['reset']]
+    faults = dict()
+    for i, identifier in enumerate(students[:len(transient)]): faults[f"{assignment}-{identifier}"] = transient[i]
+    for identifier in students[len(transient):len(transient) + 6]: faults[f"{assignment}-{identifier}"] = ['rate_limit']
+    faults[f"{assignment}-{students[-1]}"] = ['not_found'] * (max_retries + 1)
+    return {'faults': faults, 'cloned': set(students[:-1]), 'not_cloned': {students[-1]}}
+
+def run(args, work_path:str) -> bool:
+    """Generates the organization, pulls it through the fault-injecting server and checks the results
+
+    Returns:
+        bool: whether every repository ended up as expected
+    """
+    import cloneRepos
+    import repo_utils
+    import submission_store
+
+    org = synthetic_org.create_org(f"{work_path}/org", args.students, seed=args.seed)
+    schedule = get_fault_schedule(org['assignment'], org['students'], args.retries)
+    server = FaultInjectingGitServer(f"{work_path}/org", schedule['faults'])
+    server.start()
+
+    config = {
+        'github_classic_token': "faults",
+        'clone_output_path': f"{work_path}/pulls",
+        'log_submissions': True,
+        'max_concurrent_clones': args.max_concurrent_clones,
+        'clone_url_template': server.get_url_template(),
+        'clone_retries': args.retries,
+        'clone_retry_delay': 0.2,
+        'circuit_breaker_threshold': 3,
+        'circuit_breaker_cooldown': 1,
+        'organizations': [{'name': org['organization'], 'identifier': org['organization'], 'roster_path': org['roster_path']}],
+    }
+    with open(f"{work_path}/config.yml", 'w') as file: yaml.safe_dump(config, file)
+    with open(f"{work_path}/submissions.yml", 'w') as file: file.write("---\norganizations:\n")
+    repo_utils.SUBMISSION_LOGS = f"{work_path}/submissions.yml"
+    submission_store.SUBMISSION_DB = f"{work_path}/submissions.db"
+    cloneRepos.CONFIG_PATH = f"{work_path}/config.yml"
+    cloneRepos.is_token_valid = lambda token: True
+    cloneRepos.clear_terminal = lambda: None
+
+    started = time.perf_counter()
+    try: pull = cloneRepos.run_pull(org['organization'], org['assignment'], args.engine)
+    finally: server.stop()
+    wall_time = time.perf_counter() - started
+
+    not_cloned = set(pull.students_not_cloned)
+    cloned = {thread.get_identifier() for thread in pull.threads} - not_cloned
+    checks = [
+        ("every transient and throttled failure is cloned after retries", cloned == schedule['cloned']),
+        ("permanent failures are not cloned", not_cloned == schedule['not_cloned']),
+        ("permanent failures are not retried", all(server.attempts[f"{org['assignment']}-{identifier}"] == 1 for identifier in schedule['not_cloned'])),
+        ("the circuit breaker opened", pull.retry_policy.breaker.trips > 0),
+    ]
+    print(f"\n{args.students} students in {wall_time:.2f}s ({args.engine} engine): injected {server.injected}, "
+          f"retried {len(pull.students_retried)} clone(s), circuit breaker opened {pull.retry_policy.breaker.trips} time(s)")
+    for description, passed in checks: print(f"\t{'PASS' if passed else 'FAIL'} {description}")
+    return all(passed for _, passed in checks)
+
+def main():
+    parser = argparse.ArgumentParser(description="Checks the retry engine against a fault-injecting git server")
+    parser.add_argument('--students', type=int, default=20)
+    parser.add_argument('--engine', choices=['gitpython', 'async'], default='gitpython')
+    parser.add_argument('--max-concurrent-clones', type=int, default=4)
+    parser.add_argument('--retries', type=int, default=3, help="clone_retries of the pull")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--keep', action='store_true', help="keep the generated organization and pull")
+    args = parser.parse_args()
+    if args.students < 10: parser.error("--students must be at least 10 to spread the faults")
+
+    work_path = tempfile.mkdtemp(prefix="clone-faults-")
+    try: passed = run(args, work_path)
+    finally:
+        if args.keep: print(f"Kept {work_path}")
+        else: shutil.rmtree(work_path, ignore_errors=True)
+    sys.exit(0 if passed else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import os
+import subprocess
+import threading
+
+"""
+Local stand-in for GitHub's smart HTTP git server that injects failures
+
+Repositories are served from a folder of bare repositories through `git http-backend`. Faults are scheduled per
+repository: every clone attempt (the `info/refs` request that starts it) takes the next fault of the repository's list,
+and once the list is empty the repository is served normally.
+
+    unavailable     503 Service Unavailable
+    server_error    500 Internal Server Error
+    rate_limit      403 with GitHub's secondary rate limit message
+    not_found       404 with GitHub's `Repository not found.` message (add it once per attempt to make it permanent)
+    reset           the connection is closed without a response
+
+Usage:
+    server = FaultInjectingGitServer(org_path, {'unit03-student0001': ['unavailable', 'reset']})
+    server.start()
+    ... clone from server.get_url(organization, repository) ...
+    server.stop()
+"""
+
+FAULT_RESPONSES = {
+    'unavailable': (503, "Service Unavailable"),
+    'server_error': (500, "Internal Server Error"),
+    'rate_limit': (403, "You have exceeded a secondary rate limit. Please wait a few minutes before you try again."),
+    'not_found': (404, "Repository not found."),
+}
+
+class FaultInjectingGitServer:
+    def __init__(self, root_path:str, faults:dict=None, port:int=0):
+        """Git server over http://127.0.0.1
+
+        Args:
+            root_path (str): folder of the bare repositories (`<root_path>/<organization>/<repository>.git`)
+            faults (dict): repository name -> list of faults, one per clone attempt (see FAULT_RESPONSES and `reset`)
+            port (int): port to listen on (0 picks a free port)
+        """
+        self.root_path = os.path.abspath(root_path)
+        self.faults = {repository: list(schedule) for repository, schedule in (faults or dict()).items()}
+        self.attempts = dict() # repository name -> number of clone attempts
+        self.injected = dict() # fault -> number of times it was injected
+        self.lock = threading.Lock()
+        self.__server = ThreadingHTTPServer(('127.0.0.1', port), GitRequestHandler)
+        self.__server.git_server = self
+        self.__server.daemon_threads = True
+
+    @property
+    def port(self) -> int:
+        return self.__server.server_address[1]
+
+    def get_url_template(self) -> str:
+        """Gets the `clone_url_template` of the config file that clones from this server
+        """
+        return f"http://127.0.0.1:{self.port}/{{organization}}/{{repository}}.git"
+
+    def get_url(self, organization:str, repository:str) -> str:
+        return self.get_url_template().format(organization=organization, repository=repository)
+
+    def next_fault(self, repository:str) -> str:
+        """Counts a clone attempt and gets the fault to inject into it (None to serve the repository)
+        """
+        with self.lock:
+            self.attempts[repository] = self.attempts.get(repository, 0) + 1
+            schedule = self.faults.get(repository)
+            fault = schedule.pop(0) if schedule else None
+            if fault: self.injected[fault] = self.injected.get(fault, 0) + 1
+            return fault
+
+    def start(self):
+        threading.Thread(target=self.__server.serve_forever, daemon=True).start()
+
+    def stop(self):
+        self.__server.shutdown()
+        self.__server.server_close()
+
+
+class GitRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        path, _, query = self.path.partition('?')
+        if path.endswith('/info/refs'):
+            repository = os.path.basename(path[:-len('/info/refs')]).removesuffix('.git')
+            fault = self.server.git_server.next_fault(repository)
+            if fault == 'reset':
+                self.close_connection = True
+                return
+            if fault: return self.send_fault(*FAULT_RESPONSES[fault])
+        self.run_backend(path, query, b'')
+
+    def do_POST(self):
+        path, _, query = self.path.partition('?')
+        self.run_backend(path, query, self.read_body())
+
+    def read_body(self) -> bytes:
+        if self.headers.get('Transfer-Encoding', '').lower() != 'chunked': return self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        body = bytearray()
+        while True:
+            size = int(self.rfile.readline().split(b';')[0], 16)
+            if not size:
+                self.rfile.readline()
+                return bytes(body)
+            body += self.rfile.read(size)
+            self.rfile.readline()
+
+    def send_fault(self, status:int, message:str):
+        # git shows text/plain bodies of failed requests as `remote: <message>`, like GitHub's messages
+        body = f"{message}\n".encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/plain')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def run_backend(self, path:str, query:str, body:bytes):
+        """Serves the request with `git http-backend` (CGI)
+        """
+        environment = {**os.environ, 'GIT_PROJECT_ROOT': self.server.git_server.root_path, 'GIT_HTTP_EXPORT_ALL': '1',
+                       'REQUEST_METHOD': self.command, 'PATH_INFO': path, 'QUERY_STRING': query, 'REMOTE_ADDR': self.client_address[0],
+                       'CONTENT_TYPE': self.headers.get('Content-Type', ''), 'CONTENT_LENGTH': str(len(body)),
+                       'HTTP_CONTENT_ENCODING': self.headers.get('Content-Encoding', ''), 'GIT_PROTOCOL': self.headers.get('Git-Protocol', '')}
+        result = subprocess.run(['git', 'http-backend'], input=body, env=environment, capture_output=True)
+        headers, _, content = result.stdout.partition(b'\r\n\r\n')
+        status = 200
+        header_lines = []
+        for line in headers.decode(errors='replace').split('\r\n'):
+            name, _, value = line.partition(':')
+            if name.lower() == 'status': status = int(value.split()[0])
+            elif name: header_lines.append((name, value.strip()))
+        self.send_response(status)
+        for name, value in header_lines: self.send_header(name, value)
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args):
+        pass
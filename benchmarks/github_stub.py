@@ -0,0 +1,113 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+import hashlib
+import json
+import threading
+import time
+
+"""
+Local stand-in for the parts of the GitHub REST API used by the scripts
+
+    GET /user                   200 for the stub's token, 401 otherwise
+    GET /orgs/<org>/repos       repositories of an organization, paginated (`page`, `per_page`, `Link` header), sorted by
+                                `full_name` or `pushed` (`direction`), with an ETag and 304 Not Modified for `If-None-Match`
+
+Every response has rate limit headers, and 304 responses do not count against the limit (like GitHub).
+
+Usage:
+    server = GitHubStubServer({'bench-org': [{'name': 'unit03-student0001', 'pushed_at': '2024-03-01T12:00:00Z'}]})
+    server.start()
+    ... GitHubClient(server.token, server.get_api_url()) ...
+    server.stop()
+"""
+
+class GitHubStubServer:
+    def __init__(self, organizations:dict, token:str="stub-token", latency:float=0, rate_limit:int=5000, port:int=0):
+        """GitHub API over http://127.0.0.1
+
+        Args:
+            organizations (dict): organization identifier -> list of repositories (dict with `name`, and optionally `pushed_at` and `is_template`)
+            token (str): the only accepted token
+            latency (float): seconds every response is delayed by (to compare sequential and concurrent requests)
+            rate_limit (int): requests allowed before answering 403
+            port (int): port to listen on (0 picks a free port)
+        """
+        self.organizations = organizations
+        self.token = token
+        self.latency = latency
+        self.rate_limit = rate_limit
+        self.requests = 0 # requests received
+        self.not_modified = 0 # requests answered with 304
+        self.lock = threading.Lock()
+        self.__server = ThreadingHTTPServer(('127.0.0.1', port), GitHubRequestHandler)
+        self.__server.stub = self
+        self.__server.daemon_threads = True
+
+    @property
+    def port(self) -> int:
+        return self.__server.server_address[1]
+
+    @property
+    def remaining(self) -> int:
+        return self.rate_limit - (self.requests - self.not_modified)
+
+    def get_api_url(self) -> str:
+        """Gets the `github_api_url` of the config file that uses this server
+        """
+        return f"http://127.0.0.1:{self.port}"
+
+    def start(self):
+        threading.Thread(target=self.__server.serve_forever, daemon=True).start()
+
+    def stop(self):
+        self.__server.shutdown()
+        self.__server.server_close()
+
+
+class GitHubRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        stub = self.server.stub
+        if stub.latency: time.sleep(stub.latency)
+        with stub.lock: stub.requests += 1
+        if self.headers.get('Authorization') != f"Bearer {stub.token}": return self.send_json(401, {'message': "Bad credentials"})
+        if stub.remaining < 0: return self.send_json(403, {'message': "API rate limit exceeded"})
+
+        url = urlparse(self.path)
+        parts = url.path.strip('/').split('/')
+        if parts == ['user']: return self.send_json(200, {'login': 'stub'})
+        if len(parts) != 3 or parts[0] != 'orgs' or parts[2] != 'repos' or parts[1] not in stub.organizations: return self.send_json(404, {'message': "Not Found"})
+
+        query = {key: values[0] for key, values in parse_qs(url.query).items()}
+        repositories = list(stub.organizations[parts[1]])
+        if query.get('sort') == 'pushed': repositories.sort(key=lambda repository: repository.get('pushed_at') or '', reverse=query.get('direction', 'desc') == 'desc')
+        else: repositories.sort(key=lambda repository: repository['name'].lower(), reverse=query.get('direction') == 'desc')
+        per_page = min(100, int(query.get('per_page', 30)))
+        page = int(query.get('page', 1))
+        pages = max(1, -(-len(repositories) // per_page))
+        body = [{'name': repository['name'], 'full_name': f"{parts[1]}/{repository['name']}", 'pushed_at': repository.get('pushed_at'),
+                 'is_template': repository.get('is_template', False)} for repository in repositories[(page - 1) * per_page:page * per_page]]
+        links = [f'<{self.get_page_url(url, query, number)}>; rel="{rel}"' for rel, number in (('next', page + 1), ('last', pages)) if page < pages]
+        self.send_json(200, body, {'Link': ', '.join(links)} if links else None)
+
+    def get_page_url(self, url, query:dict, page:int) -> str:
+        return f"http://{self.headers.get('Host')}{url.path}?{'&'.join(f'{key}={value}' for key, value in {**query, 'page': page}.items())}"
+
+    def send_json(self, status:int, body, headers:dict=None):
+        stub = self.server.stub
+        content = json.dumps(body).encode()
+        etag = f'"{hashlib.sha1(content).hexdigest()}"'
+        if status == 200 and self.headers.get('If-None-Match') == etag:
+            with stub.lock: stub.not_modified += 1
+            status, content = 304, b''
+        self.send_response(status)
+        self.send_header('X-RateLimit-Limit', str(stub.rate_limit))
+        self.send_header('X-RateLimit-Remaining', str(max(0, stub.remaining)))
+        if status in (200, 304): self.send_header('ETag', etag)
+        for name, value in (headers or dict()).items(): self.send_header(name, value)
+        if content: self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, format, *args):
+        pass
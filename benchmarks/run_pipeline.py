@@ -0,0 +1,170 @@
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import yaml
+from benchmarks import synthetic_org
+try: import resource
+except ImportError: resource = None # not available on Windows (peak RSS is reported as null)
+
+"""
+Runs the real cloneRepos pipeline against a synthetic organization and records how it performs
+
+For every roster size a synthetic organization is generated (see synthetic_org), then the pipeline runs in a fresh python
+process (so peak RSS is not shared between runs) with `clone_url_template` pointing to the bare repositories over file://
+and `is_token_valid` stubbed. Results are written as json to `benchmarks/results/<timestamp>.json` so runs can be compared over time:
+
+    wall_time       seconds spent in cloneRepos.run_pull
+    peak_rss        peak resident memory of the pipeline process (bytes, git subprocesses not included)
+    bytes_written   size of the pull folder (bytes)
+    clones_per_sec  cloned repositories per second of wall time
+    submissions_load_time / submissions_save_time   seconds spent reading and writing submissions.yml
+
+Usage:
+    py benchmarks/run_pipeline.py [--students 50 300 1000] [--engine gitpython|async] [--store yaml|sqlite] [--history-depth N] ...
+"""
+
+RESULTS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+DEFAULT_STUDENTS = [50, 300, 1000]
+
+def get_peak_rss() -> int:
+    """Gets the peak resident memory of this process
+
+    Returns:
+        int: peak RSS (bytes), None when the platform does not support it
+    """
+    if resource is None: return None
+    unit = 1 if sys.platform == 'darwin' else 1024 # ru_maxrss is in bytes on macOS and kilobytes on linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * unit
+
+def run_worker(work_path:str, organization:str, assignment:str, engine:str) -> dict:
+    """Runs one pull of the pipeline in this process (see `benchmark`)
+
+    Returns:
+        dict: measurements of the pull
+    """
+    import cloneRepos
+    import repo_utils
+    import submission_store
+
+    repo_utils.SUBMISSION_LOGS = f"{work_path}/submissions.yml"
+    submission_store.SUBMISSION_DB = f"{work_path}/submissions.db"
+    cloneRepos.CONFIG_PATH = f"{work_path}/config.yml"
+    cloneRepos.is_token_valid = lambda token: True
+    cloneRepos.clear_terminal = lambda: None
+
+    # time every read and write of submissions.yml
+    timings = {'load': 0.0, 'save': 0.0}
+    def timed(function, key):
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try: return function(*args, **kwargs)
+            finally: timings[key] += time.perf_counter() - started
+        return wrapper
+    repo_utils.load_submissions = timed(repo_utils.load_submissions, 'load')
+    repo_utils.save_submissions = timed(repo_utils.save_submissions, 'save')
+
+    started = time.perf_counter()
+    pull = cloneRepos.run_pull(organization, assignment, engine)
+    wall_time = time.perf_counter() - started
+
+    cloned = len(pull.threads) - len(pull.students_not_cloned)
+    return {
+        'wall_time': wall_time,
+        'peak_rss': get_peak_rss(),
+        'bytes_written': repo_utils.get_directory_size(pull.clone_path),
+        'cloned': cloned,
+        'not_cloned': len(pull.students_not_cloned),
+        'no_submissions': len(pull.students_no_submissions),
+        'clones_per_sec': cloned / wall_time if wall_time else 0,
+        'submissions_load_time': timings['load'],
+        'submissions_save_time': timings['save'],
+    }
+
+def benchmark(num_students:int, args, work_path:str) -> dict:
+    """Generates a synthetic organization and pulls it with the pipeline in a separate python process
+
+    Args:
+        num_students (int): number of student repositories
+        args (Namespace): command line arguments
+        work_path (str): scratch folder (organization, pull output, config and submission logs)
+
+    Returns:
+        dict: settings and measurements of the run
+    """
+    started = time.perf_counter()
+    org = synthetic_org.create_org(f"{work_path}/org", num_students, history_depth=args.history_depth, file_size=args.file_size,
+                                   template_files=args.template_files, seed=args.seed)
+    generate_time = time.perf_counter() - started
+
+    config = {
+        'github_classic_token': "benchmark",
+        'clone_output_path': f"{work_path}/pulls",
+        'log_submissions': True,
+        'max_concurrent_clones': args.max_concurrent_clones,
+        'clone_url_template': f"file://{os.path.abspath(work_path)}/org/{{organization}}/{{repository}}.git",
+        'submission_store': args.store,
+        'submission_db_path': f"{work_path}/submissions.db",
+        'export_submissions_yaml': True,
+        'organizations': [{'name': org['organization'], 'identifier': org['organization'], 'roster_path': org['roster_path']}],
+        'assignments': {org['assignment']: {'template': f"{org['organization']}/{org['assignment']}-template"}} if args.template else None,
+    }
+    with open(f"{work_path}/config.yml", 'w') as file: yaml.safe_dump(config, file)
+    with open(f"{work_path}/submissions.yml", 'w') as file: file.write("---\norganizations:\n")
+
+    worker = subprocess.run([sys.executable, os.path.abspath(__file__), '--worker', work_path, org['organization'], org['assignment'], '--engine', args.engine],
+                            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))), capture_output=True, text=True)
+    if worker.returncode != 0: raise RuntimeError(f"The pipeline failed for {num_students} students:\n{worker.stderr}")
+    measurements = json.loads(worker.stdout.strip().splitlines()[-1])
+    return {'students': num_students, 'generate_time': generate_time, **measurements}
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks the clone pipeline against a synthetic organization")
+    parser.add_argument('--students', type=int, nargs='+', default=DEFAULT_STUDENTS, help=f"roster sizes to benchmark (default: {' '.join(map(str, DEFAULT_STUDENTS))})")
+    parser.add_argument('--engine', choices=['gitpython', 'async'], default='gitpython')
+    parser.add_argument('--store', choices=['yaml', 'sqlite'], default='yaml', help="submission store (default: yaml)")
+    parser.add_argument('--max-concurrent-clones', type=int, default=8)
+    parser.add_argument('--history-depth', type=int, default=5, help="student commits on top of the template commit")
+    parser.add_argument('--file-size', type=int, default=4096, help="size of every generated file (bytes)")
+    parser.add_argument('--template-files', type=int, default=10)
+    parser.add_argument('--template', action='store_true', help="use the assignment template as a reference object store")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="results file (default: benchmarks/results/<timestamp>.json)")
+    parser.add_argument('--keep', action='store_true', help="keep the generated organizations and pulls")
+    parser.add_argument('--worker', nargs=3, metavar=('WORK_PATH', 'ORGANIZATION', 'ASSIGNMENT'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        measurements = run_worker(*args.worker, args.engine)
+        print(json.dumps(measurements)) # read by the parent process from the last line of stdout
+        return
+
+    timestamp = time.strftime('%m-%d-%Y-%H-%M-%S')
+    settings = {key: value for key, value in vars(args).items() if key not in ('students', 'output', 'keep', 'worker')}
+    results = {'timestamp': timestamp, 'git_version': subprocess.run(['git', '--version'], capture_output=True, text=True).stdout.strip(),
+               'python_version': sys.version.split()[0], 'platform': sys.platform, 'settings': settings, 'runs': []}
+    for num_students in args.students:
+        work_path = tempfile.mkdtemp(prefix=f"bench-{num_students}-")
+        try:
+            run = benchmark(num_students, args, work_path)
+        finally:
+            if args.keep: print(f"Kept {work_path}")
+            else: shutil.rmtree(work_path, ignore_errors=True)
+        results['runs'].append(run)
+        peak_rss = f"{run['peak_rss'] / 1024 ** 2:.1f} MB" if run['peak_rss'] else "n/a"
+        print(f"{num_students:>5} students: {run['wall_time']:.2f}s, {run['clones_per_sec']:.1f} clones/s, peak RSS {peak_rss}, "
+              f"{run['bytes_written'] / 1024 ** 2:.1f} MB written, submissions.yml load {run['submissions_load_time']:.3f}s / save {run['submissions_save_time']:.3f}s")
+
+    output = args.output or f"{RESULTS_PATH}/{timestamp}.json"
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as file: json.dump(results, file, indent=2)
+    print(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
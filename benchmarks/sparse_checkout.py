@@ -0,0 +1,87 @@
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import repo_utils
+
+"""
+Compares a full clone against a blobless partial clone with a sparse checkout of the graded paths
+
+Every synthetic student repository holds a few small graded files (`src/main/java/unit03/`) next to large ungraded
+assets (`assets/`), like an assignment with bundled jars and images.
+
+Usage:
+    py benchmarks/sparse_checkout.py [--students N] [--asset-size MB] [--workers N]
+"""
+
+GRADED_PATHS = ['src/main/java/unit03/**']
+
+def git(*args, cwd:str=None):
+    subprocess.run(['git', *args], cwd=cwd, check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+def create_org(org_path:str, num_students:int, asset_size:int) -> list:
+    """Creates bare student repositories with graded sources and large ungraded assets
+
+    Returns:
+        list: paths of the bare repositories
+    """
+    work_path = f"{org_path}/.work"
+    os.makedirs(f"{work_path}/src/main/java/unit03")
+    os.makedirs(f"{work_path}/assets")
+    repositories = []
+    for i in range(num_students):
+        shutil.rmtree(f"{work_path}/.git", ignore_errors=True) # every student gets an unrelated history
+        git('init', '-q', work_path)
+        with open(f"{work_path}/src/main/java/unit03/Lab.java", 'w') as file: file.write(f"class Lab {{ int student = {i}; }}\n")
+        with open(f"{work_path}/assets/bundle.jar", 'wb') as file: file.write(os.urandom(asset_size)) # unique per student, so nothing is shared
+        git('add', '-A', cwd=work_path)
+        git('-c', 'user.name=Student', '-c', 'user.email=student@example.com', 'commit', '-q', '-m', f"student {i}", cwd=work_path)
+        repository = f"{org_path}/lab-student{i}.git"
+        git('clone', '-q', '--bare', '--no-local', work_path, repository)
+        git('config', 'uploadpack.allowFilter', 'true', cwd=repository) # let file:// clones use --filter
+        repositories.append(repository)
+    return repositories
+
+def clone_full(repository:str, clone_path:str):
+    git('clone', '-q', f"file://{repository}", clone_path)
+
+def clone_sparse(repository:str, clone_path:str):
+    git('clone', '-q', '--filter=blob:none', '--no-checkout', f"file://{repository}", clone_path)
+    git(*repo_utils.get_sparse_checkout_args(GRADED_PATHS), cwd=clone_path)
+    git('checkout', '-q', cwd=clone_path)
+
+def measure(clone, repositories:list, output_path:str, workers:int) -> tuple:
+    """Clones every repository with a clone strategy
+
+    Returns:
+        tuple: (seconds, bytes written)
+    """
+    os.makedirs(output_path)
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(lambda repository: clone(repository, f"{output_path}/{os.path.basename(repository)[:-4]}"), repositories))
+    elapsed = time.perf_counter() - started
+    return elapsed, repo_utils.get_directory_size(output_path)
+
+def main():
+    parser = argparse.ArgumentParser(description="Full clone vs. partial clone + sparse checkout")
+    parser.add_argument('--students', type=int, default=50, help="number of student repositories")
+    parser.add_argument('--asset-size', type=float, default=2, help="size of the ungraded assets of each repository (MB)")
+    parser.add_argument('--workers', type=int, default=8, help="number of concurrent clones")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_path:
+        print(f"Creating {args.students} repositories...")
+        repositories = create_org(f"{temp_path}/org", args.students, int(args.asset_size * 1024 ** 2))
+        for name, clone in (('full clone', clone_full), ('partial + sparse', clone_sparse)):
+            elapsed, size = measure(clone, repositories, f"{temp_path}/{name.replace(' ', '-')}", args.workers)
+            print(f"{name:<17}: {elapsed:6.2f}s, {size / 1024 ** 2:8.1f} MB written")
+            shutil.rmtree(f"{temp_path}/{name.replace(' ', '-')}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+import argparse
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from benchmarks.github_stub import GitHubStubServer
+
+"""
+Measures the startup of cloneRepos.py until the first prompt, and checks the fast path
+
+    imports     importing cloneRepos in a fresh interpreter, with the pull modules (GitPython, requests, asyncio) imported
+                lazily (what every run pays) and eagerly (what every run paid before)
+    yaml        loading and saving a large submissions.yml with the pure Python and the libyaml (C) loader/dumper
+    token       checking the token against a slow API: the first check waits on the API, the next ones are read from the cache
+
+Exits with 1 when a check fails.
+
+Usage:
+    py benchmarks/startup.py [--runs N] [--students N] [--assignments N] [--latency SECONDS]
+"""
+
+REPOSITORY_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PULL_MODULES = ['git', 'requests', 'asyncio', 'dateutil']
+
+def time_import(statement:str, runs:int) -> float:
+    """Times a statement in fresh interpreters (median, seconds), including the interpreter startup
+    """
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        subprocess.run([sys.executable, '-c', statement], cwd=REPOSITORY_PATH, check=True)
+        timings.append(time.perf_counter() - started)
+    return statistics.median(timings)
+
+def get_loaded_modules(statement:str) -> set:
+    """Gets the pull modules loaded after a statement in a fresh interpreter
+    """
+    code = f"{statement}\nimport sys\nprint(' '.join(name for name in {PULL_MODULES!r} if name in sys.modules))"
+    result = subprocess.run([sys.executable, '-c', code], cwd=REPOSITORY_PATH, capture_output=True, text=True, check=True)
+    return set(result.stdout.split())
+
+def create_submissions(students:int, assignments:int) -> dict:
+    """Generates submission logs in the format of `config/submissions.yml`
+    """
+    return {'organizations': {'Bench Org': {'identifier': 'bench-org', 'submission_history': {
+        f"unit{a:02d}": {'last_pulled': "03-01-2024-12-00-00", 'submissions': {
+            f"student{s:04d}": {'num_commits': s % 40, 'commit_hash': f"{s * 7919 + a:040x}", 'late_commits': 0,
+                                'tests': {'status': 'passed', 'exit_code': 0, 'commit_hash': f"{s:040x}", 'duration': 1.5}}
+            for s in range(students)}}
+        for a in range(assignments)}}}}
+
+def time_yaml(submissions:dict, work_path:str, loader, dumper) -> tuple:
+    """Times saving and loading submission logs
+
+    Returns:
+        tuple: seconds to dump and to load, and the loaded logs
+    """
+    import yaml
+    path = f"{work_path}/submissions.yml"
+    started = time.perf_counter()
+    with open(path, 'w') as file: yaml.dump(submissions, file, Dumper=dumper)
+    dumped = time.perf_counter() - started
+    started = time.perf_counter()
+    with open(path, 'r') as file: loaded = yaml.load(file, Loader=loader)
+    return dumped, time.perf_counter() - started, loaded
+
+def run(args, work_path:str) -> bool:
+    """Runs the measurements and checks the results
+
+    Returns:
+        bool: whether every check passed
+    """
+    import yaml
+    import cloneRepos
+    import repo_utils
+
+    # imports
+    lazy = time_import("import cloneRepos", args.runs)
+    eager = time_import("import cloneRepos; cloneRepos.import_pull_modules()", args.runs)
+    baseline = time_import("pass", args.runs)
+    loaded = get_loaded_modules("import cloneRepos")
+
+    # yaml
+    submissions = create_submissions(args.students, args.assignments)
+    python_dump, python_load, python_loaded = time_yaml(submissions, work_path, yaml.SafeLoader, yaml.SafeDumper)
+    c_dump, c_load, c_loaded = time_yaml(submissions, work_path, repo_utils.YAML_LOADER, repo_utils.YAML_DUMPER)
+
+    # token
+    server = GitHubStubServer(dict(), latency=args.latency)
+    server.start()
+    cloneRepos.CONFIG = {'github_classic_token': server.token, 'github_api_url': server.get_api_url(), 'github_cache_path': f"{work_path}/github_cache.db"}
+    try:
+        timings = []
+        for _ in range(3):
+            started = time.perf_counter()
+            valid = cloneRepos.is_token_valid(server.token)
+            timings.append((valid, time.perf_counter() - started))
+        requests_sent = server.requests
+        invalid = [cloneRepos.is_token_valid("wrong-token") for _ in range(2)]
+        invalid_requests = server.requests - requests_sent
+    finally: server.stop()
+
+    checks = [
+        ("importing cloneRepos does not import GitPython, requests, asyncio or dateutil", not loaded),
+        ("lazy imports start faster than eager imports", lazy < eager),
+        ("the submission logs are the same with both yaml implementations", python_loaded == c_loaded == submissions),
+        ("a valid token is only checked against the API once within the ttl", all(valid for valid, _ in timings) and requests_sent == 1),
+        ("an invalid token is never cached", invalid == [False, False] and invalid_requests == 2),
+    ]
+    students = args.students * args.assignments
+    print(f"\nimport cloneRepos: {(lazy - baseline) * 1000:.0f}ms lazy, {(eager - baseline) * 1000:.0f}ms eager (interpreter startup of {baseline * 1000:.0f}ms left out)")
+    print(f"submissions.yml ({students} submissions, {os.path.getsize(f'{work_path}/submissions.yml') / 1024 ** 2:.1f} MB, libyaml {'available' if yaml.__with_libyaml__ else 'missing'}): "
+          f"load {python_load:.2f}s -> {c_load:.2f}s, save {python_dump:.2f}s -> {c_dump:.2f}s")
+    print(f"token check ({args.latency * 1000:.0f}ms latency): {timings[0][1] * 1000:.0f}ms first, {timings[-1][1] * 1000:.1f}ms cached")
+    for description, passed in checks: print(f"\t{'PASS' if passed else 'FAIL'} {description}")
+    return all(passed for _, passed in checks)
+
+def main():
+    parser = argparse.ArgumentParser(description="Measures the startup of cloneRepos.py and checks the fast path")
+    parser.add_argument('--runs', type=int, default=7, help="fresh interpreters timed per import measurement (the median is kept)")
+    parser.add_argument('--students', type=int, default=300)
+    parser.add_argument('--assignments', type=int, default=20, help="assignments in the generated submission logs")
+    parser.add_argument('--latency', type=float, default=0.3, help="seconds every API response is delayed by")
+    args = parser.parse_args()
+
+    work_path = tempfile.mkdtemp(prefix="startup-")
+    try: passed = run(args, work_path)
+    finally: shutil.rmtree(work_path, ignore_errors=True)
+    sys.exit(0 if passed else 1)
+
+
+if __name__ == "__main__":
+    main()
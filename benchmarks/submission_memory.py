@@ -0,0 +1,94 @@
+from git import Repo
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import repo_utils
+import submission_store
+
+"""
+Compares the memory and time needed to read the submission information of a repository
+with the whole history loaded as Commit objects (`list(iter_commits())`) against the lazy `repo_utils.Submission`
+
+Usage:
+    py benchmarks/submission_memory.py [--repo PATH] [--commits N]
+"""
+
+def create_repository(path:str, num_commits:int):
+    """Creates a repository with `num_commits` commits (through fast-import, so large histories are cheap to create).
+    Consecutive commits on the same branch are chained by fast-import
+
+    Args:
+        path (str): path of the repository
+        num_commits (int): number of commits
+    """
+    subprocess.run(['git', 'init', '-q', path], check=True)
+    stream = []
+    for i in range(num_commits):
+        content = f"commit {i}\n"
+        message = f"commit {i}\n"
+        stream.append(f"commit refs/heads/main\ncommitter Student <student@example.com> {1700000000 + i} +0000\ndata {len(message)}\n{message}")
+        stream.append(f"M 644 inline file.txt\ndata {len(content)}\n{content}\n")
+    subprocess.run(['git', 'fast-import', '--quiet'], input=''.join(stream).encode(), cwd=path, check=True)
+    subprocess.run(['git', 'symbolic-ref', 'HEAD', 'refs/heads/main'], cwd=path, check=True)
+
+def measure(function) -> tuple:
+    """Measures the peak traced memory and wall time of a function
+
+    Returns:
+        tuple: (result, peak memory in bytes, seconds)
+    """
+    tracemalloc.start()
+    started = time.perf_counter()
+    result = function()
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, peak, elapsed
+
+def eager(repo:Repo):
+    commits = list(repo.iter_commits())
+    return commits[0].hexsha, len(commits), str(commits[0].author)
+
+def open_store(temp_path:str) -> submission_store.YamlSubmissionStore:
+    """Opens an empty yaml submission store in a temporary folder, with the assignment of the benchmark registered
+    """
+    path = f"{temp_path}/submissions.yml"
+    with open(path, 'w') as file: file.write("organizations:\n")
+    store = submission_store.YamlSubmissionStore(path)
+    store.begin_pull('org', 'org', 'hw', "01-01-2024-00-00-00")
+    return store
+
+def lazy(repo:Repo, store:submission_store.SubmissionStore):
+    submission = repo_utils.Submission('student', 'org', 'hw', store, repo)
+    return submission.get_commit_hash_latest(), submission.get_commit_length_latest(), str(submission.get_commit_latest().author)
+
+def main():
+    parser = argparse.ArgumentParser(description="Memory benchmark of repo_utils.Submission")
+    parser.add_argument('--repo', help="existing repository to measure (a synthetic one is created by default)")
+    parser.add_argument('--commits', type=int, default=20000, help="number of commits of the synthetic repository")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_path:
+        path = args.repo
+        if not path:
+            path = f"{temp_path}/repo"
+            create_repository(path, args.commits)
+
+        store = open_store(temp_path)
+        results = dict()
+        for name, function in (('list(iter_commits())', eager), ('lazy Submission', lambda repo: lazy(repo, store))):
+            repo = Repo(path) # new Repo for each run so nothing is cached between them
+            results[name] = measure(lambda: function(repo))
+            repo.close()
+
+        print(f"Repository: {path}")
+        for name, (result, peak, elapsed) in results.items():
+            print(f"{name:<22}: peak {peak / 1024 ** 2:8.2f} MB, {elapsed:6.3f}s -> {result[0][:10]} ({result[1]} commits, {result[2]})")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+import argparse
+import csv
+import os
+import random
+import subprocess
+
+"""
+Generates a synthetic GitHub Classroom organization on disk
+
+    <org_path>/<organization>/<assignment>-template.git     starter repository (initial commit by github-classroom[bot])
+    <org_path>/<organization>/<assignment>-<student>.git    student repositories, sharing the template commit
+    <org_path>/roster.csv                                   classroom roster in the GitHub Classroom format
+
+Histories are written with `git fast-import`, so large organizations are generated in seconds.
+
+Usage:
+    py benchmarks/synthetic_org.py <org_path> [--students N] [--history-depth N] [--file-size BYTES] ...
+"""
+
+BOT_AUTHOR = "github-classroom[bot] <66690702+github-classroom[bot]@users.noreply.github.com>"
+EPOCH = 1700000000
+
+def random_content(random_generator:random.Random, size:int) -> bytes:
+    return random_generator.randbytes(size)
+
+def fast_import(repo_path:str, commits:list, parent:str=None):
+    """Writes commits to `refs/heads/main` of a repository with `git fast-import`
+
+    Args:
+        repo_path (str): path of the (bare) repository
+        commits (list): commits as dict of `author`, `message`, `timestamp` and `files` (mapping of path to bytes)
+        parent (str): commit hash the first commit builds on (None for a root commit)
+    """
+    stream = bytearray()
+    for i, commit in enumerate(commits):
+        message = commit['message'].encode()
+        stream += f"commit refs/heads/main\nauthor {commit['author']} {commit['timestamp']} +0000\ncommitter {commit['author']} {commit['timestamp']} +0000\n".encode()
+        stream += f"data {len(message)}\n".encode() + message + b"\n"
+        if i == 0 and parent: stream += f"from {parent}\n".encode()
+        for path, content in commit['files'].items():
+            stream += f"M 644 inline {path}\ndata {len(content)}\n".encode() + content + b"\n"
+        stream += b"\n"
+    subprocess.run(['git', 'fast-import', '--quiet'], input=bytes(stream), cwd=repo_path, check=True)
+
+def init_bare(repo_path:str):
+    subprocess.run(['git', 'init', '-q', '--bare', repo_path], check=True)
+    subprocess.run(['git', 'symbolic-ref', 'HEAD', 'refs/heads/main'], cwd=repo_path, check=True)
+    subprocess.run(['git', 'config', 'uploadpack.allowFilter', 'true'], cwd=repo_path, check=True) # partial clones over file://
+
+def create_template(repo_path:str, num_files:int, file_size:int, seed:int) -> str:
+    """Creates the starter repository of the assignment
+
+    Returns:
+        str: hash of the template commit
+    """
+    random_generator = random.Random(seed)
+    init_bare(repo_path)
+    files = {f"src/main/java/unit03/Starter{i}.java": random_content(random_generator, file_size) for i in range(num_files)}
+    files['lib/starter.jar'] = random_content(random_generator, file_size * 8)
+    fast_import(repo_path, [{'author': BOT_AUTHOR, 'message': "Initial commit", 'timestamp': EPOCH, 'files': files}])
+    return subprocess.run(['git', 'rev-parse', 'main'], cwd=repo_path, check=True, capture_output=True, text=True).stdout.strip()
+
+def create_student(repo_path:str, template_path:str, template_commit:str, identifier:str, history_depth:int, file_size:int, seed:int):
+    """Creates a student repository: the template commit followed by `history_depth` student commits
+    """
+    random_generator = random.Random(seed)
+    init_bare(repo_path)
+    # borrow nothing from the template on disk: fetch the template commit so the student repository is self-contained
+    subprocess.run(['git', 'fetch', '-q', template_path, 'main:main'], cwd=repo_path, check=True)
+    commits = []
+    for i in range(history_depth):
+        files = {f"src/main/java/unit03/Lab{random_generator.randrange(4)}.java": random_content(random_generator, file_size)}
+        commits.append({'author': f"{identifier} <{identifier}@example.com>", 'message': f"Work on lab ({i + 1})", 'timestamp': EPOCH + 3600 * (i + 1), 'files': files})
+    if commits: fast_import(repo_path, commits, template_commit)
+
+def create_org(org_path:str, num_students:int, organization:str="bench-org", assignment:str="unit03", history_depth:int=5, file_size:int=4096,
+               template_files:int=10, no_submission_ratio:float=0.1, seed:int=0) -> dict:
+    """Generates the synthetic organization
+
+    Args:
+        org_path (str): output folder
+        num_students (int): number of student repositories
+        organization (str): organization identifier
+        assignment (str): assignment name (repository prefix)
+        history_depth (int): number of student commits on top of the template commit
+        file_size (int): size of every generated file (bytes)
+        template_files (int): number of source files in the template
+        no_submission_ratio (float): fraction of students without a commit of their own
+        seed (int): seed of the generated contents
+
+    Returns:
+        dict: `organization`, `assignment`, `roster_path`, `repositories_path` and `students` (git identifiers)
+    """
+    repositories_path = f"{org_path}/{organization}"
+    os.makedirs(repositories_path, exist_ok=True)
+    template_path = f"{repositories_path}/{assignment}-template.git"
+    template_commit = create_template(template_path, template_files, file_size, seed)
+
+    random_generator = random.Random(seed)
+    students = [f"student{i:04d}" for i in range(num_students)]
+    for i, identifier in enumerate(students):
+        depth = 0 if random_generator.random() < no_submission_ratio else history_depth
+        create_student(f"{repositories_path}/{assignment}-{identifier}.git", template_path, template_commit, identifier, depth, file_size, seed + i + 1)
+
+    roster_path = f"{org_path}/roster.csv"
+    with open(roster_path, 'w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(['identifier', 'github_username'])
+        for i, identifier in enumerate(students): writer.writerow([f"Student{i:04d}, Test", identifier])
+
+    return {'organization': organization, 'assignment': assignment, 'roster_path': roster_path, 'repositories_path': repositories_path, 'students': students}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generates a synthetic GitHub Classroom organization")
+    parser.add_argument('org_path', help="output folder")
+    parser.add_argument('--students', type=int, default=50)
+    parser.add_argument('--organization', default="bench-org")
+    parser.add_argument('--assignment', default="unit03")
+    parser.add_argument('--history-depth', type=int, default=5, help="student commits on top of the template commit")
+    parser.add_argument('--file-size', type=int, default=4096, help="size of every generated file (bytes)")
+    parser.add_argument('--template-files', type=int, default=10)
+    parser.add_argument('--no-submission-ratio', type=float, default=0.1)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    org = create_org(args.org_path, args.students, args.organization, args.assignment, args.history_depth, args.file_size, args.template_files, args.no_submission_ratio, args.seed)
+    print(f"Created {len(org['students'])} repositories in {org['repositories_path']} (roster: {org['roster_path']})")
@@ -0,0 +1,146 @@
+import argparse
+import hashlib
+import hmac
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from benchmarks.synthetic_org import BOT_AUTHOR, EPOCH, fast_import, init_bare
+
+"""
+Drives the watcher (`cloneRepos.py --watch`) with signed push webhooks and checks that the mirrors are kept in sync
+
+    webhook     a push signed with the webhook secret fetches the mirror right away (without waiting for a poll), pushes
+                with a wrong signature are rejected and pushes of repositories that are not watched are ignored
+    stale       a repository that cannot be resolved is listed in the watch marker, so a pull fetches its mirror instead
+                of trusting it, until a poll brings it up to date again
+
+Exits with 1 when a check fails.
+
+Usage:
+    py benchmarks/watch_webhook.py [--students N] [--timeout SECONDS]
+"""
+
+ORGANIZATION = 'bench-org'
+ASSIGNMENT = 'unit03'
+SECRET = "webhook-secret"
+
+def push(repo_path:str, message:str) -> str:
+    """Commits on top of `main` of a bare repository, like a student pushing
+
+    Returns:
+        str: hash of the new commit
+    """
+    head = subprocess.run(['git', 'rev-parse', '--verify', '-q', 'main'], cwd=repo_path, capture_output=True, text=True).stdout.strip()
+    fast_import(repo_path, [{'author': BOT_AUTHOR, 'message': message, 'timestamp': EPOCH, 'files': {'README.md': message.encode()}}], head or None)
+    return subprocess.run(['git', 'rev-parse', 'main'], cwd=repo_path, check=True, capture_output=True, text=True).stdout.strip()
+
+def post_push(port:int, repository_name:str, secret:str=SECRET, event:str='push') -> int:
+    """Posts the `push` payload of a repository to the webhook endpoint, signed like GitHub does (`X-Hub-Signature-256`)
+
+    Returns:
+        int: HTTP status of the response
+    """
+    body = json.dumps({'ref': 'refs/heads/main', 'repository': {'name': repository_name, 'owner': {'login': ORGANIZATION}}}).encode()
+    signature = 'sha256=' + hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+    request = urllib.request.Request(f"http://127.0.0.1:{port}/", body, {'Content-Type': 'application/json', 'X-GitHub-Event': event, 'X-Hub-Signature-256': signature})
+    try:
+        with urllib.request.urlopen(request, timeout=10) as response: return response.status
+    except urllib.error.HTTPError as error: return error.code
+
+def wait_for(condition, timeout:float) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition(): return True
+        time.sleep(0.05)
+    return condition()
+
+def run(args, work_path:str) -> bool:
+    """Runs the watcher against local repositories and checks the mirrors
+
+    Returns:
+        bool: whether every check passed
+    """
+    from mirror_cache import MirrorCache
+    from watch import SubmissionWatcher
+
+    # student repositories, already mirrored by an earlier pull
+    organization = {'name': "Bench Org", 'identifier': ORGANIZATION}
+    mirror_cache = MirrorCache(f"{work_path}/mirrors", ORGANIZATION)
+    repositories = dict()
+    for i in range(args.students):
+        identifier = f"student{i:04d}"
+        repo_path = f"{work_path}/org/{ASSIGNMENT}-{identifier}.git"
+        init_bare(repo_path)
+        push(repo_path, "Initial commit")
+        repositories[(ORGANIZATION, f"{ASSIGNMENT}-{identifier}")] = {'organization': organization, 'assignment': ASSIGNMENT, 'identifier': identifier, 'clone_url': f"file://{repo_path}"}
+        mirror_cache.sync(f"{ASSIGNMENT}-{identifier}", f"file://{repo_path}")
+
+    # webhook: the watcher only polls once, so the pushed repository can only be fetched through the webhook
+    watcher = SubmissionWatcher(repositories, {ORGANIZATION: mirror_cache}, interval=3600, jitter=0, webhook_port=0, webhook_secret=SECRET)
+    thread = threading.Thread(target=watcher.run, daemon=True)
+    thread.start()
+    started = wait_for(lambda: watcher.polls == 1 and watcher.webhook_port, args.timeout)
+    pushed_name = f"{ASSIGNMENT}-student0000"
+    pushed_commit = push(f"{work_path}/org/{pushed_name}.git", "Submission")
+    wrong_signature = post_push(watcher.webhook_port, pushed_name, secret="wrong-secret")
+    time.sleep(0.5)
+    fetched_unsigned = mirror_cache.get_head(pushed_name) == pushed_commit
+    accepted = post_push(watcher.webhook_port, pushed_name)
+    fetch_started = time.perf_counter()
+    fetched = wait_for(lambda: mirror_cache.get_head(pushed_name) == pushed_commit, args.timeout)
+    fetch_time = time.perf_counter() - fetch_started
+    unwatched = post_push(watcher.webhook_port, f"{ASSIGNMENT}-nobody")
+    ping = post_push(watcher.webhook_port, pushed_name, event='ping')
+    watcher.stop()
+    thread.join(args.timeout)
+
+    # stale: a repository that cannot be resolved is fetched by the next pull, until a poll brings its mirror up to date
+    stale_name = f"{ASSIGNMENT}-student{args.students - 1:04d}"
+    stale_path = f"{work_path}/org/{stale_name}.git"
+    stale_commit = push(stale_path, "Submission")
+    os.rename(stale_path, f"{stale_path}.unreachable")
+    watcher.poll()
+    marked_stale = MirrorCache(f"{work_path}/mirrors", ORGANIZATION, watched_within=60)
+    pull_cache = MirrorCache(f"{work_path}/mirrors", ORGANIZATION, watched_within=60)
+    os.rename(f"{stale_path}.unreachable", stale_path)
+    pull_cache.sync(stale_name, f"file://{stale_path}")
+    pull_cache.sync(pushed_name, f"file://{work_path}/org/{pushed_name}.git")
+    watcher.poll()
+    recovered = MirrorCache(f"{work_path}/mirrors", ORGANIZATION, watched_within=60)
+
+    checks = [
+        ("the watcher polled once and listened for webhooks", bool(started)),
+        ("a push with a wrong signature is rejected and not fetched", wrong_signature == 401 and not fetched_unsigned),
+        ("a signed push is accepted and fetches the mirror without a poll", accepted == 202 and fetched),
+        ("pushes of repositories that are not watched and other events are ignored", unwatched == 204 and ping == 204),
+        ("a repository that cannot be resolved is listed as stale, the others stay watched", marked_stale.watched and marked_stale.stale == {stale_name}),
+        ("a pull fetches the stale mirror and uses the other mirrors as they are", pull_cache.fetched == 1 and pull_cache.current == 1 and mirror_cache.get_head(stale_name) == stale_commit),
+        ("the next poll that resolves it clears it from the marker", recovered.watched and not recovered.stale),
+    ]
+    print(f"\n{args.students} watched repositories: signed push fetched in {fetch_time * 1000:.0f}ms, {watcher.fetched} mirror(s) fetched by the watcher")
+    for description, passed in checks: print(f"\t{'PASS' if passed else 'FAIL'} {description}")
+    return all(passed for _, passed in checks)
+
+def main():
+    parser = argparse.ArgumentParser(description="Checks the watcher against signed push webhooks and unreachable repositories")
+    parser.add_argument('--students', type=int, default=5)
+    parser.add_argument('--timeout', type=float, default=10, help="seconds to wait for the watcher")
+    args = parser.parse_args()
+    if args.students < 2: parser.error("--students must be at least 2")
+
+    work_path = tempfile.mkdtemp(prefix="watch-webhook-")
+    try: passed = run(args, work_path)
+    finally: shutil.rmtree(work_path, ignore_errors=True)
+    sys.exit(0 if passed else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,29 @@
+from __future__ import annotations # annotations name modules that are imported lazily (see import_pull_modules)
 import yaml
+import argparse
 import subprocess
-from threading import Thread
-import requests
-from git import Repo,GitCommandError
+from threading_utils import CloneScheduler
 import datetime
 import shutil
+import shlex
 import csv
 import re
 import os
 import time
 import repo_utils
+import prune_utils
+import submission_store
+import archive_export
+import journal
+import clone_retry
+import github_api
+import diffstat
+import dedup
+import log_pipeline
+from log_pipeline import log
 import pprint
 import logging
+import traceback
 pp = pprint.PrettyPrinter(indent=4)
 
 """
@@ -21,83 +33,255 @@ TODO:
 - Store stdout/clone logs onto the assignment folder
 - Grade classwork activities more easily
     - This just would be in the form of supplying a yaml file with a list of files (or probably paths?) to look at, and searches the contents of the file (if there is even a file)
-- Make the roster path optional. If the roster path is left out blank, then it should just clone every git repository in the organization
 - Re-structure code into separate classes/files 
 
 
 """
 CONFIG_PATH = "config/config.yml"
 CONFIG = dict()
-SUBMISSIONS = dict() # information about student submissions. mapping of the student's git identifier to their number of commits and the commit hash
-ORGANIZATION = None # selected organization from user input
-CLONE_PATH = None # clone_output_path/<organization_name>/
-STUDENTS = dict() # mapping of identifier to student name
-STUDENTS_NO_SUBMISSIONS = dict()
-STUDENTS_NOT_CLONED = dict()
+SUBMISSIONS = None # SubmissionStore with information about student submissions (number of commits and the commit hash of each student)
+GITHUB_CLIENTS = dict() # (token, api url) -> GitHubClient, so every API request of the process shares one connection pool and response cache
+DEFAULT_CLONE_URL_TEMPLATE = "https://{token}@github.com/{organization}/{repository}.git"
+DEFAULT_MAX_CONCURRENT_CLONES = 8
+DEFAULT_WATCH_INTERVAL = 60 # seconds
+DEFAULT_TOKEN_CHECK_TTL = 600 # seconds a valid token is not checked again
 LIGHT_GREEN = '\033[1;32m' # Ansi code for light_green
 LIGHT_YELLOW = '\033[1;33m' # Ansi code for light_yellow
 LIGHT_RED = '\033[1;31m' # Ansi code for light_red
 WHITE = '\033[0m' # Ansi code for white to reset back to normal text
 if os.name == 'nt': os.system('color') # Enable color in cmd
 
-# Logging
+# Logging (console and the README.md of every pull, written by one thread)
 log_mode = logging.INFO
 logger = logging.getLogger(__name__)
 logger.setLevel(log_mode)
-# print to stdout
-console_handler = logging.StreamHandler() #
-console_handler.setLevel(log_mode)
-logger.addHandler(console_handler)
-# write to file
-file_handler = None
-
-class RepoThread(Thread):
-    """A thread that handles the pulling of student github repositories 
+LOG_PIPELINE = log_pipeline.LogPipeline(logger)
+
+class RepoThread:
+    """A clone job that handles the pulling of student github repositories. Jobs are run by the worker threads of a CloneScheduler (`run`)
+    or as coroutines of the AsyncGitEngine (`run_async`)
     """
     global SUBMISSIONS
     
-    def __init__(self, identifier, student_name, assignment_name, timestamp_pulled):
-        super().__init__()
+    def __init__(self, pull, identifier, student_name):
+        self.__pull = pull # AssignmentPull the repository belongs to
         self.__git_identifier = identifier
         self.__student_name = student_name 
-        self.__assignment_name = assignment_name
-        self.__clone_url = f"https://{CONFIG['github_classic_token']}@github.com/{ORGANIZATION['identifier']}/{self.__assignment_name}-{self.__git_identifier}.git"
-        self.__timestamp_pulled = timestamp_pulled
-        self.__clone_path = f"{CLONE_PATH}/{self.__assignment_name}-{self.__timestamp_pulled}/{self.__assignment_name}-{self.__student_name}"
+        self.__assignment_name = pull.assignment_name
+        self.__repository_name = f"{self.__assignment_name}-{self.__git_identifier}"
+        self.__clone_url = get_clone_url(self.__repository_name, pull.organization['identifier'])
+        self.__timestamp_pulled = pull.timestamp_pulled
+        # exported repositories are cloned bare into a hidden folder and removed once they are archived
+        self.__clone_path = f"{pull.clone_path}/.export/{self.__assignment_name}-{self.__student_name}.git" if pull.export_format else f"{pull.clone_path}/{self.__assignment_name}-{self.__student_name}"
         self.__repo = None
         self.__submission_info = None
+        self.__deadline_commit = None # last commit before the deadline of the assignment, if it has one
     
-    def run(self):
-        # clone the repository
-        try: self.clone_repository()
-        except GitCommandError as gce:
-            self.print_clone_error(gce)
-            global STUDENTS_NOT_CLONED
-            STUDENTS_NOT_CLONED[self.__git_identifier] = {'student_name': self.__student_name, 'clone_url': self.__clone_url}
-            return
-        
+    def run(self) -> bool:
+        """Clones the repository and checks for a new submission
+
+        Returns:
+            bool: False if the repository could not be cloned
+        """
+        try: return self.__run()
+        except Exception:
+            self.log_unexpected_error()
+            return False
+
+    def __run(self) -> bool:
+        with self.__pull.metrics.timer(self.__git_identifier, 'total'):
+            # clone the repository, retrying transient failures
+            attempt = 0
+            while True:
+                self.__pull.retry_policy.breaker.wait()
+                try:
+                    self.clone_repository()
+                    break
+                except GitCommandError as gce:
+                    attempt += 1
+                    stderr_dict = parse_git_exception(gce)
+                    delay = self.prepare_retry(stderr_dict, attempt)
+                    if delay is None:
+                        self.log_clone_error(stderr_dict)
+                        self.mark_not_cloned()
+                        return False
+                    time.sleep(delay)
+            self.__pull.retry_policy.breaker.record_success()
+            self.record_objects()
+            if not self.__pull.archive: return self.check_submission()
+            with self.__pull.metrics.timer(self.__git_identifier, 'archive'): self.export_repository()
+            submitted = self.check_submission()
+            self.remove_export_clone()
+            return submitted
+
+    async def run_async(self, engine:AsyncGitEngine) -> bool:
+        """Clones the repository through the asyncio git engine and checks for a new submission
+
+        Args:
+            engine (AsyncGitEngine): engine running the git commands
+
+        Returns:
+            bool: False if the repository could not be cloned
+        """
+        try: return await self.__run_async(engine)
+        except Exception:
+            self.log_unexpected_error()
+            return False
+
+    async def __run_async(self, engine:AsyncGitEngine) -> bool:
+        with self.__pull.metrics.timer(self.__git_identifier, 'total'):
+            loop = asyncio.get_running_loop()
+            # clone the repository, retrying transient failures
+            attempt = 0
+            while True:
+                while self.__pull.retry_policy.breaker.get_wait(): await asyncio.sleep(self.__pull.retry_policy.breaker.get_wait())
+                stderr_dict = await self.clone_repository_async(engine)
+                if stderr_dict is None: break
+                attempt += 1
+                delay = self.prepare_retry(stderr_dict, attempt)
+                if delay is None:
+                    self.log_clone_error(stderr_dict)
+                    self.mark_not_cloned()
+                    return False
+                await asyncio.sleep(delay)
+            self.__pull.retry_policy.breaker.record_success()
+
+            if self.__pull.metrics.enabled:
+                result = await engine.run('count-objects', '-v', cwd=self.__clone_path)
+                if result.ok: self.__pull.metrics.record(self.__git_identifier, **metrics.parse_count_objects(result.stdout))
+            self.__repo = Repo(self.__clone_path)
+            if not self.__pull.archive: return await loop.run_in_executor(None, self.check_submission)
+            with self.__pull.metrics.timer(self.__git_identifier, 'archive'): await loop.run_in_executor(None, self.export_repository)
+            submitted = await loop.run_in_executor(None, self.check_submission)
+            self.remove_export_clone()
+            return submitted
+
+    async def clone_repository_async(self, engine:AsyncGitEngine) -> dict:
+        """Clones the repository through the asyncio git engine
+
+        Returns:
+            dict: parsed stderr of the failed git command (see repo_utils.parse_git_stderr), or None if the repository is cloned
+        """
+        loop = asyncio.get_running_loop()
+        clone_source = self.__clone_url
+        clone_options = self.get_clone_options(bool(self.__pull.mirror_cache))
+        with self.__pull.metrics.timer(self.__git_identifier, 'transfer'):
+            if self.__pull.mirror_cache:
+                try: clone_source = await loop.run_in_executor(None, self.__pull.mirror_cache.sync, self.__repository_name, self.__clone_url, self.get_reference_path())
+                except GitCommandError as gce: return parse_git_exception(gce)
+
+            result = await engine.clone(clone_source, self.__clone_path, *clone_options)
+            if result.ok and self.__pull.mirror_cache: result = await engine.run('remote', 'set-url', 'origin', self.__clone_url, cwd=self.__clone_path)
+        with self.__pull.metrics.timer(self.__git_identifier, 'checkout'):
+            if result.ok and self.__pull.deadline:
+                deadline_commit = await engine.run(*repo_utils.get_deadline_commit_args(self.__pull.deadline), cwd=self.__clone_path)
+                late_commits = await engine.run(*repo_utils.get_late_commit_args(deadline_commit.stdout.strip()), cwd=self.__clone_path)
+                self.record_deadline(deadline_commit.stdout.strip() if deadline_commit.ok else None, int(late_commits.stdout) if late_commits.ok else 0)
+            for command in self.get_checkout_commands():
+                if not result.ok: break
+                result = await engine.run(*command, cwd=self.__clone_path)
+        return None if result.ok else result.stderr_dict
+
+    def prepare_retry(self, stderr_dict:dict, attempt:int) -> float:
+        """Classifies a failed clone and, if it is worth retrying, removes the partial clone
+
+        Args:
+            stderr_dict (dict): parsed stderr of git (see repo_utils.parse_git_stderr)
+            attempt (int): number of attempts that failed
+
+        Returns:
+            float: seconds to wait before the next attempt, or None to give up
+        """
+        retry_policy = self.__pull.retry_policy
+        kind = clone_retry.classify_git_error(stderr_dict)
+        if not retry_policy.should_retry(kind, attempt): return None
+        if self.__repo: self.__repo.close()
+        if os.path.exists(self.__clone_path): shutil.rmtree(self.__clone_path, onerror=prune_utils.remove_readonly)
+        delay = retry_policy.get_delay(attempt)
+        self.__pull.students_retried[self.__git_identifier] = {'student_name': self.__student_name, 'attempts': attempt, 'error': kind}
+        reason = stderr_dict.get('err_fatal') or stderr_dict.get('err_remote') or stderr_dict.get('err_error') or stderr_dict['stderr'].strip()
+        log(self.__pull.logger, f"Retrying {self.__student_name} ({self.__git_identifier}) in {delay:.1f}s after a {kind} error (attempt {attempt}/{retry_policy.max_retries}): {reason}",
+            'warning', 'retrying', identifier=self.__git_identifier, attempt=attempt, kind=kind)
+        return delay
+
+    def get_identifier(self) -> str:
+        return self.__git_identifier
+
+    def mark_not_cloned(self):
+        self.__pull.students_not_cloned[self.__git_identifier] = {'student_name': self.__student_name, 'clone_url': self.__clone_url}
+        self.__pull.metrics.record(self.__git_identifier, student_name=self.__student_name, status='not_cloned')
+        self.__pull.journal.append('not_cloned', identifier=self.__git_identifier, student_name=self.__student_name, clone_url=self.__clone_url)
+
+    def record_objects(self):
+        """Records the number of objects received and their size (`git count-objects`), if metrics are collected
+        """
+        if self.__pull.metrics.enabled: self.__pull.metrics.record(self.__git_identifier, **metrics.parse_count_objects(self.__repo.git.count_objects('-v')))
+
+    def check_submission(self) -> bool:
+        """Checks if the cloned repository has a new submission and updates the submission logs
+
+        Returns:
+            bool: Always True (the repository is cloned)
+        """
+        self.__pull.metrics.record(self.__git_identifier, student_name=self.__student_name, status='cloned')
+        with self.__pull.metrics.timer(self.__git_identifier, 'submission'):
+            self.__check_submission()
+        self.journal_clone()
+        return True
+
+    def journal_clone(self):
+        """Appends the cloned repository to the journal of the pull, with what is needed to resume the pull without cloning it again
+        """
+        try: head = self.__repo.head.commit.hexsha
+        except ValueError: head = None # empty repository, or every commit is after the deadline
+        submission = {'num_commits': self.__submission_info.get_commit_length_latest(), 'commit_hash': self.__submission_info.get_commit_hash_latest()} if self.__submission_info else dict()
+        self.__pull.journal.append('cloned', identifier=self.__git_identifier, student_name=self.__student_name, head=head,
+                                   submitted=self.__git_identifier not in self.__pull.students_no_submissions,
+                                   late=self.__pull.students_late.get(self.__git_identifier), **submission)
+
+    def __check_submission(self) -> bool:
+        if CONFIG['log_submissions']:
+            self.__submission_info = repo_utils.Submission(self.__git_identifier, self.__pull.organization['name'], self.__assignment_name, SUBMISSIONS, self.__repo)
+
         if self.__submission_info:
             # checks if there are new commits
             if not self.__submission_info.is_submitted(SUBMISSIONS):
-                logger.info(f"{LIGHT_YELLOW}Cloned (WITH WARNINGS) {self.__student_name} ({self.__git_identifier}) because there is no submission at the time of pull.{WHITE}")
-                # get before and after pull commits
-                logger.info(f"\tCurrent commit: {self.__submission_info.get_commit_hash_stored(SUBMISSIONS)} ({self.__submission_info.get_commit_length_stored(SUBMISSIONS)} total commits)")
+                # get before and after pull commits (one record, so the lines of concurrent clones do not interleave)
+                lines = [f"Cloned (WITH WARNINGS) {self.__student_name} ({self.__git_identifier}) because there is no submission at the time of pull.",
+                         f"\tCurrent commit: {self.__submission_info.get_commit_hash_stored(SUBMISSIONS)} ({self.__submission_info.get_commit_length_stored(SUBMISSIONS)} total commits)"]
                 try:
-                    logger.info(f"\tLatest commit:")
-                    logger.info(f"\t\tHash: {self.__submission_info.get_commit_hash_latest()} ({self.__submission_info.get_commit_length_latest()} total commits)")
-                    logger.info(f"\t\tAuthor:  {self.__submission_info.get_commit_latest().author}")
-                    logger.info(f"\t\tMessage: {self.__submission_info.get_commit_latest().message.strip()}")
+                    lines += [f"\tLatest commit:",
+                              f"\t\tHash: {self.__submission_info.get_commit_hash_latest()} ({self.__submission_info.get_commit_length_latest()} total commits)",
+                              f"\t\tAuthor:  {self.__submission_info.get_commit_latest().author}",
+                              f"\t\tMessage: {self.__submission_info.get_commit_latest().message.strip()}"]
                 except: pass
-                logger.info(f"\tClone URL: {self.__clone_url}")
-                global STUDENTS_NO_SUBMISSIONS
-                STUDENTS_NO_SUBMISSIONS[self.__git_identifier] = {'student_name': self.__student_name, 'clone_url': self.__clone_url}
+                lines.append(f"\tClone URL: {self.__clone_url}")
+                log(self.__pull.logger, '\n'.join(lines), 'warning', 'no_submission', identifier=self.__git_identifier)
+                self.__pull.students_no_submissions[self.__git_identifier] = {'student_name': self.__student_name, 'clone_url': self.__clone_url}
                 #self.delete_repository_soft()
-                return
+                self.__submission_info.record_pull(SUBMISSIONS, self.__timestamp_pulled, False)
+                return True
             
+            self.summarize_changes()
             self.__submission_info.update_submission_info(SUBMISSIONS)
+            self.__submission_info.record_pull(SUBMISSIONS, self.__timestamp_pulled, True)
             
-        logger.info(f"{LIGHT_GREEN}Cloned {self.__student_name} ({self.__git_identifier}){WHITE}")
+        log(self.__pull.logger, f"Cloned {self.__student_name} ({self.__git_identifier})", 'success', 'cloned', identifier=self.__git_identifier)
+        return True
     
+    def summarize_changes(self):
+        """Summarizes the changes of a new submission since the commit stored by the last pull (`summarize_changes`), by comparing
+        the trees of both commits in the clone (cached by commit pair, see diffstat.DiffstatCache)
+        """
+        if not self.__pull.diffstat_cache: return
+        old_commit = self.__submission_info.get_commit_hash_stored(SUBMISSIONS)
+        new_commit = self.__submission_info.get_commit_hash_latest()
+        files = diffstat.get_diffstat(self.__clone_path, old_commit, new_commit, self.__pull.diffstat_cache, get_assignment_config(self.__assignment_name).get('paths'))
+        if files is None: return # first submission, or the stored commit is not in the repository anymore (force-pushed away)
+        summary = diffstat.summarize(files, self.__pull.large_file_size)
+        self.__pull.students_changed[self.__git_identifier] = {'student_name': self.__student_name, 'old_commit': old_commit, 'new_commit': new_commit, **summary}
+        SUBMISSIONS.update_submission_info(self.__pull.organization['name'], self.__assignment_name, self.__git_identifier, changes={'old_commit': old_commit, **summary})
+
     def clone_repository(self):
         """Clones a repository
         
@@ -108,22 +292,102 @@ class RepoThread(Thread):
         You can inspect what was checked out with 'git status'
         and retry with 'git restore --source=HEAD :/'
         """
-        self.__repo = Repo.clone_from(self.__clone_url, self.__clone_path)
+        with self.__pull.metrics.transfer(self.__git_identifier) as progress:
+            if self.__pull.mirror_cache: self.__repo = self.__pull.mirror_cache.clone(self.__repository_name, self.__clone_url, self.__clone_path, self.get_reference_path(), self.get_clone_options(True))
+            else: self.__repo = Repo.clone_from(self.__clone_url, self.__clone_path, progress=progress, multi_options=[shlex.quote(option) for option in self.get_clone_options()]) # GitPython splits multi_options with shlex
+        with self.__pull.metrics.timer(self.__git_identifier, 'checkout'):
+            if self.__pull.deadline:
+                try:
+                    deadline_commit = self.__repo.git.execute(['git', *repo_utils.get_deadline_commit_args(self.__pull.deadline)])
+                    self.record_deadline(deadline_commit, int(self.__repo.git.execute(['git', *repo_utils.get_late_commit_args(deadline_commit)])))
+                except GitCommandError: self.record_deadline(None, 0) # empty repository
+            for command in self.get_checkout_commands(): self.__repo.git.execute(['git', *command])
+
+    def export_repository(self):
+        """Streams the resolved commit (HEAD, or the last commit before the deadline) into the archive of the pull, limited to the graded `paths`
+        """
+        if self.__pull.deadline and not self.__deadline_commit: return # every commit is late, there is nothing to archive
+        try: self.__pull.archive.add_repository(f"{self.__assignment_name}-{self.__student_name}", self.__clone_path, 'HEAD', get_assignment_config(self.__assignment_name).get('paths'))
+        except archive_export.GitArchiveError as error:
+            log(self.__pull.logger, f"Could not archive {self.__student_name} ({self.__git_identifier}): {error.stderr.strip()}", 'warning')
+
+    def remove_export_clone(self):
+        """Removes the bare clone of an exported repository
+        """
+        self.__repo.close() # stop the git processes GitPython keeps open, so the folder can be removed on Windows
+        shutil.rmtree(self.__clone_path, onerror=prune_utils.remove_readonly)
+
+    def record_deadline(self, deadline_commit:str, late_commits:int):
+        """Keeps the last commit before the deadline (checked out instead of HEAD) and flags the student if they committed after the deadline
+
+        Args:
+            deadline_commit (str): last commit at or before the deadline, None if every commit is late
+            late_commits (int): number of commits after the deadline
+        """
+        self.__deadline_commit = deadline_commit or None
+        if late_commits: self.__pull.students_late[self.__git_identifier] = {'student_name': self.__student_name, 'late_commits': late_commits, 'deadline_commit': self.__deadline_commit}
         if CONFIG['log_submissions']:
-            self.__submission_info = repo_utils.Submission(self.__git_identifier, ORGANIZATION['name'], self.__assignment_name, SUBMISSIONS, self.__repo)
+            SUBMISSIONS.update_submission_info(self.__pull.organization['name'], self.__assignment_name, self.__git_identifier,
+                                               deadline_commit=self.__deadline_commit, late_commits=late_commits)
+
+    def get_reference_path(self) -> str:
+        return self.__pull.template_reference['path'] if self.__pull.template_reference else None
+
+    def get_clone_options(self, from_mirror:bool=False) -> list:
+        """Gets the options passed to `git clone`
+
+        Args:
+            from_mirror (bool): whether the repository is cloned from the mirror cache (local clone) instead of the remote
+
+        Returns:
+            list: git clone options
+        """
+        options = []
+        if self.__pull.export_format: options.append('--bare') # only the objects are needed, `git archive` reads the commit from them
+        elif get_assignment_config(self.__assignment_name).get('paths'):
+            # only download the blobs of the graded paths (blobless partial clone) and check them out after the sparse checkout is set
+            if not from_mirror: options.append('--filter=blob:none')
+            options.append('--no-checkout')
+        elif self.__pull.deadline: options.append('--no-checkout') # the commit before the deadline is checked out instead of HEAD
+        elif self.__pull.metrics.enabled: options.append('--no-checkout') # checked out separately to time the checkout phase
+        if self.__pull.template_reference and not from_mirror:
+            options.append(f"--reference={self.__pull.template_reference['path']}") # starter objects are borrowed from the template instead of downloaded
+            if get_assignment_config(self.__assignment_name).get('dissociate'): options.append('--dissociate')
+        return options
+
+    def get_checkout_commands(self) -> list:
+        """Gets the git commands that run after cloning to check out the graded paths of the assignment (`paths`),
+        the last commit before its `deadline`, or the whole working tree when the checkout is timed on its own (`collect_metrics`)
+
+        Returns:
+            list: git commands (list of arguments)
+        """
+        if self.__pull.export_format: return repo_utils.get_deadline_checkout_commands(self.__deadline_commit, bare=True) if self.__pull.deadline else []
+        paths = get_assignment_config(self.__assignment_name).get('paths')
+        commands = [repo_utils.get_sparse_checkout_args(paths)] if paths else []
+        if self.__pull.deadline: commands.extend(repo_utils.get_deadline_checkout_commands(self.__deadline_commit))
+        elif paths or self.__pull.metrics.enabled: commands.append(['checkout'])
+        return commands
           
     # TODO: Need to resolve PermissionErrors with a process using the git repo (and errors related to moving the .git folder as well)
     # def delete_repository_soft(self):
     #     """Soft deletes the git repository by renaming it into a no submission list
     #     """
     #     self.__repo = None
-    #     source = f"{CLONE_PATH}/{self.__assignment_name}-{self.__timestamp_pulled}/{self.__assignment_name}-{self.__student_name}"
-    #     dest = f"{CLONE_PATH}/{self.__assignment_name}-{self.__timestamp_pulled}/1. NO SUBMISSIONS/{self.__assignment_name}-{self.__student_name}"
+    #     source = f"{self.__pull.clone_path}/{self.__assignment_name}-{self.__student_name}"
+    #     dest = f"{self.__pull.clone_path}/1. NO SUBMISSIONS/{self.__assignment_name}-{self.__student_name}"
     #     time.sleep(2)
     #     shutil.move(source, dest)
     
     def print_clone_error(self, git_exception: GitCommandError):
-        stderr_dict = parse_git_exception(git_exception)
+        self.log_clone_error(parse_git_exception(git_exception))
+
+    def log_clone_error(self, stderr_dict: dict):
+        """Logs why a repository could not be cloned
+
+        Args:
+            stderr_dict (dict): parsed stderr of git (see repo_utils.parse_git_stderr)
+        """
         stderr_message = "there is an error while cloning the repository."
         detailed = True
         if 'err_remote' in stderr_dict and "Repository not found." in stderr_dict['err_remote']:
@@ -131,41 +395,44 @@ class RepoThread(Thread):
                 detailed = False
         if 'err_warning' in stderr_dict and "Clone succeeded, but checkout failed." in stderr_dict['err_warning']: # TODO: force clone the repository (using subprocess?)
             stderr_message = "there is something wrong with the contents of the repository (clone this repository manually)."
-        logger.info(f"{LIGHT_RED}Skipping {self.__student_name} ({self.__git_identifier}) because {stderr_message}{WHITE}")
-        if detailed: logger.info(stderr_dict['stderr'])
+        message = f"Skipping {self.__student_name} ({self.__git_identifier}) because {stderr_message}"
+        log(self.__pull.logger, f"{message}\n{stderr_dict['stderr']}" if detailed else message, 'error', 'not_cloned', identifier=self.__git_identifier)
+
+    def log_unexpected_error(self):
+        """Logs the traceback of an error that is not a git error (i.e. an OSError or a sqlite error) and reports the repository as not cloned,
+        so one broken job neither counts as cloned nor aborts the other jobs of the pull
+        """
+        log(self.__pull.logger, f"Skipping {self.__student_name} ({self.__git_identifier}) because of an unexpected error.\n{traceback.format_exc()}",
+            'error', 'not_cloned', identifier=self.__git_identifier)
+        self.mark_not_cloned()
             
 
 def parse_git_exception(git_exception: GitCommandError):
     """Retrieves stderr messages from a git exception
 
     Args:
-        stderr (_type_): _description_
+        git_exception (GitCommandError): exception raised by GitPython
 
     Returns:
-        _type_: _description_
+        dict: the full `stderr` and the first message of each type of error (see repo_utils.parse_git_stderr)
     """
-    stderr = git_exception.stderr
-    stderr_dict = {'stderr': stderr}
-    
-    # initialize the types of errors that are thrown by git
-    error = re.compile(r'error: (.+)')
-    error_match = error.search(stderr)
-    if error_match: stderr_dict['err_error'] = error_match.group(1)
-    
-    remote = re.compile(r'remote: (.+)')
-    remote_match = remote.search(stderr)
-    if remote_match: stderr_dict['err_remote'] = remote_match.group(1)
-    
-    fatal = re.compile(r'fatal: (.+)')
-    fatal_match = fatal.search(stderr)
-    if fatal_match: stderr_dict['err_fatal'] = fatal_match.group(1)
-
-    warning = re.compile(r'warning: (.+)')
-    warning_match = warning.search(stderr)
-    if warning_match: stderr_dict['err_warning'] = warning_match.group(1)
-    
-    return stderr_dict
+    return repo_utils.parse_git_stderr(git_exception.stderr)
           
+def import_pull_modules():
+    """Imports the modules that only pulls and the watcher need (GitPython, requests, asyncio and the modules built on them).
+    They take most of the startup time, so the prompts, `--dissociate` and the scripts that only read the config start without them
+    """
+    global asyncio, requests, Repo, GitCommandError, metrics, grading, repo_analytics, MirrorCache, SubmissionWatcher, AsyncGitEngine
+    import asyncio
+    import requests
+    from git import Repo, GitCommandError
+    import metrics
+    import grading
+    import repo_analytics
+    from mirror_cache import MirrorCache
+    from watch import SubmissionWatcher
+    from async_git import AsyncGitEngine
+
 def import_config():
     """Imports configuration settings from the CONFIG_PATH yaml file
 
@@ -174,20 +441,23 @@ def import_config():
     """
     config = dict()
     with open(CONFIG_PATH, 'r') as file:
-        config = yaml.load(file, Loader=yaml.FullLoader)
+        config = yaml.load(file, Loader=repo_utils.YAML_LOADER)
     if not config['organizations']: raise RuntimeError(f"You must add at least one organization to the configuration file.\nEdit the configuration file on {CONFIG_PATH}")
     if not config['clone_output_path'] or not config['github_classic_token']: raise RuntimeError(f"You must fill out the REQUIRED variables on the config file to run the script.\nEdit the config file on {CONFIG_PATH}")
     return config
 
-def import_roster():
-    """Imports the student roster from the selected organization (user input)
+def import_roster(organization:dict):
+    """Imports the student roster of an organization
+
+    Args:
+        organization (dict): organization from the config file
 
     Returns:
-        _type_: _description_
+        dict: mapping of the git identifier to the student name
     """
     students = dict()
     warnings = False
-    with open(ORGANIZATION['roster_path'], 'r') as file:
+    with open(organization['roster_path'], 'r') as file:
         reader = csv.reader(file)
         next(reader)
         line_num = 1
@@ -196,65 +466,597 @@ def import_roster():
             student_name = re.sub(r'[. ]', '', re.sub(r'(, )|(,)', '-', record[0]).split(' ')[0])
             github_identifier = record[1]
             if not student_name: student_name = None
-            if github_identifier: 
+            if github_identifier:
                 students[github_identifier] = student_name # github_username, identifier
             else:
                 print(f"{LIGHT_RED} (!) Ignoring record (line {line_num}) from the student roster since it does not contain a git identifier.{WHITE}\n\t{record}")
                 warnings = True
-    if warnings: print(f"\nCheck your classroom roster csv file from `{ORGANIZATION['roster_path']}`\n")
+    if warnings: print(f"\nCheck your classroom roster csv file from `{organization['roster_path']}`\n")
     return students
 
 
+class AssignmentPull:
+    def __init__(self, organization:dict, students:dict, assignment_name:str, timestamp_pulled:str, mirror_cache:MirrorCache=None, export_format:str=None, resume:bool=False,
+                 retry_policy:clone_retry.RetryPolicy=None):
+        """Pull of one assignment from one organization into `<clone_output_path>/<organization_name>/<assignment>-<timestamp>`.
+        Holds everything the clone jobs of the assignment share, so several assignments can be pulled at the same time
+
+        Args:
+            organization (dict): organization from the config file
+            students (dict): roster of the organization (git identifier -> student name)
+            assignment_name (str): name of the assignment
+            timestamp_pulled (str): timestamp of the pull
+            mirror_cache (MirrorCache): mirror cache of the organization, if `mirror_cache_path` is set (one per pull, so its counters are the pull's)
+            export_format (str): stream every repository into one archive of this format instead of checking them out (see archive_export.ARCHIVE_FORMATS)
+            resume (bool): resume an interrupted pull into the existing folder of `timestamp_pulled` from its journal
+            retry_policy (RetryPolicy): backoff and circuit breaker of failed clones (shared by every pull of a batch, see `get_retry_policy`)
+        """
+        self.organization = organization
+        self.students = students
+        self.assignment_name = assignment_name
+        self.timestamp_pulled = timestamp_pulled
+        self.mirror_cache = mirror_cache
+        self.export_format = export_format
+        self.archive = None # PullArchive the repositories are streamed into (`export_format`)
+        self.organization_path = f"{CONFIG['clone_output_path']}/{organization['name']}" # clone_output_path/<organization_name>/
+        self.clone_path = f"{self.organization_path}/{assignment_name}-{timestamp_pulled}"
+        self.students_no_submissions = dict()
+        self.students_not_cloned = dict()
+        self.students_unchanged = dict() # students skipped before cloning because their remote HEAD matches the stored commit hash
+        self.students_late = dict() # students with commits after the deadline of the assignment
+        self.students_resumed = dict() # students whose checkout from the interrupted pull was verified and kept (`resume`)
+        self.students_journaled = set() # students the interrupted pull already cloned, failed or skipped (`resume`)
+        self.stored_submissions = None # (number of commits, commit hash) of every student stored before the pull (journal header), when skipping unchanged submissions
+        self.students_retried = dict() # students whose clone failed with a transient error and was retried
+        self.students_changed = dict() # students with a new submission and the diffstat since their last pulled commit (`summarize_changes`)
+        self.diffstat_cache = None # DiffstatCache of the batch (`summarize_changes`)
+        self.large_file_size = repo_utils.parse_size_string(CONFIG.get('diffstat_large_file_size') or diffstat.DEFAULT_LARGE_FILE_SIZE)
+        self.retry_policy = retry_policy or get_retry_policy()
+        self.resume = resume
+        self.journal = None # PullJournal of the pull folder
+        self.deadline = repo_utils.parse_deadline(get_assignment_config(assignment_name).get('deadline'))
+        self.template_reference = None # path and size of the assignment template used as a reference object store (`--reference`), if the assignment has a `template`
+        self.metrics = metrics.Metrics(CONFIG.get('collect_metrics')) # per-repository timings (`collect_metrics`)
+        self.threads = []
+        # every pull logs to the console and to the README.md of its own folder
+        self.logger = logging.getLogger(f"{__name__}.{organization['identifier']}.{assignment_name}")
+        self.logger.setLevel(log_mode)
+        self.__readme_open = False
+
+    def prepare(self) -> list:
+        """Creates the pull folder, skips unchanged submissions, prepares the template reference and creates the clone jobs
+
+        Returns:
+            list: RepoThread jobs of the students to clone
+        """
+        if CONFIG['log_submissions']: SUBMISSIONS.begin_pull(self.organization['name'], self.organization['identifier'], self.assignment_name, self.timestamp_pulled)
+        os.makedirs(self.clone_path, exist_ok=self.resume)
+
+        # write the records of the pull to its README.md
+        LOG_PIPELINE.open_readme(self.logger, f"{self.clone_path}/README.md")
+        self.__readme_open = True
+
+        logger.info("")
+        clone_message = f"Cloning to: `{self.clone_path}/`..."
+        self.logger.info("-" * len(clone_message))
+        self.logger.info(clone_message)
+        self.logger.info(f"Timestamp pulled: {self.timestamp_pulled}")
+        self.logger.info("-" * len(clone_message))
+
+        # checkpoint journal
+        skip_unchanged = CONFIG['log_submissions'] and CONFIG.get('skip_unchanged_submissions') and not self.export_format
+        self.journal = journal.PullJournal(self.clone_path)
+        if self.resume: self.restore_journal()
+        else:
+            # the submissions stored before the pull, since a resumed pull finds what the interrupted pull stored
+            if skip_unchanged: self.stored_submissions = {identifier: [submission['num_commits'], submission['commit_hash']] for identifier, submission in SUBMISSIONS.get_submissions(self.organization['name'], self.assignment_name).items()}
+            self.journal.append('pull', organization=self.organization['identifier'], assignment=self.assignment_name, timestamp_pulled=self.timestamp_pulled, export_format=self.export_format,
+                                stored_submissions=self.stored_submissions)
+
+        if self.export_format:
+            self.archive = archive_export.PullArchive(f"{self.clone_path}/{self.assignment_name}-{self.timestamp_pulled}", self.export_format)
+            self.logger.info(f"Exporting every repository to `{os.path.basename(self.archive.path)}` instead of checking it out.")
+            if self.archive.fallback: log(self.logger, "(!) Install zstandard (`pip install zstandard`) to export tar.zst archives, exporting tar.gz instead.", 'warning')
+        if self.deadline: self.logger.info(f"Checking out the last commit before the deadline ({self.deadline:%m-%d-%Y %H:%M %Z}) on the `{repo_utils.DEADLINE_BRANCH}` branch.")
+
+        # skip students whose remote HEAD did not change since the last pull (exports need every repository)
+        if skip_unchanged:
+            # students of the journal were already recorded (or have to be cloned again) by the interrupted pull
+            unchanged = {identifier: commit_hash for identifier, commit_hash in self.find_unchanged_submissions().items() if identifier not in self.students_journaled}
+            self.students_unchanged.update(unchanged)
+            previous_pulls = self.get_previous_pull_paths() if CONFIG.get('link_unchanged_submissions') else []
+            for identifier, commit_hash in unchanged.items():
+                student_name = self.students[identifier]
+                self.journal.append('unchanged', identifier=identifier, student_name=student_name, commit_hash=commit_hash)
+                linked = previous_pulls and link_previous_checkout(self.assignment_name, student_name, previous_pulls, self.clone_path)
+                log(self.logger, f"Not cloning {student_name} ({identifier}) because there is no new submission since the last pull ({commit_hash}){' (linked the previous checkout)' if linked else ''}.", 'warning', 'unchanged', identifier=identifier)
+                self.students_no_submissions[identifier] = {'student_name': student_name, 'clone_url': get_clone_url(f"{self.assignment_name}-{identifier}", self.organization['identifier'])}
+                stored = SUBMISSIONS.get_submission(self.organization['name'], self.assignment_name, identifier)
+                SUBMISSIONS.record_pull(self.organization['name'], self.assignment_name, identifier, self.timestamp_pulled, stored['num_commits'], commit_hash, False)
+
+        # use the assignment template as a reference object store
+        self.template_reference = self.prepare_template_reference()
+        if self.template_reference: self.logger.info(f"Using the template `{get_assignment_config(self.assignment_name)['template']}` as a reference ({self.template_reference['size'] / 1024 ** 2:.1f} MB of objects).")
+
+        self.threads = [RepoThread(self, identifier, student_name) for identifier, student_name in self.students.items()
+                        if identifier not in self.students_unchanged and identifier not in self.students_resumed]
+        return self.threads
+
+    def restore_journal(self):
+        """Keeps the repositories of the journal whose checkout is complete and restores their statistics and submission logs.
+        Partial checkouts of the other students are removed, so they are cloned again
+        """
+        journal_events = journal.read_journal(self.clone_path)
+        events = journal.get_student_events(journal_events)
+        self.students_journaled = set(events)
+        self.stored_submissions = journal.get_pull_event(journal_events).get('stored_submissions')
+        for identifier, student_name in self.students.items():
+            event = events.get(identifier) or dict()
+            checkout_path = f"{self.clone_path}/{self.assignment_name}-{student_name}"
+            if event.get('event') == 'unchanged':
+                self.students_unchanged[identifier] = event['commit_hash']
+                self.students_no_submissions[identifier] = {'student_name': student_name, 'clone_url': get_clone_url(f"{self.assignment_name}-{identifier}", self.organization['identifier'])}
+                continue
+            if event.get('event') == 'cloned' and repo_utils.verify_checkout(checkout_path, event['head']):
+                self.students_resumed[identifier] = event
+                if not event['submitted']: self.students_no_submissions[identifier] = {'student_name': student_name, 'clone_url': get_clone_url(f"{self.assignment_name}-{identifier}", self.organization['identifier'])}
+                if event.get('late'): self.students_late[identifier] = event['late']
+                # the yaml submission logs are only saved at the end of a pull, so what the interrupted pull logged is saved again
+                if CONFIG['log_submissions'] and event['submitted'] and event.get('commit_hash'):
+                    SUBMISSIONS.update_submission(self.organization['name'], self.assignment_name, identifier, event['num_commits'], event['commit_hash'])
+                if CONFIG['log_submissions'] and event.get('late'):
+                    SUBMISSIONS.update_submission_info(self.organization['name'], self.assignment_name, identifier, deadline_commit=event['late']['deadline_commit'], late_commits=event['late']['late_commits'])
+                continue
+            # unfinished, failed or corrupt checkout
+            if os.path.islink(checkout_path): os.unlink(checkout_path)
+            elif os.path.isdir(checkout_path): shutil.rmtree(checkout_path, onerror=prune_utils.remove_readonly)
+            # the sqlite store already has the commit the interrupted pull cloned: put back the one stored before the pull, so the new clone is compared to it
+            if CONFIG['log_submissions'] and self.stored_submissions is not None:
+                num_commits, commit_hash = self.stored_submissions.get(identifier) or (0, None)
+                stored = SUBMISSIONS.get_submission(self.organization['name'], self.assignment_name, identifier)
+                if stored and stored['commit_hash'] != commit_hash: SUBMISSIONS.update_submission(self.organization['name'], self.assignment_name, identifier, num_commits, commit_hash)
+        self.logger.info(f"Resuming the pull: kept {len(self.students_resumed) + len(self.students_unchanged)} repositories from {journal.JOURNAL_FILE}, cloning {len(self.students) - len(self.students_resumed) - len(self.students_unchanged)} again.")
+
+    def is_new_student(self, identifier:str) -> bool:
+        """Checks if a student has never been pulled for this assignment (cloned first)
+        """
+        return CONFIG['log_submissions'] and SUBMISSIONS.get_submission(self.organization['name'], self.assignment_name, identifier) is None
+
+    def find_unchanged_submissions(self) -> dict:
+        """Resolves the remote HEAD of every student in bulk (`git ls-remote`, or the mirrors kept in sync by the watcher) and compares it
+        with the commit hash stored from the last pull (from the journal header when resuming, since the interrupted pull may have
+        stored the commit of a student that has to be cloned again)
+
+        Returns:
+            dict: mapping of the git identifier to the unchanged commit hash of students that do not need to be cloned
+        """
+        if self.stored_submissions is not None: commit_hashes = {identifier: commit_hash for identifier, (_, commit_hash) in self.stored_submissions.items()}
+        else: commit_hashes = {identifier: submission['commit_hash'] for identifier, submission in SUBMISSIONS.get_submissions(self.organization['name'], self.assignment_name).items()} # journals of older versions
+        clone_urls = {identifier: get_clone_url(f"{self.assignment_name}-{identifier}", self.organization['identifier']) for identifier in self.students if commit_hashes.get(identifier)}
+        if self.mirror_cache and self.mirror_cache.watched:
+            remote_heads = {identifier: self.mirror_cache.get_head(f"{self.assignment_name}-{identifier}") for identifier in clone_urls}
+        else: remote_heads = repo_utils.get_remote_heads(clone_urls, CONFIG.get('max_concurrent_clones') or DEFAULT_MAX_CONCURRENT_CLONES)
+        return {identifier: head for identifier, head in remote_heads.items() if head and head == commit_hashes[identifier]}
+
+    def get_previous_pull_paths(self) -> list:
+        """Gets the folders of previous pulls of the assignment, newest first
+
+        Returns:
+            list: paths of the previous pull folders
+        """
+        pulls = []
+        if not os.path.isdir(self.organization_path): return pulls
+        for directory_name in os.listdir(self.organization_path):
+            if not directory_name.startswith(f"{self.assignment_name}-"): continue
+            timestamp = directory_name[len(self.assignment_name) + 1:]
+            if timestamp == self.timestamp_pulled: continue
+            try: pulls.append((datetime.datetime.strptime(timestamp, '%m-%d-%Y-%H-%M-%S'), f"{self.organization_path}/{directory_name}"))
+            except ValueError: pass # not a pull of this assignment (i.e. `hw1-part2-<timestamp>` when pulling `hw1`)
+        return [path for _, path in sorted(pulls, reverse=True)]
+
+    def prepare_template_reference(self) -> dict:
+        """Clones the template repository of the assignment once, to be used as a reference object store for every student clone.
+        The template is kept inside the pull folder, so it is removed together with the clones that borrow its objects
+
+        Returns:
+            dict: `path` of the template and the `size` of its objects (bytes), or None if there is no template
+        """
+        template = get_assignment_config(self.assignment_name).get('template')
+        if not template: return None
+        owner, _, repository_name = template.rpartition('/')
+        owner = owner or self.organization['identifier']
+        clone_url = get_clone_url(repository_name, owner)
+        template_path = f"{self.clone_path}/.template.git"
+        existing = os.path.isdir(template_path) # resumed pull: the checkouts that were kept borrow its objects, so it is never removed
+        try:
+            if self.mirror_cache: clone_url = MirrorCache(CONFIG['mirror_cache_path'], owner).sync(repository_name, clone_url)
+            if existing: Repo(template_path).git.fetch(clone_url, '+refs/heads/*:refs/heads/*') # only adds objects
+            else: Repo.clone_from(clone_url, template_path, bare=True)
+        except GitCommandError as gce:
+            if existing:
+                log(self.logger, f"(!) Cannot fetch the template `{template}`, using the template of the interrupted pull as it is.", 'warning')
+                self.logger.info(parse_git_exception(gce)['stderr'])
+                return {'path': template_path, 'size': repo_utils.get_directory_size(f"{template_path}/objects")}
+            log(self.logger, f"(!) Cannot clone the template `{template}`, cloning without a reference.", 'warning')
+            self.logger.info(parse_git_exception(gce)['stderr'])
+            shutil.rmtree(template_path, ignore_errors=True)
+            return None
+        return {'path': template_path, 'size': repo_utils.get_directory_size(f"{template_path}/objects")}
+
+    def report(self, clone_summary:str):
+        """Logs the statistics of the pull to the console and README.md, and writes the metrics
+
+        Args:
+            clone_summary (str): how long the clones took (shared by every assignment of a batch)
+        """
+        logger = self.logger
+        cloned = len(self.threads) + len(self.students_resumed) - len(self.students_not_cloned)
+        logger.info("-" * 11)
+        logger.info(f"STATISTICS: {self.organization['name']} / {self.assignment_name}")
+        logger.info("-" * 11)
+        # cloned
+        logger.info(clone_summary)
+        if self.students_unchanged: logger.info(f"Avoided {len(self.students_unchanged)} clone(s) because the remote HEAD did not change since the last pull.")
+        if self.students_resumed: logger.info(f"Kept {len(self.students_resumed)} repositories cloned before the pull was interrupted.")
+        log(logger, f"Successfully cloned {cloned}/{len(self.threads) + len(self.students_resumed)} repositories...", 'success')
+        # not cloned
+        if self.students_not_cloned:
+            log(logger, f"...`{len(self.students_not_cloned)}` of which were not cloned (double check this!):", 'error')
+            for identifier, info in self.students_not_cloned.items():
+                logger.info(f"\t{info['student_name']} ({identifier})")
+                logger.info(f"\t\tClone URL: {info['clone_url']}")
+        logger.info("")
+        # no submissions
+        if self.students_no_submissions:
+            log(logger, f"`{len(self.students_no_submissions)}` of which did not have an active submission since time of pull ({self.timestamp_pulled}):", 'warning')
+            for identifier, info in self.students_no_submissions.items():
+                logger.info(f"\t{info['student_name']} ({identifier})")
+                #print(f"\t\tClone URL: {info['clone_url']}")
+            logger.info("")
+        # retries
+        if self.students_retried:
+            recovered = sum(1 for identifier in self.students_retried if identifier not in self.students_not_cloned)
+            logger.info(f"Retried {len(self.students_retried)} clone(s) after transient errors, {recovered} of which succeeded.")
+            if self.retry_policy.breaker.trips: log(logger, f"The remote rejected too many requests, clones were paused {self.retry_policy.breaker.trips} time(s).", 'warning')
+            logger.info("")
+        # late commits
+        if self.students_late:
+            log(logger, f"`{len(self.students_late)}` of which committed after the deadline ({self.deadline:%m-%d-%Y %H:%M %Z}):", 'warning')
+            for identifier, info in self.students_late.items():
+                logger.info(f"\t{info['student_name']} ({identifier}): {info['late_commits']} late commit(s), checked out {info['deadline_commit'] or 'nothing (every commit is late)'}")
+            logger.info("")
+
+        # changes since the last pull
+        if self.students_changed:
+            logger.info(f"`{len(self.students_changed)}` of which have a new submission since the last pull:")
+            for identifier, info in self.students_changed.items():
+                logger.info(f"\t{info['student_name']} ({identifier}): {diffstat.format_summary(info)} ({info['old_commit'][:7]}..{info['new_commit'][:7]})")
+                for file in info['large_files']: log(logger, f"\t\tLarge file: {file['path']} ({diffstat.format_size(file['size'])})", 'warning')
+            logger.info("")
+
+        # archive
+        if self.archive:
+            logger.info(f"Archived {self.archive.repositories}/{cloned} repositories to {os.path.basename(self.archive.path)}.")
+            logger.info("")
+
+        # per-repository metrics
+        if self.metrics.enabled:
+            for line in self.metrics.format_summary(): logger.info(line)
+            logger.info(f"Metrics of every repository are written to {' and '.join(os.path.basename(path) for path in self.metrics.write(self.clone_path))}.")
+            logger.info("")
+
+        # template reference
+        if self.template_reference:
+            # only new mirrors borrow from the template when the mirror cache is used
+            referenced_clones = self.mirror_cache.created if self.mirror_cache else cloned
+            saved = self.template_reference['size'] * referenced_clones / 1024 ** 2
+            if self.mirror_cache or get_assignment_config(self.assignment_name).get('dissociate'): logger.info(f"Template reference saved ~{saved:.1f} MB of transfer across {referenced_clones} clone(s).")
+            else: logger.info(f"Template reference saved ~{saved:.1f} MB of transfer and disk across {referenced_clones} clone(s). Run `py cloneRepos.py --dissociate \"{self.clone_path}\"` before moving or deleting `.template.git`.")
+            logger.info("")
+
+        # mirror cache
+        if self.mirror_cache:
+            if self.mirror_cache.watched: logger.info(f"Mirror cache: used {self.mirror_cache.current} mirror(s) kept in sync by the watcher, created {self.mirror_cache.created} new mirror(s).")
+            else: logger.info(f"Mirror cache: fetched {self.mirror_cache.fetched} existing mirror(s), created {self.mirror_cache.created} new mirror(s).")
+            logger.info("")
+
+    def analyze_commits(self) -> dict:
+        """Reads the commit history of every checkout (`analyze_commits`) and logs the students with suspicious histories:
+        only bot commits, web uploads, commits by someone else and bursts of commits right before the deadline
+
+        Returns:
+            dict: mapping of the student name to its analytics (see repo_analytics.analyze_history)
+        """
+        if not CONFIG.get('analyze_commits') or self.export_format: return dict()
+        identifiers = {student_name: identifier for identifier, student_name in self.students.items() if identifier not in self.students_not_cloned}
+        repositories = {student_name: (f"{self.clone_path}/{self.assignment_name}-{student_name}", identifier) for student_name, identifier in identifiers.items()
+                        if os.path.isdir(f"{self.clone_path}/{self.assignment_name}-{student_name}")}
+        burst_window = repo_analytics.parse_window(CONFIG.get('commit_burst_window') or repo_analytics.DEFAULT_BURST_WINDOW)
+        results = repo_analytics.analyze_repositories(repositories, self.deadline, burst_window, CONFIG.get('commit_burst_size') or repo_analytics.DEFAULT_BURST_SIZE)
+
+        logger = self.logger
+        flagged = {student_name: analytics for student_name, analytics in results.items() if repo_analytics.get_flags(analytics)}
+        logger.info(f"Read {sum(analytics['commits'] for analytics in results.values())} commits of {len(results)} repositories.")
+        if flagged:
+            log(logger, f"`{len(flagged)}` of which have commit histories worth a look:", 'warning')
+            for student_name, analytics in flagged.items(): logger.info(f"\t{student_name} ({identifiers[student_name]}): {repo_analytics.format_flags(analytics)}")
+        logger.info("")
+        if CONFIG['log_submissions']:
+            for student_name, analytics in results.items():
+                SUBMISSIONS.update_submission_info(self.organization['name'], self.assignment_name, identifiers[student_name],
+                                                   flags=repo_analytics.get_flags(analytics), authors=analytics['authors'])
+        return results
+
+    def run_tests(self, cache:grading.TestCache=None) -> dict:
+        """Runs the build/test command of the assignment (`test_command`) on every checkout and logs a summary table.
+        Students whose commit was already tested with the same suite (i.e. unchanged since the last pull) are not built again
+
+        Args:
+            cache (TestCache): results cached by commit (shared by every pull of a batch)
+
+        Returns:
+            dict: mapping of the student name to its result (see grading.run_tests)
+        """
+        settings = get_assignment_config(self.assignment_name)
+        if not settings.get('test_command') or self.export_format: return dict()
+        identifiers = {student_name: identifier for identifier, student_name in self.students.items() if identifier not in self.students_not_cloned}
+        checkouts = dict()
+        for student_name, identifier in identifiers.items():
+            checkout_path = f"{self.clone_path}/{self.assignment_name}-{student_name}"
+            has_checkout = os.path.isdir(checkout_path)
+            # unchanged students without a linked checkout can only get the cached result of their stored commit
+            commit_hash = grading.get_head(checkout_path) if has_checkout else self.students_unchanged.get(identifier)
+            if commit_hash: checkouts[student_name] = (checkout_path if has_checkout else None, commit_hash)
+
+        timeout = settings.get('test_timeout') or grading.DEFAULT_TIMEOUT
+        max_workers = CONFIG.get('test_workers') or grading.DEFAULT_MAX_WORKERS
+        self.logger.info(f"Running `{settings['test_command']}` on {len(checkouts)} checkout(s) ({max_workers} at a time)...")
+        results = grading.run_tests(checkouts, settings['test_command'], settings.get('test_suite'), timeout, max_workers, cache, settings.get('paths'))
+        grading.write_logs(self.clone_path, results)
+
+        logger = self.logger
+        passed = sum(1 for result in results.values() if result['status'] == 'passed')
+        cached = sum(1 for result in results.values() if result['cached'])
+        logger.info(f"TESTS: `{settings['test_command']}`")
+        logger.info("")
+        for line in grading.format_table(results): logger.info(line)
+        logger.info("")
+        log(logger, f"{passed}/{len(results)} passed ({cached} result(s) from the cache). Build logs are written to {grading.RESULTS_FOLDER}/.", 'success' if passed == len(results) else 'warning')
+        if len(results) < len(identifiers): log(logger, f"{len(identifiers) - len(results)} student(s) could not be tested (no commit checked out, or no cached result for an unchanged submission without a checkout).", 'warning')
+        logger.info("")
+        if CONFIG['log_submissions']:
+            for student_name, result in results.items():
+                SUBMISSIONS.update_submission_info(self.organization['name'], self.assignment_name, identifiers[student_name],
+                                                   tests={'status': result['status'], 'exit_code': result['exit_code'], 'commit_hash': result['commit'], 'duration': round(result['duration'], 1)})
+        return results
+
+    def deduplicate(self, index:dedup.DedupIndex) -> dict:
+        """Replaces the files of the checkouts that are identical to a file of a previous pull (or of another checkout) with a link
+        to it (`deduplicate_pulls`), and logs the space reclaimed
+
+        Args:
+            index (DedupIndex): canonical files of every pull (shared by every pull of a batch)
+
+        Returns:
+            dict: statistics of the run (see dedup.Deduplicator.run)
+        """
+        if self.export_format: return dict()
+        deduplicator = dedup.Deduplicator(index, CONFIG.get('dedup_mode') or 'auto')
+        stats = deduplicator.run(self.clone_path)
+        self.logger.info(dedup.format_stats(stats))
+        self.logger.info("")
+        return stats
+
+    def close(self):
+        if self.journal: self.journal.close()
+        if self.__readme_open:
+            LOG_PIPELINE.close_readme(self.logger)
+            self.__readme_open = False
+        if self.archive:
+            # the log is complete once the handler is closed
+            self.archive.add_file('README.md', f"{self.clone_path}/README.md")
+            self.archive.close()
+            shutil.rmtree(f"{self.clone_path}/.export", ignore_errors=True)
+            logger.info(f"Exported {self.archive.repositories} repositories and README.md to {self.archive.path} ({self.archive.get_size() / 1024 ** 2:.1f} MB).")
+
+
+def link_previous_checkout(assignment_name:str, student_name:str, previous_pulls:list, assignment_clone_path:str) -> bool:
+    """Links a student's checkout from the newest previous pull into the current pull folder
+
+    Args:
+        assignment_name (str): name of the assignment
+        student_name (str): name of the student
+        previous_pulls (list): folders of the previous pulls, newest first
+        assignment_clone_path (str): folder of the current pull
+
+    Returns:
+        bool: whether or not the checkout was linked
+    """
+    for pull_path in previous_pulls:
+        source = os.path.realpath(f"{pull_path}/{assignment_name}-{student_name}")
+        if os.path.isdir(source):
+            try: os.symlink(source, f"{assignment_clone_path}/{assignment_name}-{student_name}", target_is_directory=True)
+            except OSError: return False # i.e. symlinks are not allowed on this system
+            return True
+    return False
+
+def get_clone_url(repository_name:str, organization_identifier:str) -> str:
+    """Builds the clone url of a repository from `clone_url_template`
+
+    Args:
+        repository_name (str): name of the repository (<assignment>-<identifier>)
+        organization_identifier (str): owner of the repository
+
+    Returns:
+        str: clone url
+    """
+    template = CONFIG.get('clone_url_template') or DEFAULT_CLONE_URL_TEMPLATE
+    return template.format(token=CONFIG['github_classic_token'], organization=organization_identifier, repository=repository_name)
+
+def get_assignment_config(assignment_name:str) -> dict:
+    """Gets the optional settings of an assignment (`assignments` in the config file)
+
+    Args:
+        assignment_name (str): name of the assignment
+
+    Returns:
+        dict: assignment settings (empty if the assignment is not configured)
+    """
+    return (CONFIG.get('assignments') or dict()).get(assignment_name) or dict()
+
+def log_scheduler_progress(stats:dict):
+    """Logs the queue depth and throughput of the clone scheduler
+
+    Args:
+        stats (dict): CloneScheduler statistics
+    """
+    log(logger, f"[{stats['completed']}/{stats['completed'] + stats['queue_depth'] + stats['active']}] queued: {stats['queue_depth']}, running: {stats['active']}/{stats['limit']}, throughput: {stats['throughput']:.2f} repos/s",
+        event='scheduler_progress', **stats)
 
 def clear_terminal():
     os.system('cls' if os.name == 'nt' else 'clear')
 
+def get_github_client(token:str=None) -> github_api.GitHubClient:
+    """Gets the GitHub API client of a token (`github_api_url` and `github_cache_path` in the config file)
+
+    Args:
+        token (str): GitHub token (defaults to the token of the config file)
+    """
+    token = token or CONFIG['github_classic_token']
+    api_url = CONFIG.get('github_api_url') or github_api.GITHUB_API_URL
+    if (token, api_url) not in GITHUB_CLIENTS:
+        GITHUB_CLIENTS[(token, api_url)] = github_api.GitHubClient(token, api_url, github_api.ResponseCache(CONFIG.get('github_cache_path')))
+    return GITHUB_CLIENTS[(token, api_url)]
+
 def is_token_valid(token):
-    """Checks if the provided GitHub token is valid
+    """Checks if the provided GitHub token is valid. A valid token is remembered for `token_check_ttl` seconds (by a sha256 of
+    the token, see github_api.ResponseCache), so runs in a row don't wait on the API before the first prompt
 
     Args:
         token (str): the github token
     """
-    request = requests.get("https://api.github.com/user", headers={'Authorization': f'Bearer {token}', 'Content-Type': 'application/json'})
-    return request.ok
+    ttl = CONFIG.get('token_check_ttl')
+    ttl = DEFAULT_TOKEN_CHECK_TTL if ttl in (None, '') else float(ttl)
+    api_url = CONFIG.get('github_api_url') or github_api.GITHUB_API_URL
+    cache = github_api.ResponseCache(CONFIG.get('github_cache_path'))
+    try:
+        if ttl and cache.is_token_checked(token, api_url, ttl): return True
+        valid = get_github_client(token).is_token_valid()
+        if valid: cache.put_token_check(token, api_url) # invalid tokens are checked again every run, so a new token works right away
+    finally: cache.close()
+    return valid
 
-def logging_filter_ansi(record):
-    """Helper function to remote ansi codes from logging print statements
+def get_students(organization:dict, assignment_name:str, rosters:dict, other_assignments:list=None) -> dict:
+    """Gets the students of an assignment: the roster of the organization, merged with the repositories of the assignment
+    found in the organization when the organization has no `roster_path` or sets `discover_repositories`
 
     Args:
-        record (str): logging input stream
+        organization (dict): organization from the config file
+        assignment_name (str): name of the assignment
+        rosters (dict): rosters that were already imported, by roster path (the roster is added to it)
+        other_assignments (list): assignments pulled with it (i.e. from the manifest). With the configured `assignments`, discovery leaves
+                                  out the repositories of the ones whose name extends this one (`unit01-part2-<identifier>` for `unit01`)
 
     Returns:
-        bool: Always filter
+        dict: mapping of the git identifier to the student name (discovered students are named by their git identifier)
     """
-    ansi_escape = re.compile(r'\x1b\[([0-9]+)(;[0-9]+)*m')
-    record.msg = ansi_escape.sub('', record.msg)
-    return True
+    roster_path = organization.get('roster_path')
+    students = dict()
+    if roster_path:
+        if roster_path not in rosters:
+            logger.info(f"\nPulling student rosters from `{organization['name']} ({organization['identifier']})`...")
+            rosters[roster_path] = import_roster(organization)
+        students = rosters[roster_path]
+        if not organization.get('discover_repositories'): return students
 
-    
-def main():
+    import_pull_modules()
+    client = get_github_client()
+    requests_sent, not_modified = client.requests, client.not_modified
+    other_assignments = [*(other_assignments or []), *(CONFIG.get('assignments') or dict())]
+    try: discovered = client.discover_students(organization['identifier'], assignment_name, other_assignments)
+    except (github_api.GitHubAPIError, requests.RequestException) as error:
+        log(logger, f"(!) Could not list the repositories of `{organization['identifier']}`: {error}", 'error')
+        return students
+    merged = github_api.merge_rosters(students, discovered)
+    logger.info(f"Discovered {len(discovered)} repositories of `{assignment_name}` in `{organization['identifier']}`, {len(merged) - len(students)} of which are not in the roster "
+          f"({client.requests - requests_sent} request(s), {client.not_modified - not_modified} unchanged since the last pull).")
+    return merged
+
+
+async def run_clones_async(threads:list, engine:AsyncGitEngine):
+    """Clones every repository concurrently through the asyncio git engine
+
+    Args:
+        threads (list): RepoThread jobs
+        engine (AsyncGitEngine): engine running the git commands
+    """
+    await asyncio.gather(*(thread.run_async(engine) for thread in threads))
+
+def check_token() -> bool:
+    """Checks if the GitHub token from the config file is valid, and explains what to do if it isn't
+
+    Returns:
+        bool: whether or not the token is valid
+    """
+    if is_token_valid(CONFIG['github_classic_token']): return True
+    print(f"{LIGHT_RED}(!) Your GitHub access token is invalid.{WHITE}")
+    print("Ensure that the token has 1) not expired and/or 2) your token has been granted sufficient permissions to read and clone git repositories.")
+    return False
+
+def find_organization(organization_name:str) -> dict:
+    """Finds an organization of the config file by name or identifier
+
+    Raises:
+        RuntimeError: there is no such organization
+    """
+    for organization in CONFIG['organizations']:
+        if organization_name in (organization['name'], organization['identifier']): return organization
+    raise RuntimeError(f"There is no organization `{organization_name}` in the config file {CONFIG_PATH}")
+
+def load_manifest(manifest_path:str) -> list:
+    """Loads the organization and assignment pairs of a batch manifest:
+
+        pulls:
+          - organization: Example Organization (2235)   # name or identifier from the config file
+            assignments: [unit03-lab, unit04-lab]
+
+    Args:
+        manifest_path (str): path of the yaml manifest
+
+    Returns:
+        list: (organization name, assignment name) pairs
+    """
+    with open(manifest_path, 'r') as file:
+        manifest = yaml.load(file, Loader=repo_utils.YAML_LOADER) or dict()
+    pairs = []
+    for pull in manifest.get('pulls') or []:
+        assignments = pull.get('assignments') or [pull['assignment']]
+        pairs.extend((pull['organization'], assignment_name) for assignment_name in assignments)
+    return pairs
+
+def main(engine:str='gitpython', export_format:str=None):
+    """Pulls the repositories of an assignment (user inputs)
+
+    Args:
+        engine (str): `gitpython` to clone with GitPython on a CloneScheduler, or `async` to clone with asyncio git subprocesses
+        export_format (str): stream the repositories into an archive of this format instead of checking them out (defaults to `export_format` in the config file)
+    """
     global CONFIG
-    global ORGANIZATION
-    global CLONE_PATH
-    global STUDENTS
     clear_terminal()
     print(f"Importing config from {CONFIG_PATH}...\n")
     CONFIG = import_config()
-    
+
     # check if the token is valid
-    token_valid = is_token_valid(CONFIG['github_classic_token'])
-    if not token_valid:
-        print(f"{LIGHT_RED}(!) Your GitHub access token is invalid.{WHITE}")
-        print("Ensure that the token has 1) not expired and/or 2) your token has been granted sufficient permissions to read and clone git repositories.")
-        return
-    
+    if not check_token(): return
+
     confirm_organization = False
     assignment_name = None
-    
+    rosters = dict()
+
     # pull assignments from organization and student rosters (user inputs)
     while not confirm_organization:
         # prompt for organization
-        if len(CONFIG['organizations']) == 1: ORGANIZATION = CONFIG['organizations'][0]
+        if len(CONFIG['organizations']) == 1: organization = CONFIG['organizations'][0]
         # multiple organizations
         elif len(CONFIG['organizations']) > 1:
             orgs = CONFIG['organizations']
@@ -262,93 +1064,260 @@ def main():
                 org_input = None
                 print("Organizations:")
                 for i in range(0, len(CONFIG['organizations'])): print(f"\t{i + 1}. {orgs[i]['name']} ({orgs[i]['identifier']})")
-                
-                
-                try: org_input = int(input("Select an organization (num input): ")) 
+
+
+                try: org_input = int(input("Select an organization (num input): "))
                 except: pass
                 try:
                     if org_input <= 0:raise ValueError("No inputs less than or equal to 0")
-                    ORGANIZATION = CONFIG['organizations'][org_input - 1]
+                    organization = CONFIG['organizations'][org_input - 1]
                     break
-                except: 
+                except:
                     clear_terminal()
-                    print("Invalid organization number.") 
-        
-        # get clone path from selected organization
-        CLONE_PATH = f"{CONFIG['clone_output_path']}/{ORGANIZATION['name']}"
+                    print("Invalid organization number.")
+
         # pull student rosters from organization
-        print(f"\nPulling student rosters from `{ORGANIZATION['name']} ({ORGANIZATION['identifier']})`...")
-        STUDENTS = import_roster()
-        
+        if organization.get('roster_path') and organization['roster_path'] not in rosters:
+            print(f"\nPulling student rosters from `{organization['name']} ({organization['identifier']})`...")
+            rosters[organization['roster_path']] = import_roster(organization)
+
         # prompt for assignment name
         assignment_name = None
-        while not assignment_name: 
+        while not assignment_name:
             assignment_name = input(f"Assignment Name (or enter to re-select organization): ").replace(" ", "-")
-            if assignment_name: 
+            if assignment_name:
                 confirm_organization = True # end initial loop chain
             else:
                 clear_terminal()
                 break
-    
-    timestamp_pulled = datetime.datetime.strftime(datetime.datetime.now(), '%m-%d-%Y-%H-%M-%S') # github classroom styled format
-    
+
+    pull_assignments([(organization, assignment_name)], engine, rosters, export_format)
+
+def run_batch(pairs:list, engine:str='gitpython', export_format:str=None) -> list:
+    """Pulls many assignments without prompting (i.e. scheduled runs, scripts and benchmarks)
+
+    Args:
+        pairs (list): (organization name or identifier, assignment name) pairs
+        engine (str): see `main`
+        export_format (str): see `main`
+
+    Returns:
+        list: AssignmentPull of every assignment, or None if the token is invalid
+    """
+    global CONFIG
+    CONFIG = import_config()
+    if not check_token(): return None
+    pulls = []
+    for organization_name, assignment_name in pairs:
+        pull = (find_organization(organization_name), assignment_name.replace(" ", "-"))
+        if pull not in pulls: pulls.append(pull)
+    return pull_assignments(pulls, engine, export_format=export_format)
+
+def run_resume(pull_path:str, engine:str='gitpython'):
+    """Resumes an interrupted pull from the journal of its folder (`--resume`): complete checkouts are kept, the other repositories are cloned again
+    and the statistics are rebuilt from the journal
+
+    Args:
+        pull_path (str): pull folder (`<clone_output_path>/<organization_name>/<assignment>-<timestamp>`)
+        engine (str): see `main`
+
+    Returns:
+        AssignmentPull: the resumed pull, or None if it cannot be resumed
+    """
+    global CONFIG
+    CONFIG = import_config()
+    try: pull = journal.get_pull_event(journal.read_journal(pull_path))
+    except (OSError, ValueError):
+        print(f"{LIGHT_RED}(!) There is no pull to resume in `{pull_path}` ({journal.JOURNAL_FILE} is missing).{WHITE}")
+        return None
+    if pull.get('export_format'):
+        print(f"{LIGHT_RED}(!) Exported pulls cannot be resumed, the archive is only complete once the pull finishes. Pull the assignment again.{WHITE}")
+        return None
+    organization = find_organization(pull['organization'])
+    expected_path = f"{CONFIG['clone_output_path']}/{organization['name']}/{pull['assignment']}-{pull['timestamp_pulled']}"
+    if os.path.normcase(os.path.abspath(expected_path)) != os.path.normcase(os.path.abspath(pull_path)):
+        print(f"{LIGHT_RED}(!) The pull folder was moved, resume it from `{expected_path}`.{WHITE}")
+        return None
+    if not check_token(): return None
+    pulls = pull_assignments([(organization, pull['assignment'])], engine, resume_timestamp=pull['timestamp_pulled'])
+    return pulls[0]
+
+def get_retry_policy() -> clone_retry.RetryPolicy:
+    """Gets the retry policy of failed clones from the config file (`clone_retries`, `clone_retry_delay`, `circuit_breaker_threshold` and `circuit_breaker_cooldown`)
+    """
+    breaker = clone_retry.CircuitBreaker(CONFIG.get('circuit_breaker_threshold') or 5, float(CONFIG.get('circuit_breaker_cooldown') or 30))
+    retries = CONFIG.get('clone_retries')
+    return clone_retry.RetryPolicy(3 if retries in (None, '') else retries, float(CONFIG.get('clone_retry_delay') or 2), breaker=breaker)
+
+def get_watch_interval() -> float:
+    """Gets the seconds between two polls of the watcher (`watch_interval` in the config file)
+    """
+    return float(CONFIG.get('watch_interval') or DEFAULT_WATCH_INTERVAL)
+
+def run_watch(pairs:list):
+    """Keeps the mirror cache of the rostered repositories of assignments in sync until Ctrl+C (`--watch`). Pulls of
+    these assignments then only materialize the mirrors
+
+    Args:
+        pairs (list): (organization name or identifier, assignment name) pairs
+    """
+    global CONFIG, SUBMISSIONS
+    CONFIG = import_config()
+    if not CONFIG.get('mirror_cache_path'):
+        print(f"{LIGHT_RED}(!) Watch mode keeps the mirror cache in sync, set `mirror_cache_path` in {CONFIG_PATH}.{WHITE}")
+        return
+    if not check_token(): return
+    import_pull_modules()
+
+    rosters = dict()
+    repositories = dict()
+    mirror_caches = dict()
+    for organization_name, assignment_name in pairs:
+        organization = find_organization(organization_name)
+        mirror_caches.setdefault(organization['identifier'], MirrorCache(CONFIG['mirror_cache_path'], organization['identifier']))
+        assignment_name = assignment_name.replace(" ", "-")
+        for identifier in get_students(organization, assignment_name, rosters, [name.replace(" ", "-") for _, name in pairs]):
+            repository_name = f"{assignment_name}-{identifier}"
+            repositories[(organization['identifier'], repository_name)] = {'organization': organization, 'assignment': assignment_name, 'identifier': identifier,
+                                                                          'clone_url': get_clone_url(repository_name, organization['identifier']),
+                                                                          'paths': get_assignment_config(assignment_name).get('paths')}
+
+    if CONFIG['log_submissions']: SUBMISSIONS = submission_store.open_submission_store(CONFIG)
+    webhook_port = CONFIG.get('watch_webhook_port')
+    watcher = SubmissionWatcher(repositories, mirror_caches, SUBMISSIONS if CONFIG['log_submissions'] else None, get_watch_interval(),
+                                float(CONFIG.get('watch_jitter') or 0), CONFIG.get('max_concurrent_clones') or DEFAULT_MAX_CONCURRENT_CLONES,
+                                # recently pushed repositories can only be listed through the GitHub API
+                                None if CONFIG.get('clone_url_template') else get_github_client(),
+                                int(webhook_port) if webhook_port not in (None, '') else None, CONFIG.get('watch_webhook_secret') or None, logger,
+                                diffstat.DiffstatCache(CONFIG.get('diffstat_cache_path')) if CONFIG['log_submissions'] and CONFIG.get('summarize_changes') else None)
+    logger.info(f"Watching {len(repositories)} repositories of {len(pairs)} assignment(s), polling every ~{watcher.interval:.0f}s (Ctrl+C to stop).")
+    try: watcher.run()
+    except KeyboardInterrupt: pass
+    finally:
+        if CONFIG['log_submissions']: SUBMISSIONS.close()
+        if watcher.diffstat_cache: watcher.diffstat_cache.close()
+    logger.info(f"Stopped watching after {watcher.polls} poll(s), fetched {watcher.fetched} repositories.")
+
+def run_pull(organization_name:str, assignment_name:str, engine:str='gitpython', export_format:str=None):
+    """Pulls the repositories of an assignment without prompting
+
+    Returns:
+        AssignmentPull: the pull, or None if the token is invalid
+    """
+    pulls = run_batch([(organization_name, assignment_name)], engine, export_format)
+    return pulls[0] if pulls else None
+
+def pull_assignments(pairs:list, engine:str='gitpython', rosters:dict=None, export_format:str=None, resume_timestamp:str=None) -> list:
+    """Pulls assignments from organizations as one job: the submission store is opened once, every roster is imported once,
+    and the clones of every assignment share one concurrency budget
+
+    Args:
+        pairs (list): (organization, assignment name) pairs, organizations from the config file
+        engine (str): see `main`
+        rosters (dict): rosters that were already imported, by roster path
+        export_format (str): see `main`
+        resume_timestamp (str): resume the interrupted pull of this timestamp instead of starting a new one
+
+    Returns:
+        list: AssignmentPull of every assignment
+    """
+    global SUBMISSIONS
+    import_pull_modules()
+    timestamp_pulled = resume_timestamp or datetime.datetime.strftime(datetime.datetime.now(), '%m-%d-%Y-%H-%M-%S') # github classroom styled format
+    rosters = dict(rosters or dict())
+    export_format = export_format or CONFIG.get('export_format') or None
+    retry_policy = get_retry_policy() # one circuit breaker for every clone of the job
+
     # initialize submission logs
-    if CONFIG['log_submissions']:
-        global SUBMISSIONS
-        SUBMISSIONS = repo_utils.import_submissions(ORGANIZATION['name'], ORGANIZATION['identifier'], timestamp_pulled, assignment_name)
-    
-    
-    assignment_clone_path = f"{CLONE_PATH}/{assignment_name}-{timestamp_pulled}"
-    os.makedirs(assignment_clone_path)
-    
-    # init file handler to write stdout to file
-    global file_handler
-    file_handler = logging.FileHandler(f"{assignment_clone_path}/README.md")
-    file_handler.setLevel(log_mode)
-    file_handler.addFilter(logging_filter_ansi)
-    logger.addHandler(file_handler)
-    
-    
+    if CONFIG['log_submissions']: SUBMISSIONS = submission_store.open_submission_store(CONFIG)
+
+    pulls = []
+    for organization, assignment_name in pairs:
+        students = get_students(organization, assignment_name, rosters, [name for _, name in pairs])
+        mirror_cache = MirrorCache(CONFIG['mirror_cache_path'], organization['identifier'], get_watch_interval() * 2) if CONFIG.get('mirror_cache_path') else None
+        pulls.append(AssignmentPull(organization, students, assignment_name, timestamp_pulled, mirror_cache, export_format, bool(resume_timestamp), retry_policy))
+
+    # diffstats of new submissions, shared by every pull (`summarize_changes`)
+    diffstat_cache = diffstat.DiffstatCache(CONFIG.get('diffstat_cache_path')) if CONFIG['log_submissions'] and CONFIG.get('summarize_changes') else None
+    for pull in pulls: pull.diffstat_cache = diffstat_cache
+
     # pull repos
+    max_concurrent_clones = CONFIG.get('max_concurrent_clones') or DEFAULT_MAX_CONCURRENT_CLONES
+    scheduler = CloneScheduler(max_concurrent_clones, on_progress=log_scheduler_progress)
     threads = []
-    for identifier, student_name in STUDENTS.items():
-        thread = RepoThread(identifier, student_name, assignment_name, timestamp_pulled)
-        threads.append(thread)
-
-    print()
-    clone_message = f"Cloning to: `{assignment_clone_path}/`..."
-    logger.info("-" * len(clone_message))
-    logger.info(clone_message)
-    logger.info(f"Timestamp pulled: {timestamp_pulled}")
-    logger.info("-" * len(clone_message))
-    for thread in threads: thread.start()
-    for thread in threads: thread.join()
-    
+    for pull in pulls:
+        for thread in pull.prepare():
+            threads.append(thread)
+            # students that have never been pulled before go first
+            scheduler.submit(thread, 0 if pull.is_new_student(thread.get_identifier()) else 1)
+    clone_started = time.monotonic()
+    log(logger, '', event='progress_start', total=len(threads))
+    try:
+        if engine == 'async': asyncio.run(run_clones_async(threads, AsyncGitEngine(max_concurrent_clones)))
+        else:
+            scheduler.start()
+            scheduler.join()
+    finally: log(logger, '', event='progress_end')
+    clone_elapsed = time.monotonic() - clone_started
+
     # Statistics
-    logger.info("-" * 11)
-    logger.info("STATISTICS: ")
-    logger.info("-" * 11)
-    # cloned
-    logger.info(f"{LIGHT_GREEN}Successfully cloned {len(STUDENTS) - len(STUDENTS_NOT_CLONED)}/{len(threads)} repositories...{WHITE}")
-    # not cloned
-    if STUDENTS_NOT_CLONED:
-        logger.info(f"...{LIGHT_RED}`{len(STUDENTS_NOT_CLONED)}` of which were not cloned (double check this!):{WHITE}")
-        for identifier, info in STUDENTS_NOT_CLONED.items():
-            logger.info(f"\t{info['student_name']} ({identifier})")
-            logger.info(f"\t\tClone URL: {info['clone_url']}")
-    logger.info("")
-    # no submissions
-    if STUDENTS_NO_SUBMISSIONS:
-        logger.info(f"{LIGHT_YELLOW}`{len(STUDENTS_NO_SUBMISSIONS)}` of which did not have an active submission since time of pull ({timestamp_pulled}):{WHITE}")
-        for identifier, info in STUDENTS_NO_SUBMISSIONS.items():
-            logger.info(f"\t{info['student_name']} ({identifier})")
-            #print(f"\t\tClone URL: {info['clone_url']}")
-        logger.info("")
-    
+    batch = f" for {len(pulls)} assignments" if len(pulls) > 1 else ""
+    if engine == 'async':
+        clone_summary = f"Cloned in {clone_elapsed:.1f}s{batch} ({len(threads) / clone_elapsed if clone_elapsed else 0:.2f} repos/s, async engine, up to {max_concurrent_clones} concurrent clones)"
+    else:
+        stats = scheduler.stats()
+        clone_summary = f"Cloned in {stats['elapsed']:.1f}s{batch} ({stats['throughput']:.2f} repos/s, concurrency limit {stats['limit']}/{scheduler.max_workers}, backed off {stats['backoffs']} time(s))"
+    for pull in pulls: pull.report(clone_summary)
+    if diffstat_cache: diffstat_cache.close()
+
+    for pull in pulls: pull.analyze_commits()
+
+    # build and test the checkouts (`test_command` of the assignment)
+    if any(get_assignment_config(pull.assignment_name).get('test_command') for pull in pulls):
+        test_cache = grading.TestCache(CONFIG.get('test_cache_path'))
+        try:
+            for pull in pulls: pull.run_tests(test_cache)
+        finally: test_cache.close()
+
+    # link the files that did not change since the previous pulls (`deduplicate_pulls`)
+    if CONFIG.get('deduplicate_pulls'):
+        dedup_index = dedup.DedupIndex(CONFIG.get('dedup_index_path'))
+        try:
+            for pull in pulls: pull.deduplicate(dedup_index)
+        finally: dedup_index.close()
+
+    # mirror cache eviction (once per organization)
+    mirror_caches = {pull.organization['identifier']: pull.mirror_cache for pull in pulls if pull.mirror_cache}
+    for mirror_cache in mirror_caches.values():
+        evicted = mirror_cache.evict(CONFIG.get('mirror_cache_max_age'), CONFIG.get('mirror_cache_max_size'))
+        if evicted: logger.info(f"Evicted {len(evicted)} mirror(s) from the cache ({sum(evicted.values()) / 1024 ** 2:.1f} MB).\n")
+
     # log submissions
     if CONFIG['log_submissions']:
-        repo_utils.save_submissions(SUBMISSIONS)
-        logger.info(f"Uploaded submission logs to {repo_utils.SUBMISSION_LOGS}.")
+        if isinstance(SUBMISSIONS, submission_store.SqliteSubmissionStore):
+            logger.info(f"Submission logs are stored in {CONFIG.get('submission_db_path') or submission_store.SUBMISSION_DB}.")
+            if CONFIG.get('export_submissions_yaml'):
+                SUBMISSIONS.export_yaml(repo_utils.SUBMISSION_LOGS)
+                logger.info(f"Exported submission logs to {repo_utils.SUBMISSION_LOGS}.")
+        else: logger.info(f"Uploaded submission logs to {repo_utils.SUBMISSION_LOGS}.")
+        SUBMISSIONS.close()
+
+    for pull in pulls: pull.close()
+    LOG_PIPELINE.flush()
+    return pulls
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Clones the student repositories of a GitHub Classroom assignment")
+    parser.add_argument('--engine', choices=['gitpython', 'async'], default='gitpython', help="git engine used to clone repositories (default: gitpython)")
+    parser.add_argument('--dissociate', metavar='PULL_FOLDER', help="copy the template objects into every repository of a pull folder, so it no longer depends on `.template.git`")
+    parser.add_argument('--batch', metavar='MANIFEST', help="pull every organization and assignment of a yaml manifest without prompting")
+    parser.add_argument('--pull', nargs=2, action='append', metavar=('ORGANIZATION', 'ASSIGNMENT'), default=[], help="pull an assignment without prompting (repeatable, combined with --batch)")
+    parser.add_argument('--resume', metavar='PULL_FOLDER', help="resume an interrupted pull: keep its complete checkouts and clone the rest again")
+    parser.add_argument('--watch', action='store_true', help="keep the mirror cache of the --pull/--batch assignments in sync until Ctrl+C instead of pulling them")
+    parser.add_argument('--export', choices=archive_export.ARCHIVE_FORMATS, help="stream every repository into one archive per assignment instead of checking them out")
+    args = parser.parse_args()
+    if args.dissociate: print(f"Dissociated {repo_utils.dissociate_repositories(args.dissociate)} repositories from the assignment template.")
+    elif args.resume: run_resume(args.resume, engine=args.engine)
+    elif args.watch: run_watch((load_manifest(args.batch) if args.batch else []) + [tuple(pull) for pull in args.pull])
+    elif args.batch or args.pull: run_batch((load_manifest(args.batch) if args.batch else []) + [tuple(pull) for pull in args.pull], engine=args.engine, export_format=args.export)
+    else: main(engine=args.engine, export_format=args.export)
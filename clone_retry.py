@@ -0,0 +1,132 @@
+from collections import deque
+import random
+import re
+import threading
+import time
+
+"""
+Failure handling of clone jobs
+
+A failed clone is classified from the parsed stderr of git (see repo_utils.parse_git_stderr):
+    permanent   retrying cannot help (the repository does not exist, access is denied, the contents cannot be checked out)
+    transient   timeouts, dropped connections and 5xx errors: retried with bounded exponential backoff and full jitter
+    throttled   the remote is rejecting requests (rate limits, 429/503): retried, and counted by the circuit breaker
+
+Unknown errors are permanent, so a broken repository is not cloned over and over. When several throttled failures happen
+within a short window, the circuit breaker opens and every clone job waits for the cooldown before contacting the remote again.
+"""
+
+PERMANENT = 'permanent'
+TRANSIENT = 'transient'
+THROTTLED = 'throttled'
+ERROR_PATTERNS = [ # first match wins, checked against the full stderr
+    (THROTTLED, re.compile(r'rate limit|too many requests|returned error: (429|503)|abuse detection', re.IGNORECASE)),
+    (PERMANENT, re.compile(r'repository not found|not a git repository|does not appear to be a git repository|returned error: (401|403|404)|'
+                           r'authentication failed|permission denied|checkout failed|invalid path|unable to checkout', re.IGNORECASE)),
+    (TRANSIENT, re.compile(r'timed out|timeout|returned error: 5\d\d|rpc failed|early eof|unexpected disconnect|hung up unexpectedly|'
+                           r'connection (reset|refused|was reset)|could not resolve host|failed to connect|empty reply|'
+                           r'gnutls|ssl_error|ssl connect|tls connection|transfer closed|index-pack failed|http/2 stream', re.IGNORECASE)),
+]
+
+def classify_git_error(stderr_dict:dict) -> str:
+    """Classifies a git failure
+
+    Args:
+        stderr_dict (dict): parsed stderr of git (see repo_utils.parse_git_stderr)
+
+    Returns:
+        str: PERMANENT, TRANSIENT or THROTTLED
+    """
+    stderr = stderr_dict.get('stderr') or ''
+    for kind, pattern in ERROR_PATTERNS:
+        if pattern.search(stderr): return kind
+    return PERMANENT
+
+
+class CircuitBreaker:
+    def __init__(self, threshold:int=5, cooldown:float=30, max_cooldown:float=300, window:float=60):
+        """Pauses every clone job when the remote keeps rejecting requests
+
+        Args:
+            threshold (int): throttled failures within `window` seconds that open the breaker
+            cooldown (float): seconds the breaker stays open, doubled every time it opens again before a clone succeeds
+            max_cooldown (float): longest cooldown
+            window (float): seconds a throttled failure is counted for
+        """
+        self.threshold = max(1, int(threshold))
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.window = window
+        self.trips = 0 # times the breaker opened
+        self.__failures = deque() # times of the recent throttled failures
+        self.__consecutive_trips = 0
+        self.__open_until = 0.0
+        self.__lock = threading.Lock()
+
+    def record_success(self):
+        with self.__lock: self.__consecutive_trips = 0
+
+    def record_failure(self, kind:str) -> bool:
+        """Records a failed clone
+
+        Returns:
+            bool: whether the failure opened the breaker
+        """
+        if kind != THROTTLED: return False
+        now = time.monotonic()
+        with self.__lock:
+            self.__failures.append(now)
+            while self.__failures[0] < now - self.window: self.__failures.popleft()
+            if len(self.__failures) < self.threshold or now < self.__open_until: return False
+            self.__failures.clear()
+            self.__open_until = now + min(self.max_cooldown, self.cooldown * 2 ** self.__consecutive_trips)
+            self.__consecutive_trips += 1
+            self.trips += 1
+            return True
+
+    def get_wait(self) -> float:
+        """Gets the seconds to wait before contacting the remote (0 when the breaker is closed)
+        """
+        with self.__lock: return max(0.0, self.__open_until - time.monotonic())
+
+    def wait(self):
+        """Blocks while the breaker is open
+        """
+        while True:
+            wait = self.get_wait()
+            if not wait: return
+            time.sleep(wait)
+
+
+class RetryPolicy:
+    def __init__(self, max_retries:int=3, base_delay:float=2, max_delay:float=60, breaker:CircuitBreaker=None):
+        """Bounded exponential backoff with full jitter for transient clone failures, shared by every clone job of a pull
+
+        Args:
+            max_retries (int): retries after the first attempt (0 disables retries)
+            base_delay (float): seconds of the first backoff, doubled for every retry
+            max_delay (float): longest backoff
+            breaker (CircuitBreaker): circuit breaker shared by every clone job
+        """
+        self.max_retries = max(0, int(max_retries))
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.breaker = breaker or CircuitBreaker()
+
+    def get_delay(self, attempt:int) -> float:
+        """Gets the backoff before a retry (full jitter: a random delay up to the exponential bound)
+
+        Args:
+            attempt (int): number of attempts that already failed
+        """
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+    def should_retry(self, kind:str, attempt:int) -> bool:
+        """Records a failure and decides whether to retry it
+
+        Args:
+            kind (str): classification of the failure (see classify_git_error)
+            attempt (int): number of attempts that already failed, including this one
+        """
+        self.breaker.record_failure(kind)
+        return kind != PERMANENT and attempt <= self.max_retries
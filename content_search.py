@@ -0,0 +1,310 @@
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import argparse
+import csv
+import hashlib
+import json
+import mmap
+import os
+import re
+import sqlite3
+import stat
+import subprocess
+import yaml
+import prune_utils
+import repo_utils
+
+"""
+Content search across the student repositories of a pull folder (grading classwork)
+
+Rules are read from a yaml file:
+
+    paths:                                  # files searched by every rule (glob patterns relative to each repository)
+      - src/main/java/unit03/**/*.java
+    rules:
+      - name: reads-input
+        pattern: "new Scanner\\(System\\.in\\)"     # regular expression
+      - name: greets
+        literal: "Hello"                    # plain text
+        ignore_case: yes
+        paths: [src/main/java/unit03/Main.java]     # only search these files (optional)
+      - name: no-exit
+        pattern: "System\\.exit"
+        absent: yes                         # passes when nothing matches
+
+A rule passes for a student when any of its files matches (or none does, with `absent`).
+
+Files are listed from the git index (`git ls-files -s`) with their blob sha, so a file shared by every student
+(i.e. from the template) is scanned once, and results are cached by blob sha (SEARCH_CACHE) so unchanged files are
+never scanned again in later pulls. The blob sha of HEAD (`git ls-tree`) is only used for files whose working tree bytes
+are that blob (unchanged in `git diff-index HEAD` and of the same size, so line ending conversions and filters are left
+out); edited or converted files are hashed like `git hash-object`. The search never writes to the repositories (not even
+their index). Uncached files are scanned in parallel through mmap.
+
+Usage:
+    py content_search.py <pull_folder> <rules.yml> [--workers N] [--cache PATH] [--no-cache]
+"""
+
+SEARCH_CACHE = "config/search_cache.db" # blob sha -> match count of every rule
+DEFAULT_MAX_WORKERS = os.cpu_count() or 4
+RESULTS_FILE = "search_results.csv"
+
+def compile_glob(pattern:str) -> re.Pattern:
+    """Compiles a glob pattern (`*`, `?` and `**` for any number of folders) into a regular expression over repository paths
+    """
+    regex = ''
+    i = 0
+    while i < len(pattern):
+        if pattern.startswith('**/', i): regex, i = regex + '(?:.*/)?', i + 3
+        elif pattern.startswith('**', i): regex, i = regex + '.*', i + 2
+        elif pattern[i] == '*': regex, i = regex + '[^/]*', i + 1
+        elif pattern[i] == '?': regex, i = regex + '[^/]', i + 1
+        else: regex, i = regex + re.escape(pattern[i]), i + 1
+    return re.compile(regex + r'\Z')
+
+def load_rules(rules_path:str) -> list:
+    """Loads the search rules from a yaml file
+
+    Returns:
+        list: rules as dict of `name`, `key` (cache key), `kind` (`pattern` or `literal`), `needle`, `ignore_case`, `absent` and `paths` (compiled globs)
+    """
+    with open(rules_path, 'r') as file:
+        config = yaml.load(file, Loader=repo_utils.YAML_LOADER) or dict()
+    if not config.get('rules'): raise RuntimeError(f"There are no rules in {rules_path}")
+    rules = []
+    for rule in config['rules']:
+        kind = 'pattern' if 'pattern' in rule else 'literal'
+        if kind not in rule: raise RuntimeError(f"The rule `{rule.get('name')}` needs a `pattern` or a `literal` ({rules_path})")
+        paths = rule.get('paths') or config.get('paths') or ['**']
+        ignore_case = bool(rule.get('ignore_case'))
+        needle = str(rule[kind])
+        if kind == 'pattern': re.compile(needle) # fail before scanning if the expression is invalid
+        rules.append({
+            'name': rule.get('name') or needle,
+            'key': hashlib.sha256(json.dumps([kind, needle, ignore_case]).encode()).hexdigest(), # what a match count depends on
+            'kind': kind,
+            'needle': needle,
+            'ignore_case': ignore_case,
+            'absent': bool(rule.get('absent')),
+            'paths': [compile_glob(path.strip('/')) for path in paths],
+        })
+    return rules
+
+def get_repositories(pull_path:str) -> dict:
+    """Gets the student repositories of a pull folder (hidden folders such as `.template.git` are skipped)
+
+    Returns:
+        dict: mapping of the student (repository folder without the assignment prefix) to its path
+    """
+    prefix = f"{prune_utils.get_assignment_name(os.path.basename(os.path.normpath(pull_path)))}-"
+    repositories = dict()
+    with os.scandir(pull_path) as entries:
+        for entry in entries:
+            if entry.name.startswith('.') or not entry.is_dir(): continue
+            repositories[entry.name.removeprefix(prefix)] = entry.path
+    return dict(sorted(repositories.items()))
+
+def list_files(repo_path:str) -> dict:
+    """Lists the checked out files of a repository with the blob sha of their working tree contents. The blob of HEAD
+    (`git ls-tree`) is used for files that git reports as unchanged from HEAD (without refreshing the index, which would
+    write to it, so files whose inode changed are hashed too), the other files are hashed
+
+    Returns:
+        dict: mapping of the path (relative to the repository) to its blob sha
+    """
+    process = subprocess.run(['git', 'ls-files', '--stage', '-v', '-z'], cwd=repo_path, capture_output=True)
+    tree = subprocess.run(['git', 'ls-tree', '-r', '-l', '-z', '--full-tree', 'HEAD'], cwd=repo_path, capture_output=True)
+    changed = subprocess.run(['git', 'diff-index', '--name-only', '-z', 'HEAD', '--'], cwd=repo_path, capture_output=True)
+    files = dict()
+    if process.returncode != 0: return files
+    head_blobs = dict() # path -> (blob, size) of HEAD, empty if the repository has no commit
+    if tree.returncode == 0 and changed.returncode == 0:
+        for record in tree.stdout.decode(errors='replace').split('\0'):
+            if not record: continue
+            info, path = record.split('\t', 1)
+            _, kind, blob, size = info.split()
+            if kind == 'blob': head_blobs[path] = (blob, int(size))
+    changed_paths = set(changed.stdout.decode(errors='replace').split('\0'))
+    for record in process.stdout.decode(errors='replace').split('\0'):
+        if not record: continue
+        info, path = record.split('\t', 1)
+        tag, mode, _, _ = info.split(' ')
+        if tag == 'S' or mode not in ('100644', '100755'): continue # skip paths outside the sparse checkout, links and submodules
+        file_path = os.path.join(repo_path, path)
+        # assume-unchanged entries (lowercase tag) are never compared to the working tree
+        blob, size = head_blobs.get(path, (None, None)) if tag == 'H' and path not in changed_paths else (None, None)
+        try:
+            stat_info = os.stat(file_path)
+            if not stat.S_ISREG(stat_info.st_mode): continue
+            files[path] = blob if size == stat_info.st_size else repo_utils.hash_file(file_path, stat_info.st_size).hex()
+        except OSError: continue # deleted from the working tree
+    return files
+
+def scan_file(file_path:str, needles:list) -> list:
+    """Counts the matches of every needle in a file (run in a worker process)
+
+    Args:
+        file_path (str): path of the file
+        needles (list): (`kind`, `needle`, `ignore_case`) of every rule to scan for
+
+    Returns:
+        list: number of matches of every needle, or None if the file could not be read
+    """
+    try:
+        with open(file_path, 'rb') as file:
+            size = os.fstat(file.fileno()).st_size
+            contents = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) if size else b'' # empty files can't be mapped
+    except OSError: return None
+    try:
+        counts = []
+        for kind, needle, ignore_case in needles:
+            needle = needle.encode()
+            if kind == 'literal' and not ignore_case:
+                # count the literal without the regex engine
+                count, position = 0, contents.find(needle)
+                while position != -1: count, position = count + 1, contents.find(needle, position + len(needle))
+            else:
+                expression = needle if kind == 'pattern' else re.escape(needle)
+                count = sum(1 for _ in re.finditer(expression, contents, re.MULTILINE | (re.IGNORECASE if ignore_case else 0)))
+            counts.append(count)
+        return counts
+    finally:
+        if size: contents.close()
+
+
+class SearchCache:
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS matches (
+            blob TEXT NOT NULL,
+            rule TEXT NOT NULL,
+            count INTEGER NOT NULL,
+            PRIMARY KEY (blob, rule)
+        ) WITHOUT ROWID;
+    """
+
+    def __init__(self, path:str=None):
+        """Match counts of every rule cached by blob sha. Blobs never change, so entries never expire
+
+        Args:
+            path (str): path of the sqlite database (defaults to SEARCH_CACHE)
+        """
+        self.__connection = sqlite3.connect(path or SEARCH_CACHE)
+        self.__connection.executescript(self.SCHEMA)
+
+    def get(self, blobs:set, rule_keys:list) -> dict:
+        """Gets the cached match counts
+
+        Returns:
+            dict: mapping of (blob, rule key) to the match count
+        """
+        counts = dict()
+        blobs = list(blobs)
+        rule_placeholders = ','.join('?' * len(rule_keys))
+        for i in range(0, len(blobs), 500): # stay under the sqlite variable limit
+            chunk = blobs[i:i + 500]
+            query = f"SELECT blob, rule, count FROM matches WHERE blob IN ({','.join('?' * len(chunk))}) AND rule IN ({rule_placeholders})"
+            for blob, rule, count in self.__connection.execute(query, [*chunk, *rule_keys]): counts[(blob, rule)] = count
+        return counts
+
+    def put(self, counts:dict):
+        with self.__connection: self.__connection.executemany("INSERT OR REPLACE INTO matches VALUES (?, ?, ?)", [(*key, count) for key, count in counts.items()])
+
+    def close(self):
+        self.__connection.close()
+
+
+def search(pull_path:str, rules:list, max_workers:int=DEFAULT_MAX_WORKERS, cache:SearchCache=None) -> dict:
+    """Runs the rules against every student repository of a pull folder
+
+    Args:
+        pull_path (str): pull folder (`<assignment>-<timestamp>`)
+        rules (list): rules (see load_rules)
+        max_workers (int): number of processes scanning files
+        cache (SearchCache): cache of the match counts (None to scan every file)
+
+    Returns:
+        dict: `matrix` (student -> rule name -> passed), `matches` (student -> rule name -> matching files),
+              `files` (files searched across every student), `blobs` (distinct contents) and `scanned` (contents not answered by the cache)
+    """
+    repositories = get_repositories(pull_path)
+    with ThreadPoolExecutor(max_workers) as executor: files = dict(zip(repositories, executor.map(list_files, repositories.values())))
+
+    # the (blob, rule) pairs to answer, and a checked out path of every blob
+    wanted = dict()
+    blob_paths = dict()
+    for student, student_files in files.items():
+        for path, blob in student_files.items():
+            for rule in rules:
+                if any(glob.match(path) for glob in rule['paths']):
+                    wanted.setdefault(blob, set()).add(rule['key'])
+                    blob_paths.setdefault(blob, os.path.join(repositories[student], path))
+
+    rule_keys = [rule['key'] for rule in rules]
+    counts = cache.get(set(wanted), rule_keys) if cache else dict()
+    needles = {rule['key']: (rule['kind'], rule['needle'], rule['ignore_case']) for rule in rules}
+    jobs = [(blob, [key for key in keys if (blob, key) not in counts]) for blob, keys in wanted.items()]
+    jobs = [(blob, keys) for blob, keys in jobs if keys]
+
+    scanned = dict()
+    if jobs:
+        with ProcessPoolExecutor(max_workers) as executor:
+            results = executor.map(scan_file, [blob_paths[blob] for blob, _ in jobs], [[needles[key] for key in keys] for _, keys in jobs], chunksize=64)
+            for (blob, keys), result in zip(jobs, results):
+                if result is None: continue # unreadable files are not cached
+                for key, count in zip(keys, result): scanned[(blob, key)] = count
+        if cache: cache.put(scanned)
+    counts.update(scanned)
+
+    matrix = dict()
+    matches = dict()
+    for student, student_files in files.items():
+        matrix[student], matches[student] = dict(), dict()
+        for rule in rules:
+            matching = [path for path, blob in student_files.items() if any(glob.match(path) for glob in rule['paths']) and counts.get((blob, rule['key']))]
+            matches[student][rule['name']] = matching
+            matrix[student][rule['name']] = not matching if rule['absent'] else bool(matching)
+    searched = sum(1 for student_files in files.values() for path in student_files if any(glob.match(path) for rule in rules for glob in rule['paths']))
+    return {'matrix': matrix, 'matches': matches, 'files': searched, 'blobs': len(wanted), 'scanned': len({blob for blob, _ in scanned})}
+
+def write_results(pull_path:str, rules:list, results:dict) -> str:
+    """Writes the pass/fail matrix to `search_results.csv` in the pull folder
+
+    Returns:
+        str: path of the csv file
+    """
+    results_path = os.path.join(pull_path, RESULTS_FILE)
+    names = [rule['name'] for rule in rules]
+    with open(results_path, 'w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(['student', *names, 'passed'])
+        for student, row in results['matrix'].items():
+            writer.writerow([student, *('pass' if row[name] else 'fail' for name in names), f"{sum(row.values())}/{len(names)}"])
+    return results_path
+
+def print_matrix(rules:list, results:dict):
+    names = [rule['name'] for rule in rules]
+    width = max([len('student'), *(len(student) for student in results['matrix'])])
+    print(f"{'student':<{width}}  " + '  '.join(names))
+    for student, row in results['matrix'].items():
+        print(f"{student:<{width}}  " + '  '.join(f"{'pass' if row[name] else 'FAIL':<{len(name)}}" for name in names))
+    for name in names:
+        passed = sum(row[name] for row in results['matrix'].values())
+        print(f"\t{name}: {passed}/{len(results['matrix'])} passed")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Searches the student repositories of a pull folder with the rules of a yaml file")
+    parser.add_argument('pull_folder', help="pull folder (`<assignment>-<timestamp>`)")
+    parser.add_argument('rules', help="yaml file with the search rules")
+    parser.add_argument('--workers', type=int, default=DEFAULT_MAX_WORKERS, help=f"processes scanning files (default: {DEFAULT_MAX_WORKERS})")
+    parser.add_argument('--cache', default=SEARCH_CACHE, help=f"sqlite cache of the results by blob sha (default: {SEARCH_CACHE})")
+    parser.add_argument('--no-cache', action='store_true', help="scan every file again")
+    args = parser.parse_args()
+
+    rules = load_rules(args.rules)
+    cache = None if args.no_cache else SearchCache(args.cache)
+    try: results = search(args.pull_folder, rules, args.workers, cache)
+    finally:
+        if cache: cache.close()
+    print_matrix(rules, results)
+    print(f"\nSearched {results['files']} file(s) with {results['blobs']} distinct contents, {results['scanned']} of which were scanned (the rest were cached).")
+    print(f"Results written to {write_results(args.pull_folder, rules, results)}")
@@ -0,0 +1,377 @@
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import os
+import shutil
+import sqlite3
+import stat
+import subprocess
+import sys
+import repo_utils
+
+"""
+Content-addressed deduplication of the checkouts in pull folders
+
+Every pull writes a new `<assignment>-<timestamp>` folder, and most files are byte-identical to the previous pull (and to
+the template). Files of every checkout are keyed by their git blob id: files that match HEAD are read from the repository
+(`git ls-tree`, no hashing), the others (local changes, untracked files, line ending conversions) are hashed the same way
+git does. DEDUP_INDEX maps every blob id (per filesystem and executable bit) to one canonical file, and duplicates are
+replaced with a link to it:
+
+    reflink     the file shares the disk blocks of the canonical file (btrfs, xfs, APFS), and writing to either copies them
+                first, so the files stay independent
+    hardlink    the file becomes another name of the canonical file. Linked files are made read-only, because a write would
+                change every pull at once: git and editors that save by replacing the file are safe, and `--unshare` gives
+                a folder private, writable copies before editing files in place
+
+`auto` uses reflinks where the filesystem supports them and hardlinks elsewhere. Replacements are atomic (a link is created
+next to the file and renamed over it), files that changed since they were indexed are never linked to, and only files whose
+last copy is replaced count as reclaimed.
+
+Run after every pull with `deduplicate_pulls`, or on a folder (defaults to `clone_output_path`, run it once to index the pulls
+made before enabling it):
+    py dedup.py [<folder>] [--mode auto|reflink|hardlink] [--min-size 4KB] [--dry-run] [--workers N]
+    py dedup.py --unshare <folder>
+"""
+
+DEDUP_INDEX = "config/dedup_index.db" # (blob id, device, executable) -> canonical file
+DEFAULT_MAX_WORKERS = min(32, (os.cpu_count() or 4) * 4) # checkouts scanned at the same time (git processes and file reads)
+LINK_MODES = ['auto', 'reflink', 'hardlink']
+FICLONE = 0x40049409 # linux ioctl sharing the extents of a file with another one
+WRITE_BITS = stat.S_IWUSR | stat.S_IWGRP | stat.S_IWOTH
+
+class DedupIndex:
+    SCHEMA = """
+        PRAGMA journal_mode = WAL;
+        CREATE TABLE IF NOT EXISTS objects (
+            hash BLOB NOT NULL,
+            device INTEGER NOT NULL,
+            executable INTEGER NOT NULL,
+            path TEXT NOT NULL,
+            inode INTEGER NOT NULL,
+            size INTEGER NOT NULL,
+            mtime_ns INTEGER NOT NULL,
+            PRIMARY KEY (hash, device, executable)
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS reflinks (
+            path TEXT PRIMARY KEY,
+            inode INTEGER NOT NULL,
+            mtime_ns INTEGER NOT NULL
+        ) WITHOUT ROWID;
+    """
+
+    def __init__(self, path:str=None):
+        """Canonical file of every blob id, and the files already replaced with a reflink (they keep their own inode)
+
+        Args:
+            path (str): path of the sqlite database (defaults to DEDUP_INDEX)
+        """
+        self.__connection = sqlite3.connect(path or DEDUP_INDEX)
+        self.__connection.executescript(self.SCHEMA)
+        self.__connection.execute("PRAGMA synchronous = NORMAL")
+
+    def get(self, keys:set) -> dict:
+        """Gets the canonical files of blob ids
+
+        Args:
+            keys (set): (blob id, device, executable) keys
+
+        Returns:
+            dict: key -> (path, inode, size, mtime_ns)
+        """
+        canonicals = dict()
+        hashes = list({key[0] for key in keys})
+        for i in range(0, len(hashes), 500): # stay under the sqlite variable limit
+            chunk = hashes[i:i + 500]
+            query = f"SELECT hash, device, executable, path, inode, size, mtime_ns FROM objects WHERE hash IN ({','.join('?' * len(chunk))})"
+            for digest, device, executable, path, inode, size, mtime_ns in self.__connection.execute(query, chunk):
+                key = (digest, device, bool(executable))
+                if key in keys: canonicals[key] = (path, inode, size, mtime_ns)
+        return canonicals
+
+    def get_reflinks(self, paths:list) -> dict:
+        """Gets the files that were replaced with a reflink
+
+        Returns:
+            dict: path -> (inode, mtime_ns) after the replacement
+        """
+        reflinks = dict()
+        for i in range(0, len(paths), 500):
+            chunk = paths[i:i + 500]
+            for path, inode, mtime_ns in self.__connection.execute(f"SELECT path, inode, mtime_ns FROM reflinks WHERE path IN ({','.join('?' * len(chunk))})", chunk):
+                reflinks[path] = (inode, mtime_ns)
+        return reflinks
+
+    def put(self, canonicals:dict, reflinks:dict):
+        with self.__connection:
+            self.__connection.executemany("INSERT OR REPLACE INTO objects VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                          [(*key[:2], int(key[2]), *canonical) for key, canonical in canonicals.items()])
+            self.__connection.executemany("INSERT OR REPLACE INTO reflinks VALUES (?, ?, ?)", [(path, *reflink) for path, reflink in reflinks.items()])
+
+    def close(self):
+        self.__connection.close()
+
+
+def get_git_blobs(checkout_path:str) -> dict:
+    """Gets the blob id of every file of HEAD that is unchanged in the working tree (after refreshing the index, so files whose
+    inode changed, i.e. linked by a previous run, are compared by content)
+
+    Returns:
+        dict: path relative to the checkout (with `/`) -> (blob id, blob size), empty if the checkout has no commit
+    """
+    subprocess.run(['git', 'update-index', '-q', '--refresh'], cwd=checkout_path, capture_output=True)
+    changed = subprocess.run(['git', 'diff-index', '--name-only', '-z', 'HEAD', '--'], cwd=checkout_path, capture_output=True)
+    tree = subprocess.run(['git', 'ls-tree', '-r', '-l', '-z', '--full-tree', 'HEAD'], cwd=checkout_path, capture_output=True)
+    if changed.returncode != 0 or tree.returncode != 0: return dict()
+    changed_paths = set(changed.stdout.split(b'\0'))
+    blobs = dict()
+    for entry in tree.stdout.split(b'\0'):
+        info, _, path = entry.partition(b'\t')
+        if not path or path in changed_paths: continue
+        mode, kind, blob, size = info.split()
+        if kind == b'blob' and mode != b'120000': blobs[os.fsdecode(path)] = (bytes.fromhex(blob.decode()), int(size))
+    return blobs
+
+def scan_checkout(checkout_path:str, min_size:int=1) -> tuple:
+    """Gets the blob id of every file of a checkout (`.git` is left out)
+
+    Args:
+        checkout_path (str): student checkout
+        min_size (int): smaller files are left out (empty files take no space)
+
+    Returns:
+        tuple: (path, blob id, stat) of every file, and the number of files that had to be hashed
+    """
+    blobs = get_git_blobs(checkout_path)
+    files = []
+    hashed = 0
+    folders = ['']
+    while folders:
+        relative_path = folders.pop()
+        try: entries = list(os.scandir(os.path.join(checkout_path, relative_path)))
+        except OSError: continue
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                if entry.name != '.git': folders.append(f"{relative_path}{entry.name}/")
+                continue
+            if not entry.is_file(follow_symlinks=False): continue # symlinks, sockets...
+            stat_info = entry.stat(follow_symlinks=False)
+            if stat_info.st_size < min_size: continue
+            blob = blobs.get(relative_path + entry.name)
+            if blob and blob[1] == stat_info.st_size: files.append((entry.path, blob[0], stat_info))
+            else:
+                # not in HEAD, changed, or converted on checkout (i.e. line endings change the size)
+                try: files.append((entry.path, repo_utils.hash_file(entry.path, stat_info.st_size), stat_info))
+                except OSError: continue
+                hashed += 1
+    return files, hashed
+
+def find_checkouts(path:str) -> list:
+    """Finds the checkouts under a folder (clone_output_path, an organization or a pull folder). Hidden folders (the template,
+    exports, build logs) and linked checkouts of unchanged submissions are not entered
+
+    Returns:
+        list: paths of the checkouts, sorted
+    """
+    if os.path.exists(os.path.join(path, '.git')): return [path]
+    checkouts = []
+    folders = [path]
+    while folders:
+        folder = folders.pop()
+        try: entries = list(os.scandir(folder))
+        except OSError: continue
+        for entry in entries:
+            if entry.name.startswith('.') or not entry.is_dir(follow_symlinks=False): continue
+            if os.path.exists(os.path.join(entry.path, '.git')): checkouts.append(entry.path)
+            else: folders.append(entry.path)
+    return sorted(checkouts)
+
+def reflink(source:str, destination:str) -> bool:
+    """Creates `destination` sharing the disk blocks of `source` (copy-on-write clone)
+
+    Returns:
+        bool: False if the filesystem or the platform can't clone files
+    """
+    try:
+        if sys.platform.startswith('linux'):
+            import fcntl
+            with open(source, 'rb') as source_file, open(destination, 'wb') as destination_file: fcntl.ioctl(destination_file.fileno(), FICLONE, source_file.fileno())
+            return True
+        if sys.platform == 'darwin':
+            import ctypes
+            return ctypes.CDLL(None, use_errno=True).clonefile(os.fsencode(source), os.fsencode(destination), 0) == 0
+    except OSError: pass
+    if os.path.exists(destination): os.remove(destination)
+    return False
+
+def format_size(size:int) -> str:
+    return f"{size / 1024 ** 3:.2f} GB" if size >= 1024 ** 3 else f"{size / 1024 ** 2:.1f} MB"
+
+
+class Deduplicator:
+    def __init__(self, index:DedupIndex, mode:str='auto', min_size:int=1, dry_run:bool=False, max_workers:int=DEFAULT_MAX_WORKERS):
+        """Replaces duplicate files of checkouts with links to their canonical file
+
+        Args:
+            index (DedupIndex): canonical files (shared by every run, so new pulls are linked to the previous ones)
+            mode (str): `auto`, `reflink` or `hardlink` (see LINK_MODES)
+            min_size (int): smaller files are left alone
+            dry_run (bool): only count what would be linked and reclaimed
+            max_workers (int): checkouts scanned at the same time
+        """
+        if mode not in LINK_MODES: raise ValueError(f"Unknown link mode `{mode}` (expected {', '.join(LINK_MODES)})")
+        self.index = index
+        self.mode = mode
+        self.min_size = max(1, min_size)
+        self.dry_run = dry_run
+        self.max_workers = max(1, max_workers)
+        self.stats = {'checkouts': 0, 'files': 0, 'hashed': 0, 'reflinked': 0, 'hardlinked': 0, 'already_linked': 0, 'reclaimed': 0}
+        self.__reflink_devices = dict() # device -> whether reflinks work on it (found with the first link)
+        self.__dry_run_canonicals = dict() # canonical files found by a dry run, which does not write the index
+
+    def run(self, path:str) -> dict:
+        """Deduplicates every checkout under a folder
+
+        Returns:
+            dict: `checkouts` and `files` scanned, files `hashed` (not read from git), `reflinked`, `hardlinked` and `already_linked`, and bytes `reclaimed`
+        """
+        checkouts = find_checkouts(path)
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            # checkouts are scanned in parallel and linked in order, one at a time (links of one checkout may point into the previous ones)
+            for checkout_path, (files, hashed) in zip(checkouts, executor.map(lambda checkout_path: scan_checkout(checkout_path, self.min_size), checkouts)):
+                self.stats['checkouts'] += 1
+                self.stats['files'] += len(files)
+                self.stats['hashed'] += hashed
+                if self.link_checkout(files) and not self.dry_run:
+                    # linked files have a new inode: refresh the stat information of the index, so `git status` doesn't hash them again
+                    subprocess.run(['git', 'update-index', '-q', '--refresh'], cwd=checkout_path, capture_output=True)
+        return self.stats
+
+    def link_checkout(self, files:list) -> int:
+        """Links the files of a checkout to their canonical file, and makes the other files canonical
+
+        Returns:
+            int: number of files replaced with a link
+        """
+        keys = {(digest, stat_info.st_dev, bool(stat_info.st_mode & 0o111)) for _, digest, stat_info in files}
+        canonicals = {**self.index.get(keys), **{key: self.__dry_run_canonicals[key] for key in keys if key in self.__dry_run_canonicals}}
+        reflinked = self.index.get_reflinks([path for path, _, _ in files])
+        new_canonicals = dict()
+        new_reflinks = dict()
+        linked = 0
+        for path, digest, stat_info in files:
+            key = (digest, stat_info.st_dev, bool(stat_info.st_mode & 0o111))
+            canonical = new_canonicals.get(key) or canonicals.get(key)
+            if canonical and not self.is_unchanged(*canonical): canonical = None # edited, moved or deleted since it was indexed
+            if canonical is None:
+                new_canonicals[key] = (path, stat_info.st_ino, stat_info.st_size, stat_info.st_mtime_ns)
+                continue
+            if canonical[1] == stat_info.st_ino or reflinked.get(path) == (stat_info.st_ino, stat_info.st_mtime_ns):
+                self.stats['already_linked'] += 1
+                continue
+            link_mode = self.link(canonical[0], path, stat_info)
+            if not link_mode: continue
+            self.stats[f"{link_mode}ed"] += 1
+            if stat_info.st_nlink == 1: self.stats['reclaimed'] += stat_info.st_size # other names keep the blocks of the replaced file
+            if link_mode == 'reflink' and not self.dry_run:
+                replaced = os.lstat(path)
+                new_reflinks[path] = (replaced.st_ino, replaced.st_mtime_ns)
+            linked += 1
+        if self.dry_run: self.__dry_run_canonicals.update(new_canonicals)
+        else: self.index.put(new_canonicals, new_reflinks)
+        return linked
+
+    def is_unchanged(self, path:str, inode:int, size:int, mtime_ns:int) -> bool:
+        try: stat_info = os.lstat(path)
+        except OSError: return False
+        return (stat_info.st_ino, stat_info.st_size, stat_info.st_mtime_ns) == (inode, size, mtime_ns) and stat.S_ISREG(stat_info.st_mode)
+
+    def link(self, source:str, destination:str, stat_info:os.stat_result) -> str:
+        """Atomically replaces a file with a link to its canonical file
+
+        Args:
+            source (str): canonical file
+            destination (str): duplicate file
+            stat_info (os.stat_result): stat of the duplicate when it was hashed (it is left alone if it changed since)
+
+        Returns:
+            str: `reflink` or `hardlink`, or None if the file was not replaced
+        """
+        use_reflink = self.mode != 'hardlink' and self.__reflink_devices.get(stat_info.st_dev, True)
+        if self.dry_run: return 'reflink' if use_reflink and self.mode == 'reflink' else 'hardlink'
+        if not self.is_unchanged(destination, stat_info.st_ino, stat_info.st_size, stat_info.st_mtime_ns): return None
+        temporary_path = f"{destination}.dedup-{os.getpid()}"
+        try:
+            if use_reflink:
+                if reflink(source, temporary_path):
+                    self.__reflink_devices[stat_info.st_dev] = True
+                    shutil.copystat(destination, temporary_path)
+                    os.replace(temporary_path, destination)
+                    return 'reflink'
+                self.__reflink_devices[stat_info.st_dev] = False
+                if self.mode == 'reflink': return None
+            # hardlinked files are read-only: a write in place would change every pull that shares the file
+            source_mode = stat.S_IMODE(os.lstat(source).st_mode)
+            if source_mode & WRITE_BITS: os.chmod(source, source_mode & ~WRITE_BITS)
+            os.link(source, temporary_path)
+            os.replace(temporary_path, destination)
+            return 'hardlink'
+        except OSError:
+            if os.path.lexists(temporary_path): os.remove(temporary_path)
+            return None
+
+
+def unshare(path:str) -> int:
+    """Gives every hardlinked file under a folder (i.e. a checkout a TA wants to edit) a private, writable copy
+
+    Returns:
+        int: number of files copied
+    """
+    copied = 0
+    for folder, folder_names, file_names in os.walk(path):
+        if '.git' in folder_names: folder_names.remove('.git')
+        for file_name in file_names:
+            file_path = os.path.join(folder, file_name)
+            stat_info = os.lstat(file_path)
+            if not stat.S_ISREG(stat_info.st_mode): continue
+            if stat_info.st_nlink > 1:
+                temporary_path = f"{file_path}.dedup-{os.getpid()}"
+                shutil.copy2(file_path, temporary_path)
+                os.replace(temporary_path, file_path)
+                copied += 1
+            if not stat_info.st_mode & stat.S_IWUSR: os.chmod(file_path, stat.S_IMODE(stat_info.st_mode) | stat.S_IWUSR)
+    return copied
+
+def format_stats(stats:dict, dry_run:bool=False) -> str:
+    """Formats the statistics of a run, i.e. `Linked 1200 duplicate files of 40 checkouts (1100 hardlinks, 100 reflinks), reclaiming 250.0 MB`
+    """
+    linked = stats['hardlinked'] + stats['reflinked']
+    kinds = ', '.join(f"{stats[kind + 'ed']} {kind}s" for kind in ('hardlink', 'reflink') if stats[kind + 'ed'])
+    return (f"{'Would link' if dry_run else 'Linked'} {linked} duplicate file(s) of {stats['files']} in {stats['checkouts']} checkout(s){f' ({kinds})' if kinds else ''}, "
+            f"{'reclaiming' if dry_run else 'reclaimed'} {format_size(stats['reclaimed'])}. {stats['already_linked']} file(s) were already linked, {stats['hashed']} had to be hashed.")
+
+def main():
+    parser = argparse.ArgumentParser(description="Replaces files that are duplicated across pull folders with links to one copy")
+    parser.add_argument('path', nargs='?', help="folder to deduplicate (defaults to `clone_output_path` from the config file)")
+    parser.add_argument('--mode', choices=LINK_MODES, help="reflinks, hardlinks, or reflinks where the filesystem supports them (default: `dedup_mode` from the config file, or auto)")
+    parser.add_argument('--min-size', default='1B', help="leave smaller files alone (B, KB, MB; default: 1B)")
+    parser.add_argument('--index', help=f"sqlite index of the canonical files (default: `dedup_index_path` from the config file, or {DEDUP_INDEX})")
+    parser.add_argument('--dry-run', action='store_true', help="only report what would be linked")
+    parser.add_argument('--workers', type=int, default=DEFAULT_MAX_WORKERS, help="checkouts scanned at the same time")
+    parser.add_argument('--unshare', metavar='FOLDER', help="give every linked file under a folder a private, writable copy instead")
+    args = parser.parse_args()
+
+    if args.unshare:
+        print(f"Copied {unshare(args.unshare)} linked file(s) under {args.unshare}.")
+        return
+    config = dict()
+    if not args.path or not args.mode or not args.index:
+        import cloneRepos
+        config = cloneRepos.import_config()
+    index = DedupIndex(args.index or config.get('dedup_index_path'))
+    try: stats = Deduplicator(index, args.mode or config.get('dedup_mode') or 'auto', repo_utils.parse_size_string(args.min_size), args.dry_run, args.workers).run(args.path or config['clone_output_path'])
+    finally: index.close()
+    print(format_stats(stats, args.dry_run))
+
+
+if __name__ == "__main__":
+    main()
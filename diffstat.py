@@ -0,0 +1,174 @@
+from datetime import datetime
+import argparse
+import json
+import sqlite3
+import subprocess
+import threading
+import repo_utils
+
+"""
+Change summaries of student submissions between pulls
+
+The diffstat of a new submission is computed from the commit hash stored by the last pull to the new HEAD by comparing their
+trees in the object database (`git diff --raw --numstat` between two commits never touches a working tree, so no second
+checkout is needed), and the size of every added or modified file is read with one `git cat-file --batch-check`.
+
+Diffstats are cached by (old commit, new commit) in DIFFSTAT_CACHE: a pull that runs again, or a pull after the watcher
+already summarized the change in the mirror, reads them from the cache instead of running git.
+
+    files           changed files: path, status (A, M, D, T), insertions and deletions (None for binary files) and size (bytes, None if deleted)
+    insertions      lines added across the text files
+    deletions       lines removed across the text files
+    large_files     added or modified files larger than `diffstat_large_file_size` (path and size)
+
+Run after every pull with `summarize_changes`, or between two commits of a repository:
+    py diffstat.py <repo_path> <old_commit> [<new_commit>] [--large-file-size 5MB]
+"""
+
+DIFFSTAT_CACHE = "config/diffstat_cache.db" # (old commit, new commit) -> changed files
+DEFAULT_LARGE_FILE_SIZE = "5MB"
+NULL_SHA = '0' * 40
+
+class DiffstatCache:
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS diffstats (
+            old_commit TEXT NOT NULL,
+            new_commit TEXT NOT NULL,
+            files TEXT NOT NULL,
+            computed_at TEXT NOT NULL,
+            PRIMARY KEY (old_commit, new_commit)
+        ) WITHOUT ROWID;
+    """
+
+    def __init__(self, path:str=None):
+        """Changed files cached by (old commit, new commit). Commits never change, so entries never expire
+
+        Args:
+            path (str): path of the sqlite database (defaults to DIFFSTAT_CACHE)
+        """
+        self.__connection = sqlite3.connect(path or DIFFSTAT_CACHE, check_same_thread=False)
+        self.__connection.executescript(self.SCHEMA)
+        self.__lock = threading.Lock() # shared by the clone jobs of a pull
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, old_commit:str, new_commit:str) -> list:
+        """Gets the cached changed files between two commits
+
+        Returns:
+            list: changed files (see get_changed_files), or None if they are not cached
+        """
+        with self.__lock:
+            row = self.__connection.execute("SELECT files FROM diffstats WHERE old_commit = ? AND new_commit = ?", (old_commit, new_commit)).fetchone()
+            if row: self.hits += 1
+            else: self.misses += 1
+        return json.loads(row[0]) if row else None
+
+    def put(self, old_commit:str, new_commit:str, files:list):
+        with self.__lock, self.__connection:
+            self.__connection.execute("INSERT OR REPLACE INTO diffstats VALUES (?, ?, ?, ?)",
+                                      (old_commit, new_commit, json.dumps(files, separators=(',', ':')), datetime.now().isoformat(timespec='seconds')))
+
+    def close(self):
+        self.__connection.close()
+
+
+def parse_raw_numstat(output:bytes) -> list:
+    """Parses the output of `git diff --raw --numstat -z` (every raw entry first, then every numstat entry, in the same order)
+
+    Returns:
+        list: [path, status, insertions, deletions, new blob] of every changed file
+    """
+    tokens = output.split(b'\0')
+    files = []
+    i = 0
+    # raw entries: ":<old mode> <new mode> <old blob> <new blob> <status>\0<path>\0"
+    while i < len(tokens) and tokens[i].startswith(b':'):
+        _, _, _, blob, status = tokens[i][1:].decode().split(' ')
+        files.append([tokens[i + 1].decode('utf-8', 'replace'), status[0], None, None, None if blob == NULL_SHA else blob])
+        i += 2
+    # numstat entries: "<insertions>\t<deletions>\t<path>\0", `-` for binary files
+    for file in files:
+        if i >= len(tokens) or not tokens[i]: break
+        insertions, deletions, _ = tokens[i].decode('utf-8', 'replace').split('\t', 2)
+        if insertions != '-': file[2], file[3] = int(insertions), int(deletions)
+        i += 1
+    return files
+
+def get_changed_files(repo_path:str, old_commit:str, new_commit:str, paths:list=None) -> list:
+    """Compares the trees of two commits of a repository (no checkout)
+
+    Args:
+        repo_path (str): path of the repository (checkout, bare clone or mirror)
+        old_commit (str): commit of the last pull
+        new_commit (str): new commit
+        paths (list): only compare these paths (the graded `paths` of the assignment, so a blobless clone only fetches their blobs)
+
+    Returns:
+        list: [path, status, insertions, deletions, size] of every changed file, or None if a commit is not in the repository (i.e. force-pushed away)
+    """
+    result = subprocess.run(['git', 'diff', '--raw', '--numstat', '-z', '--no-abbrev', '--no-renames', '--no-ext-diff', '--no-textconv', old_commit, new_commit, '--', *(paths or [])],
+                            cwd=repo_path, capture_output=True)
+    if result.returncode != 0: return None
+    files = parse_raw_numstat(result.stdout)
+    sizes = repo_utils.get_blob_sizes(repo_path, {file[4] for file in files if file[4]})
+    return [[path, status, insertions, deletions, sizes.get(blob)] for path, status, insertions, deletions, blob in files]
+
+def get_diffstat(repo_path:str, old_commit:str, new_commit:str, cache:DiffstatCache=None, paths:list=None) -> list:
+    """Gets the changed files between two commits, from the cache when they were already compared
+
+    Returns:
+        list: see get_changed_files (None if the commits can't be compared)
+    """
+    if not old_commit or not new_commit: return None
+    if old_commit == new_commit: return []
+    files = cache.get(old_commit, new_commit) if cache else None
+    if files is None:
+        files = get_changed_files(repo_path, old_commit, new_commit, paths)
+        if files is not None and cache: cache.put(old_commit, new_commit, files)
+    return files
+
+def summarize(files:list, large_file_size:int) -> dict:
+    """Sums up changed files
+
+    Args:
+        files (list): changed files (see get_changed_files)
+        large_file_size (int): files above this size (bytes) are flagged
+
+    Returns:
+        dict: number of `files` changed, `insertions`, `deletions` and `large_files` (path and size)
+    """
+    return {
+        'files': len(files),
+        'insertions': sum(file[2] or 0 for file in files),
+        'deletions': sum(file[3] or 0 for file in files),
+        'large_files': [{'path': file[0], 'size': file[4]} for file in files if file[4] is not None and file[4] > large_file_size],
+    }
+
+def format_summary(summary:dict) -> str:
+    """Formats a summary like `git diff --shortstat`, i.e. `3 file(s) changed, +120 -8`
+    """
+    return f"{summary['files']} file(s) changed, +{summary['insertions']} -{summary['deletions']}"
+
+def format_size(size:int) -> str:
+    return f"{size / 1024 ** 2:.1f} MB" if size >= 1024 ** 2 else f"{size / 1024:.1f} KB"
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarizes the changes between two commits of a repository without checking them out")
+    parser.add_argument('repo_path', help="path of the repository")
+    parser.add_argument('old_commit', help="commit of the last pull")
+    parser.add_argument('new_commit', nargs='?', default='HEAD', help="new commit (defaults to HEAD)")
+    parser.add_argument('--large-file-size', default=DEFAULT_LARGE_FILE_SIZE, help=f"files above this size are flagged (default {DEFAULT_LARGE_FILE_SIZE})")
+    args = parser.parse_args()
+
+    files = get_changed_files(args.repo_path, args.old_commit, args.new_commit)
+    if files is None: parser.error(f"cannot compare {args.old_commit} and {args.new_commit} in {args.repo_path}")
+    summary = summarize(files, repo_utils.parse_size_string(args.large_file_size))
+    for path, status, insertions, deletions, size in files:
+        print(f"{status} {'-' if insertions is None else f'+{insertions}':>7} {'-' if deletions is None else f'-{deletions}':>7}  {path}")
+    print(format_summary(summary))
+    for file in summary['large_files']: print(f"Large file: {file['path']} ({format_size(file['size'])})")
+
+
+if __name__ == "__main__":
+    main()
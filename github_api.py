@@ -0,0 +1,236 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+
+"""
+GitHub REST API client shared by the scripts
+
+Every request goes through one pooled `requests.Session` (kept-alive connections, sized to the number of concurrent
+requests). GET responses are cached on disk with their ETag (RESPONSE_CACHE): the next request for the same url is sent
+with `If-None-Match`, and GitHub answers unchanged resources with 304 Not Modified, which does not count against the rate
+limit, so repeating a discovery of an unchanged organization is almost free. Paginated lists read the first page, then
+fetch the other pages (from the `Link` header) at the same time.
+
+The base url is configurable (`github_api_url`), so the client works against GitHub Enterprise or a local stub server.
+requests is only imported by the client, so reading the cache (i.e. a recent token check) does not pay for it.
+"""
+
+GITHUB_API_URL = "https://api.github.com"
+RESPONSE_CACHE = "config/github_cache.db" # url -> ETag and body of the last response
+DEFAULT_MAX_WORKERS = 8 # pages fetched at the same time
+PER_PAGE = 100 # largest page size of the GitHub API
+LINK_LAST_PATTERN = re.compile(r'<([^>]+)>;\s*rel="last"')
+PAGE_PATTERN = re.compile(r'[?&]page=(\d+)')
+
+class GitHubAPIError(Exception):
+    def __init__(self, status:int, message:str, url:str):
+        super().__init__(f"GitHub API error {status} for {url}: {message}")
+        self.status = status
+        self.url = url
+
+
+class ResponseCache:
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS responses (
+            url TEXT PRIMARY KEY,
+            etag TEXT NOT NULL,
+            link TEXT,
+            body TEXT NOT NULL,
+            fetched_at TEXT NOT NULL
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS tokens (
+            token_hash TEXT PRIMARY KEY,
+            checked_at REAL NOT NULL
+        ) WITHOUT ROWID;
+    """
+
+    def __init__(self, path:str=None):
+        """ETag, Link header and body of GET responses, by url (with the query string), and the last successful check of every token
+
+        Args:
+            path (str): path of the sqlite database (defaults to RESPONSE_CACHE)
+        """
+        self.__lock = threading.Lock()
+        self.__connection = sqlite3.connect(path or RESPONSE_CACHE, check_same_thread=False)
+        self.__connection.executescript(self.SCHEMA)
+
+    def get(self, url:str) -> dict:
+        """Gets the cached response of a url
+
+        Returns:
+            dict: `etag`, `link` and `body` (parsed json), or None if the url is not cached
+        """
+        with self.__lock: row = self.__connection.execute("SELECT etag, link, body FROM responses WHERE url = ?", (url,)).fetchone()
+        return {'etag': row[0], 'link': row[1], 'body': json.loads(row[2])} if row else None
+
+    def put(self, url:str, etag:str, link:str, body):
+        with self.__lock, self.__connection:
+            self.__connection.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)",
+                                      (url, etag, link, json.dumps(body), datetime.now().isoformat(timespec='seconds')))
+
+    def is_token_checked(self, token:str, api_url:str, ttl:float) -> bool:
+        """Checks if a token was found valid less than `ttl` seconds ago
+        """
+        with self.__lock: row = self.__connection.execute("SELECT checked_at FROM tokens WHERE token_hash = ?", (get_token_hash(token, api_url),)).fetchone()
+        return bool(row) and 0 <= time.time() - row[0] < ttl
+
+    def put_token_check(self, token:str, api_url:str):
+        with self.__lock, self.__connection:
+            self.__connection.execute("INSERT OR REPLACE INTO tokens VALUES (?, ?)", (get_token_hash(token, api_url), time.time()))
+
+    def close(self):
+        with self.__lock: self.__connection.close()
+
+
+class GitHubClient:
+    def __init__(self, token:str, api_url:str=None, cache:ResponseCache=None, max_workers:int=DEFAULT_MAX_WORKERS, timeout:float=30):
+        """Client of the GitHub REST API
+
+        Args:
+            token (str): GitHub token
+            api_url (str): base url of the API (defaults to GITHUB_API_URL)
+            cache (ResponseCache): cache of the responses for conditional requests (None to always download)
+            max_workers (int): pages fetched at the same time (and size of the connection pool)
+            timeout (float): seconds before a request fails
+        """
+        self.api_url = (api_url or GITHUB_API_URL).rstrip('/')
+        self.cache = cache
+        self.max_workers = max(1, max_workers)
+        self.timeout = timeout
+        self.requests = 0 # requests sent
+        self.not_modified = 0 # requests answered from the cache with 304 Not Modified
+        self.rate_limit_remaining = None # from the last response
+        self.__lock = threading.Lock()
+        import requests
+        from requests.adapters import HTTPAdapter
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_workers)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers.update({'Accept': 'application/vnd.github+json', 'X-GitHub-Api-Version': '2022-11-28'})
+        if token: self.session.headers['Authorization'] = f"Bearer {token}"
+
+    def get_url(self, path:str, params:dict=None) -> str:
+        import requests
+        url = path if path.startswith(('http://', 'https://')) else f"{self.api_url}/{path.lstrip('/')}"
+        return requests.Request('GET', url, params=params).prepare().url
+
+    def request(self, path:str, params:dict=None) -> tuple:
+        """Sends a conditional GET request (with the ETag of the cached response)
+
+        Args:
+            path (str): path of the endpoint (i.e. `orgs/{org}/repos`) or full url
+            params (dict): query string
+
+        Raises:
+            GitHubAPIError: GitHub answered with an error
+            requests.RequestException: GitHub could not be reached
+
+        Returns:
+            tuple: body (parsed json) and Link header of the response
+        """
+        url = self.get_url(path, params)
+        cached = self.cache.get(url) if self.cache else None
+        headers = {'If-None-Match': cached['etag']} if cached else None
+        response = self.session.get(url, headers=headers, timeout=self.timeout)
+        with self.__lock:
+            self.requests += 1
+            if 'X-RateLimit-Remaining' in response.headers: self.rate_limit_remaining = int(response.headers['X-RateLimit-Remaining'])
+            if response.status_code == 304: self.not_modified += 1
+        if response.status_code == 304 and cached: return cached['body'], cached['link']
+        if not response.ok:
+            try: message = response.json().get('message', response.reason)
+            except ValueError: message = response.reason
+            raise GitHubAPIError(response.status_code, message, url)
+        body = response.json()
+        link = response.headers.get('Link')
+        if self.cache and response.headers.get('ETag'): self.cache.put(url, response.headers['ETag'], link, body)
+        return body, link
+
+    def get(self, path:str, params:dict=None):
+        """Sends a GET request (see `request`)
+
+        Returns:
+            dict | list: body of the response
+        """
+        return self.request(path, params)[0]
+
+    def get_pages(self, path:str, params:dict=None) -> list:
+        """Gets every item of a paginated list. The first page tells how many pages there are, the others are fetched at the same time
+
+        Returns:
+            list: items of every page, in order
+        """
+        params = {**(params or dict()), 'per_page': PER_PAGE}
+        items, link = self.request(path, {**params, 'page': 1})
+        last = LINK_LAST_PATTERN.search(link or '')
+        pages = int(PAGE_PATTERN.search(last.group(1)).group(1)) if last and PAGE_PATTERN.search(last.group(1)) else 1
+        if pages > 1:
+            with ThreadPoolExecutor(min(self.max_workers, pages - 1)) as executor:
+                for page_items in executor.map(lambda page: self.get(path, {**params, 'page': page}), range(2, pages + 1)): items = items + page_items
+        return items
+
+    def is_token_valid(self) -> bool:
+        """Checks if the token can read the API (the cached response is not used, so an expired token is noticed)
+        """
+        import requests
+        try: response = self.session.get(f"{self.api_url}/user", timeout=self.timeout)
+        except requests.RequestException: return False
+        with self.__lock: self.requests += 1
+        return response.ok
+
+    def list_organization_repositories(self, organization_identifier:str) -> list:
+        """Lists every repository of an organization
+
+        Returns:
+            list: repositories (dict of the GitHub API)
+        """
+        return self.get_pages(f"orgs/{organization_identifier}/repos", {'type': 'all', 'sort': 'full_name'})
+
+    def discover_students(self, organization_identifier:str, assignment_name:str, other_assignments:list=None) -> list:
+        """Finds the student repositories of an assignment in an organization (`<assignment>-<identifier>`, like GitHub Classroom names them)
+
+        Args:
+            organization_identifier (str): GitHub organization identifier
+            assignment_name (str): name of the assignment
+            other_assignments (list): names of the other known assignments. The repositories of the ones that extend the name of this
+                                      assignment (i.e. `unit01-part2-<identifier>` for `unit01`) are left out
+
+        Returns:
+            list: git identifiers of the students, sorted
+        """
+        prefix = f"{assignment_name}-".lower()
+        longer_prefixes = tuple({f"{name}-".lower() for name in other_assignments or [] if f"{name}-".lower().startswith(prefix)} - {prefix})
+        return sorted(repository['name'][len(prefix):] for repository in self.list_organization_repositories(organization_identifier)
+                      if repository['name'].lower().startswith(prefix) and len(repository['name']) > len(prefix) and not repository.get('is_template')
+                      and not repository['name'].lower().startswith(longer_prefixes))
+
+    def close(self):
+        self.session.close()
+
+
+def get_token_hash(token:str, api_url:str) -> str:
+    """Gets the key of a token in the cache (the token itself is never stored)
+    """
+    return hashlib.sha256(f"{api_url}\n{token}".encode()).hexdigest()
+
+def merge_rosters(roster:dict, discovered:list) -> dict:
+    """Adds the discovered students that are not in a roster (named by their git identifier)
+
+    Args:
+        roster (dict): git identifier -> student name (see cloneRepos.import_roster)
+        discovered (list): git identifiers (see GitHubClient.discover_students)
+
+    Returns:
+        dict: merged roster, rostered students first
+    """
+    merged = dict(roster)
+    known = {identifier.lower() for identifier in roster}
+    for identifier in discovered:
+        if identifier.lower() not in known: merged[identifier] = identifier
+    return merged
@@ -0,0 +1,265 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import argparse
+import hashlib
+import os
+import signal
+import shutil
+import stat
+import sqlite3
+import subprocess
+import tempfile
+import time
+import content_search
+
+"""
+Build and test harness for the student repositories of a pull (grading classwork)
+
+Every checkout is copied (without `.git`) into its own temporary folder, the instructor's test suite is copied on top of it,
+and the build/test command of the assignment runs there in its own process group, so a student can't break the checkout,
+another student's build or the grader's machine, and a build that runs past the timeout is killed with everything it started.
+Builds run in parallel, one per core by default (each build is a separate process; the pool only waits on them).
+
+Results are cached by (commit hash, test suite hash) in TEST_CACHE: the suite hash covers the command, every file of the
+test suite and the sparse checkout `paths` of the assignment (which decide what is copied into the build), so students who
+did not push since the last pull are never built again unless the tests or the checked out paths changed.
+
+    passed      the command exited with 0
+    failed      the command exited with another code
+    timeout     the command ran past the timeout and was killed
+    error       the checkout could not be copied or the command could not be started
+
+Configured per assignment in config.yml (`test_command`, `test_suite`, `test_timeout`) and run after every pull, or on an
+existing pull folder:
+    py grading.py <pull_folder> "<command>" [--suite PATH] [--paths PATH ...] [--timeout SECONDS] [--workers N] [--no-cache]
+"""
+
+TEST_CACHE = "config/test_cache.db" # (commit, test suite hash) -> result
+DEFAULT_MAX_WORKERS = os.cpu_count() or 4
+DEFAULT_TIMEOUT = 300 # seconds
+RESULTS_FOLDER = ".test_results" # build logs of every student, in the pull folder (hidden, so it is not taken for a repository)
+OUTPUT_LIMIT = 64 * 1024 # characters of output kept for the log of a build (the end of it)
+KILL_TIMEOUT = 5 # seconds to wait for the output of a killed build
+
+def hash_test_suite(command:str, suite_path:str=None, paths:list=None) -> str:
+    """Hashes what a result depends on besides the student's commit: the command, every file of the test suite and the checked out paths
+
+    Args:
+        command (str): build/test command
+        suite_path (str): test suite copied on top of every checkout
+        paths (list): sparse checkout `paths` of the assignment (None for full checkouts)
+
+    Returns:
+        str: sha256 hex digest
+    """
+    digest = hashlib.sha256(command.encode())
+    if paths: digest.update(b'\0paths\0' + '\0'.join(sorted(paths)).encode() + b'\0')
+    if suite_path and os.path.isdir(suite_path):
+        for folder, folders, files in os.walk(suite_path):
+            folders.sort()
+            for file_name in sorted(files):
+                file_path = os.path.join(folder, file_name)
+                digest.update(os.path.relpath(file_path, suite_path).replace(os.sep, '/').encode() + b'\0')
+                with open(file_path, 'rb') as file:
+                    for chunk in iter(lambda: file.read(1024 * 1024), b''): digest.update(chunk)
+    elif suite_path and os.path.isfile(suite_path):
+        with open(suite_path, 'rb') as file: digest.update(file.read())
+    return digest.hexdigest()
+
+def get_head(repo_path:str) -> str:
+    """Gets the commit checked out in a repository
+
+    Returns:
+        str: commit hash, or None if nothing is checked out
+    """
+    result = subprocess.run(['git', 'rev-parse', '--verify', '-q', 'HEAD'], cwd=repo_path, capture_output=True, text=True)
+    return result.stdout.strip() if result.returncode == 0 else None
+
+def kill_process_tree(process:subprocess.Popen):
+    if os.name == 'nt': subprocess.run(['taskkill', '/F', '/T', '/PID', str(process.pid)], capture_output=True)
+    else:
+        try: os.killpg(process.pid, signal.SIGKILL)
+        except ProcessLookupError: pass
+
+def copy_writable(source:str, destination:str):
+    """Copies a file into a build folder, writable (deduplicated checkouts are read-only, see dedup), so the test suite can be copied over it and the build can write to it
+    """
+    shutil.copy2(source, destination)
+    mode = os.stat(destination).st_mode
+    if not mode & stat.S_IWUSR: os.chmod(destination, mode | stat.S_IWUSR)
+
+def run_test(command:str, checkout_path:str, suite_path:str=None, timeout:float=DEFAULT_TIMEOUT) -> dict:
+    """Builds and tests one checkout in an isolated copy
+
+    Args:
+        command (str): build/test command (run by the shell)
+        checkout_path (str): student checkout
+        suite_path (str): folder copied on top of the checkout before running the command (i.e. the instructor's tests)
+        timeout (float): seconds before the command and every process it started are killed
+
+    Returns:
+        dict: `status`, `exit_code`, `duration` (seconds) and `output` (the end of stdout and stderr)
+    """
+    work_path = tempfile.mkdtemp(prefix="grading-")
+    started = time.monotonic()
+    try:
+        build_path = os.path.join(work_path, 'build')
+        try:
+            shutil.copytree(checkout_path, build_path, symlinks=True, ignore=shutil.ignore_patterns('.git'), copy_function=copy_writable)
+            if suite_path and os.path.isdir(suite_path): shutil.copytree(suite_path, build_path, dirs_exist_ok=True, copy_function=copy_writable)
+            elif suite_path: shutil.copy2(suite_path, build_path)
+        except OSError as error: return {'status': 'error', 'exit_code': None, 'duration': time.monotonic() - started, 'output': str(error)} # i.e. a file that can't be read
+        temp_path = os.path.join(work_path, 'tmp')
+        os.makedirs(temp_path)
+        environment = {**os.environ, 'TMPDIR': temp_path, 'TEMP': temp_path, 'TMP': temp_path}
+        isolation = {'creationflags': subprocess.CREATE_NEW_PROCESS_GROUP} if os.name == 'nt' else {'start_new_session': True}
+        try:
+            process = subprocess.Popen(command, shell=True, cwd=build_path, env=environment, stdin=subprocess.DEVNULL,
+                                       stdout=subprocess.PIPE, stderr=subprocess.STDOUT, **isolation)
+        except OSError as error: return {'status': 'error', 'exit_code': None, 'duration': 0.0, 'output': str(error)}
+        try:
+            output, _ = process.communicate(timeout=timeout)
+            status = 'passed' if process.returncode == 0 else 'failed'
+        except subprocess.TimeoutExpired:
+            kill_process_tree(process)
+            try: output, _ = process.communicate(timeout=KILL_TIMEOUT)
+            except subprocess.TimeoutExpired as expired:
+                # a process that left the group (setsid) still holds the output pipe: keep what was read and stop reading
+                output = expired.output or b''
+                process.stdout.close()
+                process.wait()
+            output += f"\n(killed after {timeout}s)\n".encode()
+            status = 'timeout'
+        return {'status': status, 'exit_code': process.returncode, 'duration': time.monotonic() - started,
+                'output': output.decode(errors='replace')[-OUTPUT_LIMIT:]}
+    finally:
+        shutil.rmtree(work_path, ignore_errors=True)
+
+
+class TestCache:
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS results (
+            commit_hash TEXT NOT NULL,
+            suite TEXT NOT NULL,
+            status TEXT NOT NULL,
+            exit_code INTEGER,
+            duration REAL NOT NULL,
+            output TEXT NOT NULL,
+            tested_at TEXT NOT NULL,
+            PRIMARY KEY (commit_hash, suite)
+        ) WITHOUT ROWID;
+    """
+
+    def __init__(self, path:str=None):
+        """Build/test results cached by (commit hash, test suite hash). Timeouts and errors are not cached, so they run again
+
+        Args:
+            path (str): path of the sqlite database (defaults to TEST_CACHE)
+        """
+        self.__connection = sqlite3.connect(path or TEST_CACHE, check_same_thread=False)
+        self.__connection.executescript(self.SCHEMA)
+
+    def get(self, commits:set, suite:str) -> dict:
+        """Gets the cached results of commits
+
+        Returns:
+            dict: mapping of the commit hash to its result
+        """
+        results = dict()
+        commits = list(commits)
+        for i in range(0, len(commits), 500): # stay under the sqlite variable limit
+            chunk = commits[i:i + 500]
+            query = f"SELECT commit_hash, status, exit_code, duration, output FROM results WHERE suite = ? AND commit_hash IN ({','.join('?' * len(chunk))})"
+            for commit, status, exit_code, duration, output in self.__connection.execute(query, [suite, *chunk]):
+                results[commit] = {'status': status, 'exit_code': exit_code, 'duration': duration, 'output': output}
+        return results
+
+    def put(self, results:dict, suite:str):
+        rows = [(commit, suite, result['status'], result['exit_code'], result['duration'], result['output'], datetime.now().isoformat(timespec='seconds'))
+                for commit, result in results.items() if result['status'] in ('passed', 'failed')]
+        with self.__connection: self.__connection.executemany("INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+
+    def close(self):
+        self.__connection.close()
+
+
+def run_tests(checkouts:dict, command:str, suite_path:str=None, timeout:float=DEFAULT_TIMEOUT, max_workers:int=DEFAULT_MAX_WORKERS, cache:TestCache=None, paths:list=None) -> dict:
+    """Builds and tests the checkouts of a pull, reusing the cached result of every commit that was already tested with the same suite
+
+    Args:
+        checkouts (dict): student -> (checkout path, commit hash). Students without a checkout (path None) only get a cached result
+        command (str): build/test command
+        suite_path (str): test suite copied on top of every checkout
+        timeout (float): seconds before a build is killed
+        max_workers (int): builds running at the same time
+        cache (TestCache): cache of the results (None to build everything)
+        paths (list): sparse checkout `paths` the checkouts were made with (part of the cache key)
+
+    Returns:
+        dict: student -> result (see run_test) with the tested `commit` and whether the result is `cached`
+    """
+    suite = hash_test_suite(command, suite_path, paths)
+    commits = {commit for _, commit in checkouts.values() if commit}
+    cached = cache.get(commits, suite) if cache else dict()
+
+    # a commit shared by several students (i.e. the untouched template) is built once
+    builds = dict()
+    for student, (path, commit) in checkouts.items():
+        if commit and commit not in cached and path and commit not in builds: builds[commit] = path
+    with ThreadPoolExecutor(max(1, max_workers)) as executor:
+        built = dict(zip(builds, executor.map(lambda path: run_test(command, path, suite_path, timeout), builds.values())))
+    if cache and built: cache.put(built, suite)
+
+    results = dict()
+    for student, (path, commit) in checkouts.items():
+        if commit in cached: results[student] = {**cached[commit], 'commit': commit, 'cached': True}
+        elif commit in built: results[student] = {**built[commit], 'commit': commit, 'cached': False}
+    return results
+
+def write_logs(pull_path:str, results:dict) -> str:
+    """Writes the build output of every student to `.test_results/<student>.log` in the pull folder
+
+    Returns:
+        str: path of the logs folder
+    """
+    logs_path = os.path.join(pull_path, RESULTS_FOLDER)
+    os.makedirs(logs_path, exist_ok=True)
+    for student, result in results.items():
+        with open(os.path.join(logs_path, f"{student}.log"), 'w', encoding='utf-8') as file: file.write(result['output'])
+    return logs_path
+
+def format_table(results:dict) -> list:
+    """Formats the results as a markdown table (one row per student)
+
+    Returns:
+        list: lines of the table
+    """
+    lines = ["| Student | Commit | Result | Time | Cached |", "| --- | --- | --- | --- | --- |"]
+    for student, result in sorted(results.items()):
+        exit_code = f" ({result['exit_code']})" if result['status'] == 'failed' else ''
+        lines.append(f"| {student} | {result['commit'][:7]} | {result['status']}{exit_code} | {result['duration']:.1f}s | {'yes' if result['cached'] else 'no'} |")
+    return lines
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Builds and tests the student repositories of a pull folder")
+    parser.add_argument('pull_folder', help="pull folder (`<assignment>-<timestamp>`)")
+    parser.add_argument('command', help="build/test command run in every checkout (i.e. \"mvn -q test\")")
+    parser.add_argument('--suite', help="folder copied on top of every checkout before running the command (i.e. the instructor's tests)")
+    parser.add_argument('--paths', nargs='+', help="sparse checkout paths the pull was made with (`paths` of the assignment), so cached results of other checkouts are not reused")
+    parser.add_argument('--timeout', type=float, default=DEFAULT_TIMEOUT, help=f"seconds before a build is killed (default: {DEFAULT_TIMEOUT})")
+    parser.add_argument('--workers', type=int, default=DEFAULT_MAX_WORKERS, help=f"builds running at the same time (default: {DEFAULT_MAX_WORKERS})")
+    parser.add_argument('--cache', default=TEST_CACHE, help=f"sqlite cache of the results by commit (default: {TEST_CACHE})")
+    parser.add_argument('--no-cache', action='store_true', help="build every checkout again")
+    args = parser.parse_args()
+
+    repositories = content_search.get_repositories(args.pull_folder)
+    checkouts = {student: (path, get_head(path)) for student, path in repositories.items()}
+    cache = None if args.no_cache else TestCache(args.cache)
+    try: results = run_tests(checkouts, args.command, args.suite, args.timeout, args.workers, cache, args.paths)
+    finally:
+        if cache: cache.close()
+    for line in format_table(results): print(line)
+    passed = sum(1 for result in results.values() if result['status'] == 'passed')
+    print(f"\n{passed}/{len(results)} passed, {sum(1 for result in results.values() if result['cached'])} result(s) from the cache.")
+    print(f"Build logs written to {write_logs(args.pull_folder, results)}")
@@ -0,0 +1,80 @@
+from datetime import datetime
+import json
+import os
+import threading
+
+"""
+Append-only checkpoint journal of a pull (`journal.jsonl` in the `<assignment>-<timestamp>` folder)
+
+The first line describes the pull, then every repository appends one line as soon as it is cloned, fails or is skipped.
+Lines are flushed to disk one by one, so an interrupted pull (Ctrl+C, sleep, lost network) can be resumed with
+`py cloneRepos.py --resume <pull folder>`: the repositories of the journal are verified and kept, the others are cloned again.
+
+    {"event": "pull", "organization": "...", "assignment": "...", "timestamp_pulled": "...", "stored_submissions": {"<identifier>": [<commits>, "<commit hash>"]}, ...}
+    {"event": "cloned", "identifier": "...", "student_name": "...", "head": "<commit checked out>", "submitted": true, ...}
+    {"event": "not_cloned", "identifier": "...", "student_name": "...", "clone_url": "..."}
+    {"event": "unchanged", "identifier": "...", "student_name": "...", "commit_hash": "..."}
+"""
+
+JOURNAL_FILE = 'journal.jsonl'
+
+class PullJournal:
+    def __init__(self, folder_path:str):
+        """Journal of a pull, opened for appending
+
+        Args:
+            folder_path (str): pull folder
+        """
+        self.path = f"{folder_path}/{JOURNAL_FILE}"
+        self.__lock = threading.Lock()
+        self.__file = open(self.path, 'a', encoding='utf-8')
+
+    def append(self, event:str, **values):
+        """Appends an event and writes it to disk right away
+        """
+        line = json.dumps({'event': event, 'time': datetime.now().isoformat(timespec='seconds'), **values})
+        with self.__lock:
+            self.__file.write(f"{line}\n")
+            self.__file.flush()
+            os.fsync(self.__file.fileno())
+
+    def close(self):
+        with self.__lock: self.__file.close()
+
+
+def read_journal(folder_path:str) -> list:
+    """Reads the events of the journal of a pull. A line cut off by an interruption is ignored
+
+    Args:
+        folder_path (str): pull folder
+
+    Raises:
+        FileNotFoundError: the folder has no journal
+
+    Returns:
+        list: events (dict), oldest first
+    """
+    events = []
+    with open(f"{folder_path}/{JOURNAL_FILE}", 'r', encoding='utf-8') as file:
+        for line in file:
+            try: events.append(json.loads(line))
+            except ValueError: continue
+    return events
+
+def get_pull_event(events:list) -> dict:
+    """Gets the description of the pull (first `pull` event of the journal)
+
+    Raises:
+        ValueError: the journal does not describe a pull
+    """
+    for event in events:
+        if event.get('event') == 'pull': return event
+    raise ValueError("The journal does not describe a pull")
+
+def get_student_events(events:list) -> dict:
+    """Gets the last event of every student of the journal
+
+    Returns:
+        dict: mapping of the git identifier to its last event
+    """
+    return {event['identifier']: event for event in events if 'identifier' in event}
@@ -0,0 +1,179 @@
+from logging.handlers import QueueHandler, QueueListener
+import atexit
+import logging
+import queue
+import re
+import sys
+import threading
+import time
+
+"""
+Logging pipeline of the pulls
+
+Clone jobs never write to the console or to a file themselves: every record goes through a QueueHandler into a queue, and one
+writer thread (QueueListener) hands it to the renderers, so hundreds of concurrent clones don't compete for handler locks.
+Records are structured events instead of preformatted ANSI strings: the message is plain text, and the `style` and `event`
+attributes (see `log`) tell the renderers how to show it.
+
+    ConsoleRenderer     colors the messages by style. On a terminal, the clone events of every repository are counted on a live
+                        progress bar (done/total, cloned, no submission, failed, retried and repos/s) instead of printed one by
+                        one, and only warnings and errors are printed above it
+    ReadmeRenderer      writes the plain messages of every pull to the README.md of its folder (every line, without colors)
+"""
+
+STYLES = { # style -> ansi code
+    'success': '\033[1;32m',
+    'warning': '\033[1;33m',
+    'error': '\033[1;31m',
+}
+RESET = '\033[0m'
+CLEAR_LINE = '\r\033[K'
+ANSI_ESCAPE = re.compile(r'\x1b\[[0-9;]*[A-Za-z]') # precompiled once, messages with colors are stripped for README.md
+PROGRESS_EVENTS = { # clone events counted by the progress bar -> label
+    'cloned': "cloned",
+    'no_submission': "no submission",
+    'not_cloned': "failed",
+}
+QUIET_EVENTS = {'cloned', 'scheduler_progress'} # only counted on the progress bar when the console is a terminal
+CONTROL_EVENTS = {'progress_start', 'progress_end', 'readme_open', 'readme_close'} # not written by the renderers
+BAR_WIDTH = 30
+
+def log(logger:logging.Logger, message:str, style:str=None, event:str=None, **fields):
+    """Logs a structured event
+
+    Args:
+        logger (logging.Logger): logger of the pull (or the module logger, for console-only messages)
+        message (str): plain text (multiple lines are kept together)
+        style (str): `success`, `warning` or `error` (see STYLES), None for plain text
+        event (str): what happened (i.e. `cloned`, see PROGRESS_EVENTS), None for a plain message
+        fields: values of the event
+    """
+    logger.info(message, extra={'style': style, 'event': event, 'fields': fields})
+
+
+class ConsoleRenderer(logging.Handler):
+    def __init__(self, stream=None, live:bool=None):
+        """Renders the records on the console
+
+        Args:
+            stream: output stream (defaults to stderr)
+            live (bool): show the live progress bar (defaults to whether the stream is a terminal)
+        """
+        super().__init__()
+        self.stream = stream or sys.stderr
+        self.live = self.stream.isatty() if live is None else live
+        self.total = 0
+        self.counts = dict()
+        self.retries = 0
+        self.started = None
+        self.scheduler = None # last CloneScheduler statistics
+        self.__bar_shown = False
+
+    def emit(self, record):
+        try:
+            event = getattr(record, 'event', None)
+            fields = getattr(record, 'fields', None) or dict()
+            if event == 'progress_start':
+                self.total += fields.get('total', 0)
+                self.started = self.started or time.monotonic()
+            elif event == 'progress_end':
+                self.clear_bar()
+                self.total, self.counts, self.retries, self.started, self.scheduler = 0, dict(), 0, None, None
+                return
+            elif event in PROGRESS_EVENTS: self.counts[event] = self.counts.get(event, 0) + 1
+            elif event == 'retrying': self.retries += 1
+            elif event == 'scheduler_progress': self.scheduler = fields
+
+            message = self.format(record)
+            if event not in CONTROL_EVENTS and not (self.live and event in QUIET_EVENTS):
+                style = STYLES.get(getattr(record, 'style', None))
+                self.clear_bar()
+                self.stream.write(f"{style}{message}{RESET}\n" if style else f"{message}\n")
+            if self.live and self.started is not None: self.draw_bar()
+            self.stream.flush()
+        except Exception:
+            self.handleError(record)
+
+    def clear_bar(self):
+        if self.__bar_shown: self.stream.write(CLEAR_LINE)
+        self.__bar_shown = False
+
+    def draw_bar(self):
+        done = sum(self.counts.values())
+        filled = int(BAR_WIDTH * done / self.total) if self.total else 0
+        elapsed = time.monotonic() - self.started
+        counts = ', '.join(f"{label}: {self.counts[event]}" for event, label in PROGRESS_EVENTS.items() if self.counts.get(event))
+        retries = f", retried: {self.retries}" if self.retries else ''
+        running = f", running: {self.scheduler['active']}/{self.scheduler['limit']}" if self.scheduler else ''
+        self.stream.write(f"{CLEAR_LINE}[{'#' * filled}{'-' * (BAR_WIDTH - filled)}] {done}/{self.total} ({counts or 'starting'}{retries}{running}) {done / elapsed if elapsed else 0:.2f} repos/s")
+        self.__bar_shown = True
+
+
+class ReadmeRenderer(logging.Handler):
+    def __init__(self):
+        """Writes the records of every pull logger to the README.md of the pull. Files are opened and closed by `readme_open`
+        and `readme_close` events, so they are handled in order with the records of the pull
+        """
+        super().__init__()
+        self.files = dict() # logger name -> open README.md
+
+    def emit(self, record):
+        try:
+            event = getattr(record, 'event', None)
+            if event == 'readme_open': self.files[record.name] = open(record.fields['path'], 'a', encoding='utf-8')
+            elif event == 'readme_close':
+                file = self.files.pop(record.name, None)
+                if file: file.close()
+            elif record.name in self.files and event not in CONTROL_EVENTS:
+                self.files[record.name].write(f"{ANSI_ESCAPE.sub('', self.format(record))}\n")
+        except Exception:
+            self.handleError(record)
+
+    def close(self):
+        for file in self.files.values(): file.close()
+        self.files.clear()
+        super().close()
+
+
+class LogPipeline:
+    def __init__(self, logger:logging.Logger, stream=None, live:bool=None):
+        """Queue-based logging of a logger and its children (the pull loggers), written by one thread
+
+        Args:
+            logger (logging.Logger): root logger of the pipeline (its handlers are replaced by the queue)
+            stream, live: see ConsoleRenderer
+        """
+        self.logger = logger
+        self.queue = queue.Queue()
+        self.console = ConsoleRenderer(stream, live)
+        self.readme = ReadmeRenderer()
+        self.__lock = threading.Lock()
+        for handler in list(logger.handlers): logger.removeHandler(handler)
+        logger.addHandler(QueueHandler(self.queue))
+        logger.propagate = False
+        self.__listener = QueueListener(self.queue, self.console, self.readme)
+        self.__listener.start()
+        atexit.register(self.stop)
+
+    def open_readme(self, logger:logging.Logger, path:str):
+        """Starts writing the records of a pull logger to a file
+        """
+        log(logger, '', event='readme_open', path=path)
+
+    def close_readme(self, logger:logging.Logger):
+        """Stops writing the records of a pull logger to its file, once every record before is written
+        """
+        log(logger, '', event='readme_close')
+        self.flush()
+
+    def flush(self):
+        """Waits until every queued record is written
+        """
+        self.queue.join()
+
+    def stop(self):
+        with self.__lock:
+            if not self.__listener: return
+            self.__listener.stop()
+            self.__listener = None
+            self.readme.close()
@@ -0,0 +1,190 @@
+from git import RemoteProgress, GitCommandError
+from contextlib import nullcontext
+import csv
+import json
+import math
+import threading
+import time
+
+"""
+Per-repository timing and transfer instrumentation of a pull
+
+Every repository is split into phases:
+    connect     until the remote starts sending objects (DNS, TLS and authentication), gitpython engine only
+    transfer    downloading the objects (including the local clone from the mirror cache)
+    checkout    checking out the working tree
+    archive     streaming the commit into the archive of the pull (`--export`)
+    submission  reading the latest commits and updating the submission logs
+    total       the whole clone job
+
+`metrics.json` and `metrics.csv` are written next to the README.md of the pull folder.
+When metrics are disabled every timer is a shared no-op context, so the instrumentation costs a method call per phase.
+"""
+
+PHASES = ['connect', 'transfer', 'checkout', 'archive', 'submission', 'total']
+CSV_COLUMNS = ['identifier', 'student_name', 'status', *PHASES, 'objects', 'bytes_received']
+NULL_TIMER = nullcontext() # yields None, so `with metrics.transfer(...) as progress` passes no progress handler when disabled
+
+def percentile(values:list, percent:float) -> float:
+    """Gets the nearest-rank percentile of a list of values
+
+    Args:
+        values (list): values (unsorted)
+        percent (float): percentile between 0 and 100
+
+    Returns:
+        float: the percentile, or None if there are no values
+    """
+    if not values: return None
+    values = sorted(values)
+    return values[max(0, math.ceil(percent / 100 * len(values)) - 1)]
+
+def parse_count_objects(stdout:str) -> dict:
+    """Gets the number of objects and their size from the output of `git count-objects -v`
+
+    Returns:
+        dict: `objects` and `bytes_received` (objects borrowed from a reference repository are not counted)
+    """
+    counts = dict()
+    for line in stdout.splitlines():
+        key, _, value = line.partition(':')
+        if value.strip().isdigit(): counts[key.strip()] = int(value)
+    return {'objects': counts.get('count', 0) + counts.get('in-pack', 0),
+            'bytes_received': (counts.get('size', 0) + counts.get('size-pack', 0)) * 1024}
+
+
+class PhaseTimer:
+    def __init__(self, metrics, identifier:str, phase:str):
+        self._metrics = metrics
+        self._identifier = identifier
+        self._phase = phase
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._metrics.add_duration(self._identifier, self._phase, time.perf_counter() - self._started)
+        return False
+
+
+class TransferTimer(PhaseTimer, RemoteProgress):
+    """Times the transfer of a clone. Used as the GitPython progress handler, the first progress line marks the end of the connect phase
+    """
+    def __init__(self, metrics, identifier:str):
+        PhaseTimer.__init__(self, metrics, identifier, 'transfer')
+        RemoteProgress.__init__(self)
+        self._connected = None
+
+    def update(self, op_code, cur_count, max_count=None, message=''):
+        if self._connected is None: self._connected = time.perf_counter()
+
+    def get_stderr(self) -> str:
+        return '\n'.join(self.other_lines + self.error_lines)
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        ended = time.perf_counter()
+        if self._connected is not None:
+            self._metrics.add_duration(self._identifier, 'connect', self._connected - self._started)
+            self._started = self._connected
+        self._metrics.add_duration(self._identifier, 'transfer', ended - self._started)
+        # GitPython hands stderr to the progress handler, so the error message is restored from the lines it kept
+        if isinstance(exc_value, GitCommandError) and not exc_value.stderr: exc_value.stderr = self.get_stderr()
+        return False
+
+
+class Metrics:
+    def __init__(self, enabled:bool=True):
+        """Per-repository metrics of a pull
+
+        Args:
+            enabled (bool): whether to collect metrics (`collect_metrics` in config.yml)
+        """
+        self.enabled = bool(enabled)
+        self.__records = dict() # identifier -> record
+        self.__lock = threading.Lock()
+
+    def timer(self, identifier:str, phase:str):
+        """Times a phase of a repository (`with metrics.timer(identifier, 'checkout'): ...`). Durations of the same phase add up
+        """
+        return PhaseTimer(self, identifier, phase) if self.enabled else NULL_TIMER
+
+    def transfer(self, identifier:str):
+        """Times the connect and transfer phases of a clone. The context value is the progress handler to pass to `Repo.clone_from`
+        (None when metrics are disabled)
+        """
+        return TransferTimer(self, identifier) if self.enabled else NULL_TIMER
+
+    def __get_record(self, identifier:str) -> dict:
+        if identifier not in self.__records: self.__records[identifier] = {'identifier': identifier}
+        return self.__records[identifier]
+
+    def add_duration(self, identifier:str, phase:str, seconds:float):
+        with self.__lock:
+            record = self.__get_record(identifier)
+            record[phase] = record.get(phase, 0.0) + seconds
+
+    def record(self, identifier:str, **values):
+        """Sets values of a repository (i.e. `student_name`, `status`, `objects`, `bytes_received`)
+        """
+        if not self.enabled: return
+        with self.__lock: self.__get_record(identifier).update(values)
+
+    def get_records(self) -> list:
+        with self.__lock: return [dict(record) for record in self.__records.values()]
+
+    def summarize(self) -> dict:
+        """Gets the latency distribution of every phase and the transfer totals
+
+        Returns:
+            dict: phase -> `count`, `p50`, `p95`, `max` and `sum` (seconds), plus `objects` and `bytes_received` totals
+        """
+        records = self.get_records()
+        summary = dict()
+        for phase in PHASES:
+            durations = [record[phase] for record in records if phase in record]
+            if not durations: continue
+            summary[phase] = {'count': len(durations), 'p50': percentile(durations, 50), 'p95': percentile(durations, 95),
+                              'max': max(durations), 'sum': sum(durations)}
+        summary['objects'] = sum(record.get('objects', 0) for record in records)
+        summary['bytes_received'] = sum(record.get('bytes_received', 0) for record in records)
+        return summary
+
+    def get_slowest(self, count:int=5, phase:str='total') -> list:
+        records = [record for record in self.get_records() if phase in record]
+        return sorted(records, key=lambda record: record[phase], reverse=True)[:count]
+
+    def write(self, folder_path:str) -> list:
+        """Writes `metrics.json` (summary and every repository) and `metrics.csv` (one row per repository) to a folder
+
+        Returns:
+            list: paths of the written files
+        """
+        records = sorted(self.get_records(), key=lambda record: record['identifier'])
+        json_path = f"{folder_path}/metrics.json"
+        with open(json_path, 'w') as file: json.dump({'summary': self.summarize(), 'repositories': records}, file, indent=2)
+        csv_path = f"{folder_path}/metrics.csv"
+        with open(csv_path, 'w', newline='') as file:
+            writer = csv.DictWriter(file, fieldnames=CSV_COLUMNS, extrasaction='ignore')
+            writer.writeheader()
+            writer.writerows(records)
+        return [json_path, csv_path]
+
+    def format_summary(self, slowest:int=5) -> list:
+        """Gets the summary printed at the end of a pull: p50/p95/max of every phase and the slowest repositories
+
+        Returns:
+            list: lines of the summary
+        """
+        summary = self.summarize()
+        lines = ["Latency per repository (p50 / p95 / max):"]
+        for phase in PHASES:
+            if phase in summary: lines.append(f"\t{phase}: {summary[phase]['p50']:.2f}s / {summary[phase]['p95']:.2f}s / {summary[phase]['max']:.2f}s")
+        lines.append(f"Received {summary['objects']} objects ({summary['bytes_received'] / 1024 ** 2:.1f} MB).")
+        records = self.get_slowest(slowest)
+        if records:
+            lines.append(f"Slowest {len(records)} repositories:")
+            for record in records:
+                phases = ', '.join(f"{phase} {record[phase]:.2f}s" for phase in PHASES[:-1] if phase in record)
+                lines.append(f"\t{record.get('student_name')} ({record['identifier']}): {record['total']:.2f}s ({phases})")
+        return lines
@@ -0,0 +1,205 @@
+from git import Repo
+from datetime import datetime
+import repo_utils
+import os
+import shutil
+import shlex
+import subprocess
+import threading
+import time
+
+"""
+Persistent mirror cache of student repositories
+
+Every repository is mirrored once per organization (`<mirror_cache_path>/<organization_identifier>/<repository>.git`).
+Later pulls only `git fetch` into the mirror, and the timestamped checkout is materialized from the mirror through
+a local clone, which hardlinks the object files instead of downloading them again.
+
+While `cloneRepos.py --watch` keeps the mirrors of an organization in sync, it touches `.watched` in the organization folder
+after every poll. Pulls that find a recent marker use the mirrors as they are instead of fetching every one of them, except
+the mirrors listed in the marker (one repository name per line), which the watcher could not resolve or fetch.
+"""
+
+WATCH_MARKER = '.watched'
+
+class MirrorCache:
+    def __init__(self, cache_path:str, organization_identifier:str, watched_within:float=None):
+        """Mirror cache for the repositories of an organization
+
+        Args:
+            cache_path (str): root folder of the mirror cache (`mirror_cache_path` in config.yml)
+            organization_identifier (str): GitHub organization identifier
+            watched_within (float): do not fetch existing mirrors if the watcher polled the organization within this many seconds
+        """
+        self.__path = f"{cache_path}/{organization_identifier}"
+        self.__locks = dict() # repository name -> lock, so a mirror is never fetched twice at the same time
+        self.__locks_lock = threading.Lock()
+        self.fetched = 0 # mirrors that already existed and were only fetched
+        self.created = 0 # mirrors that had to be cloned from scratch
+        self.current = 0 # mirrors kept in sync by the watcher that were used without fetching
+        os.makedirs(self.__path, exist_ok=True)
+        self.watched = bool(watched_within) and self.get_watch_age() is not None and self.get_watch_age() <= watched_within
+        self.stale = self.get_stale_repositories() if self.watched else set() # mirrors the watcher could not bring up to date
+
+    def get_mirror_path(self, repository_name:str) -> str:
+        return f"{self.__path}/{repository_name}.git"
+
+    def get_watch_age(self) -> float:
+        """Gets the number of seconds since the watcher last polled the organization
+
+        Returns:
+            float: age of the watch marker, or None if the organization is not watched
+        """
+        try: return time.time() - os.path.getmtime(f"{self.__path}/{WATCH_MARKER}")
+        except OSError: return None
+
+    def get_stale_repositories(self) -> set:
+        """Gets the repositories whose mirror the watcher could not bring up to date
+
+        Returns:
+            set: repository names listed in the watch marker
+        """
+        try:
+            with open(f"{self.__path}/{WATCH_MARKER}", 'r') as file: return {line.strip() for line in file if line.strip()}
+        except OSError: return set()
+
+    def mark_watched(self, stale:list=None, touch:bool=True):
+        """Marks every mirror of the organization as up to date, except the stale ones (called by the watcher after each poll)
+
+        Args:
+            stale (list): names of the repositories that could not be resolved or fetched, which pulls still fetch
+            touch (bool): False to only update the stale repositories and keep the time of the last poll (i.e. a webhook fetch failed)
+        """
+        marker_path = f"{self.__path}/{WATCH_MARKER}"
+        if not touch and not os.path.exists(marker_path): return
+        # written next to the marker and renamed over it, so a pull never reads a partial list
+        temporary_path = f"{marker_path}.{os.getpid()}"
+        with open(temporary_path, 'w') as file: file.writelines(f"{name}\n" for name in sorted(stale or []))
+        if not touch:
+            marker = os.stat(marker_path)
+            os.utime(temporary_path, ns=(marker.st_atime_ns, marker.st_mtime_ns))
+        os.replace(temporary_path, marker_path)
+
+    def get_head(self, repository_name:str) -> str:
+        """Gets the HEAD commit of a mirror without contacting the remote
+
+        Returns:
+            str: commit hash, or None if the repository is not mirrored (or is empty)
+        """
+        mirror_path = self.get_mirror_path(repository_name)
+        if not os.path.isdir(mirror_path): return None
+        result = subprocess.run(['git', 'rev-parse', '--verify', '-q', 'HEAD'], cwd=mirror_path, capture_output=True, text=True)
+        return result.stdout.strip() if result.returncode == 0 else None
+
+    def __get_lock(self, repository_name:str) -> threading.Lock:
+        with self.__locks_lock:
+            if repository_name not in self.__locks: self.__locks[repository_name] = threading.Lock()
+            return self.__locks[repository_name]
+
+    def sync(self, repository_name:str, clone_url:str, reference:str=None) -> str:
+        """Creates or updates the mirror of a repository
+
+        Args:
+            repository_name (str): name of the repository
+            clone_url (str): remote url of the repository
+            reference (str): local repository whose objects are not downloaded again when the mirror is created (copied with `--dissociate`)
+
+        Raises:
+            GitCommandError: the mirror could not be cloned or fetched
+
+        Returns:
+            str: path of the mirror
+        """
+        mirror_path = self.get_mirror_path(repository_name)
+        with self.__get_lock(repository_name):
+            if os.path.isdir(mirror_path) and self.watched and repository_name not in self.stale:
+                self.current += 1 # already fetched by the watcher
+            elif os.path.isdir(mirror_path):
+                mirror = Repo(mirror_path)
+                mirror.git.remote('set-url', 'origin', clone_url) # the token in the url might have changed
+                mirror.git.fetch('origin', '--prune')
+                self.fetched += 1
+            else:
+                options = [shlex.quote(f"--reference={reference}"), '--dissociate'] if reference else None # GitPython splits multi_options with shlex
+                try: Repo.clone_from(clone_url, mirror_path, mirror=True, multi_options=options)
+                except Exception:
+                    shutil.rmtree(mirror_path, ignore_errors=True) # don't leave a half-cloned mirror behind
+                    raise
+                self.created += 1
+            os.utime(mirror_path) # last used timestamp for eviction
+        return mirror_path
+
+    def materialize(self, repository_name:str, clone_path:str, clone_url:str, options:list=None) -> Repo:
+        """Checks out a mirrored repository. The objects are hardlinked from the mirror
+
+        Args:
+            repository_name (str): name of the repository
+            clone_path (str): path to check the repository out to
+            clone_url (str): remote url of the repository, set as `origin` of the checkout
+            options (list): extra `git clone` options (i.e. `--no-checkout`)
+
+        Returns:
+            Repo: the checked out repository
+        """
+        repo = Repo.clone_from(self.get_mirror_path(repository_name), clone_path, multi_options=[shlex.quote(option) for option in options or []])
+        repo.git.remote('set-url', 'origin', clone_url)
+        return repo
+
+    def clone(self, repository_name:str, clone_url:str, clone_path:str, reference:str=None, options:list=None) -> Repo:
+        """Fetches the repository into the mirror cache and checks it out
+
+        Args:
+            repository_name (str): name of the repository
+            clone_url (str): remote url of the repository
+            clone_path (str): path to check the repository out to
+            reference (str): see `sync`
+            options (list): see `materialize`
+
+        Returns:
+            Repo: the checked out repository
+        """
+        self.sync(repository_name, clone_url, reference)
+        return self.materialize(repository_name, clone_path, clone_url, options)
+
+    def get_mirrors(self) -> dict:
+        """Gets every mirror in the cache with its size and the last time it was used
+
+        Returns:
+            dict: mapping of the mirror path to its size (bytes) and last used timestamp
+        """
+        mirrors = dict()
+        with os.scandir(self.__path) as entries:
+            for entry in entries:
+                if entry.is_dir() and entry.name.endswith('.git'):
+                    mirrors[entry.path] = {'size': repo_utils.get_directory_size(entry.path), 'last_used': datetime.fromtimestamp(entry.stat().st_mtime)}
+        return mirrors
+
+    def evict(self, max_age:str=None, max_size:str=None) -> dict:
+        """Removes mirrors that have not been used for `max_age`, then the least recently used mirrors until the cache fits in `max_size`
+
+        Args:
+            max_age (str): duration string (i.e. 120d), see repo_utils.parse_duration_string
+            max_size (str): size string (i.e. 20GB), see repo_utils.parse_size_string
+
+        Returns:
+            dict: evicted mirror paths mapped to their size (bytes)
+        """
+        mirrors = self.get_mirrors()
+        evicted = dict()
+
+        if max_age:
+            remove_before_timestamp = datetime.now() - repo_utils.parse_duration_string(max_age)
+            for path, info in list(mirrors.items()):
+                if info['last_used'] < remove_before_timestamp:
+                    evicted[path] = mirrors.pop(path)['size']
+
+        if max_size:
+            max_bytes = repo_utils.parse_size_string(max_size)
+            total = sum(info['size'] for info in mirrors.values())
+            for path, info in sorted(mirrors.items(), key=lambda item: item[1]['last_used']):
+                if total <= max_bytes: break
+                evicted[path] = info['size']
+                total -= info['size']
+
+        for path in evicted: shutil.rmtree(path, ignore_errors=True)
+        return evicted
@@ -0,0 +1,321 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import argparse
+import os
+import platform
+import repo_utils
+import shutil
+import stat
+import subprocess
+import sys
+import uuid
+
+"""
+Pruning of local clones and submission logs
+
+Pull folders (`<clone_output_path>/<organization>/<assignment>-<timestamp>`) are found with a single `os.scandir` walk
+that also totals the bytes each folder would reclaim. Files are counted by inode, so a file hardlinked across pulls (see
+`dedup.py`) is counted once, and only when every one of its links is being deleted. Deletion renames every folder into a
+hidden trash folder first (instant, so the pull folders disappear right away), then removes the student folders of the
+trash on a worker pool, optionally in a detached background process so the prompt returns immediately.
+
+Usage:
+    py prune_utils.py <duration> [--path CLONE_OUTPUT_PATH] [--dry-run] [--yes] [--background] [--submission-logs]
+"""
+
+TRASH_PREFIX = ".trash-" # renamed folders waiting to be deleted
+PULL_TIMESTAMP_FORMAT = '%m-%d-%Y-%H-%M-%S' # github classroom styled format
+DEFAULT_MAX_WORKERS = 8
+
+def get_entry_creation_time(entry:os.DirEntry) -> datetime:
+    """Gets the creation time of a directory entry from the stat cached by `os.scandir` (see repo_utils.get_file_creation_time)
+    """
+    stat_info = entry.stat(follow_symlinks=False)
+    if platform.system() == 'Windows': creation_time = stat_info.st_ctime
+    else:
+        try: creation_time = stat_info.st_birthtime
+        except AttributeError: creation_time = stat_info.st_mtime # use st_mtime as a fallback
+    return datetime.fromtimestamp(creation_time)
+
+def get_assignment_name(directory_name:str) -> str:
+    """Gets the assignment name of a pull folder (`<assignment>-<timestamp>`)
+
+    Returns:
+        str: assignment name, or the folder name if it is not a pull folder
+    """
+    timestamp_length = len(datetime.now().strftime(PULL_TIMESTAMP_FORMAT))
+    assignment_name, timestamp = directory_name[:-timestamp_length - 1], directory_name[-timestamp_length:]
+    if not assignment_name or directory_name[-timestamp_length - 1] != '-': return directory_name
+    try: datetime.strptime(timestamp, PULL_TIMESTAMP_FORMAT)
+    except ValueError: return directory_name
+    return assignment_name
+
+def get_directory_files(path:str) -> dict:
+    """Gets the files of a directory by inode, so the links of a hardlinked file are told apart from copies
+
+    Args:
+        path (str): directory path
+
+    Returns:
+        dict: (st_dev, st_ino) -> [size, number of links of the file, number of those links in the directory]
+    """
+    files = dict()
+    folders = [path]
+    while folders:
+        with os.scandir(folders.pop()) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False): folders.append(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    stat_info = entry.stat(follow_symlinks=False)
+                    if not stat_info.st_ino: stat_info = os.stat(entry.path, follow_symlinks=False) # the stat cached on Windows has no inode
+                    key = (stat_info.st_dev, stat_info.st_ino)
+                    if key in files: files[key][2] += 1
+                    else: files[key] = [stat_info.st_size, stat_info.st_nlink, 1]
+    return files
+
+def scan_pull_folders(clone_output_path:str, remove_before_timestamp:datetime, max_workers:int=DEFAULT_MAX_WORKERS) -> list:
+    """Finds the pull folders created before a timestamp and the number of bytes they take up
+
+    Args:
+        clone_output_path (str): Output path to search
+        remove_before_timestamp (datetime): Find folders older than this timestamp
+        max_workers (int): number of folders measured at the same time
+
+    Returns:
+        list: pull folders (dict of `organization`, `assignment`, `name`, `full_path`, `created_timestamp` and `size`, the bytes
+              deleting the folders reclaims)
+    """
+    folders = []
+    with os.scandir(clone_output_path) as organizations:
+        for organization in organizations:
+            if not organization.is_dir(follow_symlinks=False) or organization.name.startswith('.'): continue
+            with os.scandir(organization.path) as pulls:
+                for pull in pulls:
+                    if not pull.is_dir(follow_symlinks=False) or pull.name.startswith('.'): continue
+                    created_timestamp = get_entry_creation_time(pull)
+                    if remove_before_timestamp > created_timestamp: # remove everything before path_timestamp
+                        folders.append({'organization': organization.name, 'assignment': get_assignment_name(pull.name), 'name': pull.name,
+                                        'full_path': pull.path, 'created_timestamp': created_timestamp})
+
+    # measuring is I/O bound, so the folders are walked in parallel
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        inventories = list(executor.map(get_directory_files, [folder['full_path'] for folder in folders]))
+
+    # a hardlinked file only frees space once all of its links are deleted, and is counted once (in the first folder that has it)
+    links = dict()
+    for files in inventories:
+        for key, (_, _, count) in files.items(): links[key] = links.get(key, 0) + count
+    for folder, files in zip(folders, inventories):
+        folder['size'] = 0
+        for key, (size, link_count, _) in files.items():
+            if key in links and links.pop(key) >= link_count: folder['size'] += size
+    return folders
+
+def format_size(size:int) -> str:
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if size < 1024: return f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} TB"
+
+def print_report(folders:list):
+    """Prints the pull folders grouped by organization and assignment, with the bytes each group reclaims
+
+    Args:
+        folders (list): pull folders from `scan_pull_folders`
+    """
+    groups = dict()
+    for folder in folders: groups.setdefault(folder['organization'], dict()).setdefault(folder['assignment'], []).append(folder)
+
+    for organization, assignments in sorted(groups.items()):
+        organization_size = sum(folder['size'] for pulls in assignments.values() for folder in pulls)
+        print(f"{organization} ({format_size(organization_size)})")
+        for assignment, pulls in sorted(assignments.items()):
+            print(f"\t{assignment} ({len(pulls)} pull(s), {format_size(sum(folder['size'] for folder in pulls))})")
+            for folder in sorted(pulls, key=lambda folder: folder['created_timestamp']):
+                print(f"\t\t- {folder['name']} (created: {folder['created_timestamp']}, {format_size(folder['size'])})")
+    print(f"Total reclaimable: {format_size(sum(folder['size'] for folder in folders))}")
+
+def move_to_trash(path:str) -> str:
+    """Renames a folder into a hidden trash folder next to it (instant, unlike deleting it)
+
+    Returns:
+        str: path of the trash folder
+    """
+    parent, name = os.path.split(os.path.normpath(path))
+    trash_path = os.path.join(parent, f"{TRASH_PREFIX}{name}-{uuid.uuid4().hex[:8]}")
+    os.rename(path, trash_path)
+    return trash_path
+
+def remove_readonly(function, path, _):
+    """rmtree error handler for read-only files (i.e. git objects on Windows)
+    """
+    os.chmod(path, stat.S_IWRITE)
+    function(path)
+
+def delete_paths(paths:list, max_workers:int=DEFAULT_MAX_WORKERS) -> list:
+    """Deletes folders in parallel, one subfolder (student repository) at a time, so a single large pull folder is spread
+    across the workers too
+
+    Args:
+        paths (list): folders to delete
+        max_workers (int): number of subfolders deleted at the same time
+
+    Returns:
+        list: (path, error) of the folders that could not be deleted
+    """
+    def delete(path):
+        try: shutil.rmtree(path, onerror=remove_readonly)
+        except Exception as e: return (path, e)
+
+    subfolders = []
+    for path in paths:
+        try:
+            with os.scandir(path) as entries: subfolders.extend(entry.path for entry in entries if entry.is_dir(follow_symlinks=False))
+        except OSError: continue # reported when deleting the folder
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        errors = [error for error in executor.map(delete, subfolders) if error]
+        failed = {os.path.dirname(path) for path, _ in errors}
+        # what is left of each folder (files next to the subfolders), unless a subfolder already failed
+        return errors + [error for error in executor.map(delete, [path for path in paths if path not in failed]) if error]
+
+def delete_in_background(paths:list, max_workers:int=DEFAULT_MAX_WORKERS):
+    """Deletes folders in a detached process that keeps running after this script exits
+
+    Args:
+        paths (list): folders to delete
+        max_workers (int): number of subfolders deleted at the same time
+    """
+    options = {'creationflags': subprocess.DETACHED_PROCESS | subprocess.CREATE_NEW_PROCESS_GROUP} if platform.system() == 'Windows' else {'start_new_session': True}
+    subprocess.Popen([sys.executable, os.path.abspath(__file__), '--delete-paths', *paths, '--workers', str(max_workers)],
+                     stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, **options)
+
+def find_trash(clone_output_path:str) -> list:
+    """Finds trash folders left behind by an interrupted deletion
+
+    Returns:
+        list: paths of the trash folders
+    """
+    trash = []
+    with os.scandir(clone_output_path) as organizations:
+        for organization in organizations:
+            if not organization.is_dir(follow_symlinks=False) or organization.name.startswith('.'): continue
+            with os.scandir(organization.path) as pulls:
+                trash.extend(pull.path for pull in pulls if pull.name.startswith(TRASH_PREFIX) and pull.is_dir(follow_symlinks=False))
+    return trash
+
+def prune_local_repos(clone_output_path:str, delta_string:str, prompt_removal:bool, dry_run:bool=False, background:bool=False, max_workers:int=DEFAULT_MAX_WORKERS):
+    """Removes local repositories that are cloned by the script
+
+    Args:
+        clone_output_path (str): Output path to search and delete files
+        delta_string (str): Remove folders older than this duration (see repo_utils.parse_duration_string)
+        prompt_removal (bool): Determines whether a prompt is required to remove files from the local system
+        dry_run (bool): Only print the report
+        background (bool): Delete in a detached process so the prompt returns right away
+        max_workers (int): number of folders measured and deleted at the same time
+    """
+    timestamp_now = datetime.now()
+    remove_before_timestamp = timestamp_now - repo_utils.parse_duration_string(delta_string)
+    folders = scan_pull_folders(clone_output_path, remove_before_timestamp, max_workers)
+    trash = find_trash(clone_output_path)
+
+    if not folders and not trash:
+        print("Nothing to delete.")
+        return
+
+    print("--------------------DIRECTORIES TO DELETE----------------------")
+    print(f"Searched path             :  {clone_output_path}")
+    print(f"Current timestamp         :  {timestamp_now}")
+    print(f"Deleting files older than :  {remove_before_timestamp}")
+    print(f"Difference                :  {delta_string}")
+    print("---------------------------------------------------------------")
+    print_report(folders)
+    if trash: print(f"Leftovers from an interrupted deletion: {len(trash)} folder(s)")
+    print()
+    if dry_run:
+        print("Dry run, not deleting the above files.")
+        return
+    if prompt_removal:
+        prompt = input("Do you want to delete these files? (`yes` for yes; any other input for no): ")
+        if prompt.strip().lower() != 'yes':
+            print("Not deleting the above files.")
+            return
+
+    print("---------------------DELETING DIRECTORIES----------------------")
+    for folder in folders:
+        try: trash.append(move_to_trash(folder['full_path']))
+        except OSError as e: print(f"(!) Cannot delete {folder['full_path']}\n{e}\n") # i.e. a file is open in another program
+    if background:
+        delete_in_background(trash, max_workers)
+        print(f"Deleting {len(trash)} folder(s) in the background.")
+        return
+    for path, e in delete_paths(trash, max_workers):
+        print(f"(!) Cannot delete {path}\n{e}\n")
+    print("Done!")
+
+def prune_old_submissions_logs(submission_store, delta_string:str, prompt_removal:bool, dry_run:bool=False):
+    """Removes the submission logs of assignments that were last pulled before a duration
+
+    Args:
+        submission_store (SubmissionStore): store of the submission logs
+        delta_string (str): Remove assignments last pulled before this duration (see repo_utils.parse_duration_string)
+        prompt_removal (bool): Determines whether a prompt is required to remove the logs
+        dry_run (bool): Only print the report
+    """
+    remove_before_timestamp = datetime.now() - repo_utils.parse_duration_string(delta_string)
+    assignments = []
+    for assignment in submission_store.get_assignments():
+        try: last_pulled = datetime.strptime(assignment['last_pulled'], PULL_TIMESTAMP_FORMAT)
+        except (TypeError, ValueError): continue # never pulled, or pulled with an unknown timestamp format
+        if remove_before_timestamp > last_pulled: assignments.append({**assignment, 'last_pulled': last_pulled})
+
+    if not assignments:
+        print("No submission logs to delete.")
+        return
+
+    print("-----------------SUBMISSION LOGS TO DELETE---------------------")
+    print(f"Deleting logs last pulled before :  {remove_before_timestamp}")
+    print("---------------------------------------------------------------")
+    organizations = dict()
+    for assignment in assignments: organizations.setdefault(assignment['organization'], []).append(assignment)
+    for organization, pulls in sorted(organizations.items()):
+        print(organization)
+        for assignment in sorted(pulls, key=lambda assignment: assignment['last_pulled']):
+            print(f"\t- {assignment['assignment']} (last pulled: {assignment['last_pulled']}, {assignment['num_submissions']} student(s))")
+    print()
+    if dry_run:
+        print("Dry run, not deleting the above submission logs.")
+        return
+    if prompt_removal:
+        prompt = input("Do you want to delete these submission logs? (`yes` for yes; any other input for no): ")
+        if prompt.strip().lower() != 'yes':
+            print("Not deleting the above submission logs.")
+            return
+
+    for assignment in assignments: submission_store.delete_assignment(assignment['organization'], assignment['assignment'])
+    print("Done!")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Removes old pull folders (and submission logs) created by cloneRepos.py")
+    parser.add_argument('duration', nargs='?', help="remove anything older than this duration (i.e. 90d, 12h, 90d12h)")
+    parser.add_argument('--path', help="clone output path (defaults to `clone_output_path` from the config file)")
+    parser.add_argument('--dry-run', action='store_true', help="only print what would be deleted")
+    parser.add_argument('--yes', action='store_true', help="do not prompt before deleting")
+    parser.add_argument('--background', action='store_true', help="delete in a background process and return right away")
+    parser.add_argument('--submission-logs', action='store_true', help="prune the submission logs instead of the pull folders")
+    parser.add_argument('--workers', type=int, default=DEFAULT_MAX_WORKERS, help="number of folders measured/student folders deleted at the same time")
+    parser.add_argument('--delete-paths', nargs='+', help=argparse.SUPPRESS) # used by delete_in_background
+    args = parser.parse_args()
+
+    if args.delete_paths: delete_paths(args.delete_paths, args.workers)
+    elif not args.duration: parser.error("the duration is required")
+    else:
+        import cloneRepos
+        import submission_store
+        config = cloneRepos.import_config()
+        if args.submission_logs:
+            store = submission_store.open_submission_store(config)
+            prune_old_submissions_logs(store, args.duration, not args.yes, args.dry_run)
+            store.close()
+        else: prune_local_repos(args.path or config['clone_output_path'], args.duration, not args.yes, args.dry_run, args.background, args.workers)
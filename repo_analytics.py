@@ -0,0 +1,281 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import argparse
+import csv
+import os
+import re
+import subprocess
+import content_search
+import journal
+import repo_utils
+
+"""
+Commit and author analytics of student repositories
+
+The history of a repository is read through one `git cat-file --batch` process: starting from HEAD, the commits of every
+generation are requested at once and their headers are parsed into compact CommitRecord objects (no GitPython objects and
+no object database lookups per attribute), so thousands of commits across hundreds of repositories take a few seconds.
+
+Flags of every student:
+    bot_only            every commit is from a bot (BAD_AUTHORS), i.e. only the GitHub Classroom starter commit
+    upload_commits      commits made through the GitHub web uploader (BAD_COMMIT_MESSAGES)
+    author_mismatch     nobody but bots and other people committed: no author matches the student's GitHub username or roster name
+    deadline_burst      at least `burst_size` commits in the `burst_window` before the deadline (or before the last commit)
+
+Run after every pull with `analyze_commits`, or on an existing pull folder:
+    py repo_analytics.py <pull_folder> [--deadline "2024-03-01 23:59"] [--burst-window 2h] [--burst-size 10] [--workers N]
+"""
+
+DEFAULT_MAX_WORKERS = min(32, (os.cpu_count() or 4) * 4) # every repository is read by its own git process
+DEFAULT_BURST_WINDOW = "2h"
+DEFAULT_BURST_SIZE = 10
+BATCH_SIZE = 64 # commits requested from cat-file at once (keeps the pipes from filling up)
+RESULTS_FILE = "analytics_results.csv"
+IDENTITY_PATTERN = re.compile(rb'^(.*) <(.*)> (\d+) ([+-]\d{4})$')
+NOREPLY_PATTERN = re.compile(r'^(?:\d+\+)?([^@]+)@users\.noreply\.github\.com$', re.IGNORECASE)
+NAME_SEPARATOR = re.compile(r'[^\w]+|_')
+FLAGS = ['bot_only', 'upload_commits', 'author_mismatch', 'deadline_burst']
+
+class CommitRecord:
+    __slots__ = ('sha', 'parents', 'author_name', 'author_email', 'author_time', 'committer_name', 'commit_time', 'summary')
+
+    def __init__(self, sha:str, parents:tuple, author_name:str, author_email:str, author_time:int, committer_name:str, commit_time:int, summary:str):
+        self.sha = sha
+        self.parents = parents
+        self.author_name = author_name
+        self.author_email = author_email
+        self.author_time = author_time # unix timestamps
+        self.committer_name = committer_name
+        self.commit_time = commit_time
+        self.summary = summary # first line of the message
+
+    def __repr__(self) -> str:
+        return f"CommitRecord({self.sha[:7]}, {self.author_name!r}, {self.summary!r})"
+
+
+def parse_identity(line:bytes) -> tuple:
+    """Parses the value of an `author`/`committer` header
+
+    Returns:
+        tuple: name, email and unix timestamp (None for a malformed header)
+    """
+    match = IDENTITY_PATTERN.match(line)
+    if not match: return None
+    return match.group(1).decode(errors='replace'), match.group(2).decode(errors='replace'), int(match.group(3))
+
+def parse_commit(sha:str, data:bytes) -> CommitRecord:
+    """Parses a raw commit object (headers, blank line, message)
+    """
+    headers, _, message = data.partition(b'\n\n')
+    parents = []
+    author = committer = ('', '', 0)
+    for line in headers.split(b'\n'):
+        if line.startswith(b'parent '): parents.append(line[7:].decode())
+        elif line.startswith(b'author '): author = parse_identity(line[7:]) or author
+        elif line.startswith(b'committer '): committer = parse_identity(line[10:]) or committer
+    summary = message.split(b'\n', 1)[0].strip().decode(errors='replace')
+    return CommitRecord(sha, tuple(parents), author[0], author[1], author[2], committer[0], committer[2], summary)
+
+
+class CatFileReader:
+    def __init__(self, repo_path:str):
+        """Persistent `git cat-file --batch` process of a repository. Use as a context manager, or call close()
+
+        Args:
+            repo_path (str): repository (checkout or bare)
+        """
+        # objects missing from a partial or shallow clone are reported as missing instead of being downloaded
+        environment = {**os.environ, 'GIT_NO_LAZY_FETCH': '1'}
+        self.__process = subprocess.Popen(['git', 'cat-file', '--batch'], cwd=repo_path, env=environment,
+                                          stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+
+    def read(self, revisions:list) -> list:
+        """Reads objects. The revisions are written to git at once and the objects are read back in the same order
+
+        Args:
+            revisions (list): object names or revisions (i.e. `HEAD`)
+
+        Returns:
+            list: (sha, type, contents) of every revision, None for a missing one
+        """
+        self.__process.stdin.write(''.join(f"{revision}\n" for revision in revisions).encode())
+        self.__process.stdin.flush()
+        objects = []
+        for _ in revisions:
+            header = self.__process.stdout.readline().split()
+            if len(header) != 3: # `<revision> missing` or `<revision> ambiguous`
+                objects.append(None)
+                continue
+            size = int(header[2])
+            contents = self.__process.stdout.read(size + 1)[:size] # the object is followed by a newline
+            objects.append((header[0].decode(), header[1].decode(), contents))
+        return objects
+
+    def close(self):
+        if self.__process.poll() is None:
+            self.__process.stdin.close()
+            self.__process.wait()
+        self.__process.stdout.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def read_history(repo_path:str, revision:str='HEAD') -> list:
+    """Reads every commit reachable from a revision
+
+    Returns:
+        list: CommitRecord of every commit, newest first (by committer date). Empty for a repository without commits
+    """
+    commits = dict()
+    with CatFileReader(repo_path) as reader:
+        pending = [revision]
+        while pending:
+            batch, pending = pending[:BATCH_SIZE], pending[BATCH_SIZE:]
+            for read in reader.read(batch):
+                if not read or read[1] != 'commit' or read[0] in commits: continue
+                commit = parse_commit(read[0], read[2])
+                commits[commit.sha] = commit
+                pending.extend(parent for parent in commit.parents if parent not in commits)
+    return sorted(commits.values(), key=lambda commit: commit.commit_time, reverse=True)
+
+def parse_window(window:str) -> float:
+    """Parses a duration string (see repo_utils.parse_duration_string) to seconds
+    """
+    now = datetime.now()
+    return (now + repo_utils.parse_duration_string(window) - now).total_seconds()
+
+def is_bot(commit:CommitRecord) -> bool:
+    return commit.author_name in repo_utils.BAD_AUTHORS or commit.author_name.endswith('[bot]')
+
+def matches_login(commit:CommitRecord, login:str) -> bool:
+    """Checks whether a commit was authored by a GitHub user (by author name, or the user's noreply email)
+    """
+    login = login.lower()
+    noreply = NOREPLY_PATTERN.match(commit.author_email)
+    return commit.author_name.lower() == login or commit.author_email.lower().split('@')[0] == login or bool(noreply and noreply.group(1).lower() == login)
+
+def get_name_parts(name:str) -> set:
+    """Splits a name into lowercase words (`Doe-John`, "John Doe" and `john.doe` give the same words)
+    """
+    return set(NAME_SEPARATOR.split(name.lower())) - {''}
+
+def matches_name(commit:CommitRecord, student_name:str) -> bool:
+    """Checks whether a commit was authored under the student's roster name, the way a local git is usually set up (by every word of
+    the name in the author name or the user part of the email, i.e. "John A. Doe" <john.doe@example.com> for `Doe-John`)
+    """
+    name_parts = get_name_parts(student_name)
+    if not name_parts: return False
+    for identity in (commit.author_name, commit.author_email.split('@')[0]):
+        identity_parts = get_name_parts(identity)
+        if len(name_parts) > 1 and name_parts <= identity_parts: return True
+        if name_parts == identity_parts: return True # a single word has to be the whole name
+    return False
+
+def analyze_history(commits:list, login:str=None, deadline:datetime=None, burst_window:float=None, burst_size:int=DEFAULT_BURST_SIZE, student_name:str=None) -> dict:
+    """Computes the flags of a student from the history of their repository
+
+    Args:
+        commits (list): CommitRecord of every commit (see read_history)
+        login (str): GitHub username of the student (None to skip `author_mismatch`)
+        student_name (str): roster name of the student (i.e. `Doe-John`), also accepted as the author of a commit
+        deadline (datetime): deadline of the assignment (None to look at the time before the last commit)
+        burst_window (float): seconds before the deadline that are checked for a burst of commits
+        burst_size (int): commits within `burst_window` that are flagged
+
+    Returns:
+        dict: number of `commits`, student `authors` (not bots), the flags (see FLAGS) and the number of `upload_commits` and `burst_commits`
+    """
+    if burst_window is None: burst_window = parse_window(DEFAULT_BURST_WINDOW)
+    student_commits = [commit for commit in commits if not is_bot(commit)]
+    authors = sorted({commit.author_name for commit in student_commits})
+    uploads = sum(1 for commit in student_commits if commit.summary in repo_utils.BAD_COMMIT_MESSAGES)
+    burst_end = deadline.timestamp() if deadline else max((commit.commit_time for commit in student_commits), default=0)
+    burst = sum(1 for commit in student_commits if burst_end - burst_window <= commit.commit_time <= burst_end)
+    return {
+        'commits': len(commits),
+        'authors': authors,
+        'bot_only': bool(commits) and not student_commits,
+        'upload_commits': uploads,
+        'author_mismatch': bool(login and student_commits and not any(matches_login(commit, login) or (student_name and matches_name(commit, student_name)) for commit in student_commits)),
+        'deadline_burst': burst >= burst_size,
+        'burst_commits': burst,
+    }
+
+def get_flags(analytics:dict) -> list:
+    """Gets the names of the flags raised for a student
+    """
+    return [flag for flag in FLAGS if analytics.get(flag)]
+
+def analyze_repositories(repositories:dict, deadline:datetime=None, burst_window:float=None, burst_size:int=DEFAULT_BURST_SIZE, max_workers:int=DEFAULT_MAX_WORKERS) -> dict:
+    """Reads the history of every repository and computes the flags of every student
+
+    Args:
+        repositories (dict): student name -> (repository path, GitHub username or None)
+        see analyze_history for the other arguments
+
+    Returns:
+        dict: student -> analytics (see analyze_history)
+    """
+    def analyze(item):
+        student, (path, login) = item
+        return student, analyze_history(read_history(path), login, deadline, burst_window, burst_size, student)
+
+    with ThreadPoolExecutor(max(1, max_workers)) as executor:
+        return dict(executor.map(analyze, repositories.items()))
+
+def format_flags(analytics:dict) -> str:
+    """Describes the flags of a student (i.e. `2 upload commit(s), 12 commits before the deadline`)
+    """
+    descriptions = {
+        'bot_only': "only bot commits",
+        'upload_commits': f"{analytics['upload_commits']} upload commit(s)",
+        'author_mismatch': f"authored by {', '.join(analytics['authors'])}",
+        'deadline_burst': f"{analytics['burst_commits']} commits right before the deadline",
+    }
+    return ', '.join(descriptions[flag] for flag in get_flags(analytics))
+
+def write_results(pull_path:str, results:dict) -> str:
+    """Writes the analytics to RESULTS_FILE in the pull folder (one row per student)
+
+    Returns:
+        str: path of the file
+    """
+    results_path = os.path.join(pull_path, RESULTS_FILE)
+    with open(results_path, 'w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(['student', 'commits', 'authors', *FLAGS, 'burst_commits'])
+        for student, analytics in results.items():
+            writer.writerow([student, analytics['commits'], ';'.join(analytics['authors']), *(int(analytics[flag]) for flag in FLAGS), analytics['burst_commits']])
+    return results_path
+
+def get_logins(pull_path:str) -> dict:
+    """Gets the GitHub username of every student from the journal of a pull folder
+
+    Returns:
+        dict: mapping of the student name to the git identifier (empty for pulls without a journal)
+    """
+    try: events = journal.read_journal(pull_path)
+    except FileNotFoundError: return dict()
+    return {event['student_name']: identifier for identifier, event in journal.get_student_events(events).items() if event.get('student_name')}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Flags suspicious commit histories in the student repositories of a pull folder")
+    parser.add_argument('pull_folder', help="pull folder (`<assignment>-<timestamp>`)")
+    parser.add_argument('--deadline', help="deadline of the assignment (i.e. \"2024-03-01 23:59\"). Without it, bursts are checked before the last commit")
+    parser.add_argument('--burst-window', default=DEFAULT_BURST_WINDOW, help=f"time before the deadline checked for bursts of commits (default: {DEFAULT_BURST_WINDOW})")
+    parser.add_argument('--burst-size', type=int, default=DEFAULT_BURST_SIZE, help=f"commits within the window that are flagged (default: {DEFAULT_BURST_SIZE})")
+    parser.add_argument('--workers', type=int, default=DEFAULT_MAX_WORKERS, help=f"repositories read at the same time (default: {DEFAULT_MAX_WORKERS})")
+    args = parser.parse_args()
+
+    logins = get_logins(args.pull_folder)
+    repositories = {student: (path, logins.get(student)) for student, path in content_search.get_repositories(args.pull_folder).items()}
+    results = analyze_repositories(repositories, repo_utils.parse_deadline(args.deadline), parse_window(args.burst_window), args.burst_size, args.workers)
+    flagged = {student: analytics for student, analytics in results.items() if get_flags(analytics)}
+    for student, analytics in flagged.items(): print(f"{student} ({analytics['commits']} commits): {format_flags(analytics)}")
+    print(f"\n{len(flagged)}/{len(results)} student(s) flagged, {sum(analytics['commits'] for analytics in results.values())} commits read.")
+    print(f"Analytics of every student written to {write_results(args.pull_folder, results)}")
@@ -1,99 +1,182 @@
-from git import Repo
 import yaml
-from threading_utils import synchronized
-from dateutil.relativedelta import relativedelta
-from datetime import datetime
+from datetime import datetime, time
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
 import os
 import platform
+import re
 import pprint
-import shutil
 import subprocess
 pp = pprint.PrettyPrinter(indent=4)
 
 SUBMISSION_LOGS = "config/submissions.yml" # logs submissions since last pull
+YAML_LOADER = getattr(yaml, 'CSafeLoader', yaml.SafeLoader) # libyaml bindings when PyYAML is built with them (several times faster)
+YAML_DUMPER = getattr(yaml, 'CSafeDumper', yaml.SafeDumper)
 BAD_AUTHORS = {"github-classroom[bot]"} 
 BAD_COMMIT_MESSAGES = {"Add files via upload"} # commit messages that might indicate that they're using AI code in some way
+DEADLINE_BRANCH = "before-deadline" # branch checked out at the last commit before the deadline of an assignment
+HASH_CHUNK_SIZE = 1024 * 1024 # bytes read at a time when hashing a file
+GIT_STDERR_PATTERNS = { # types of errors that are thrown by git
+    'err_error': re.compile(r'error: (.+)'),
+    'err_remote': re.compile(r'remote: (.+)'),
+    'err_fatal': re.compile(r'fatal: (.+)'),
+    'err_warning': re.compile(r'warning: (.+)'),
+}
 
 class Submission:
-    def __init__(self, identifier:str, organization_name: str, assignment_name: str, submissions_dict: dict, repo:Repo):
+    def __init__(self, identifier:str, organization_name: str, assignment_name: str, submission_store, repo):
         """Statistics about a student's submission
 
         Args:
             identifier (str): git identifier
             organization_name (str): organization name of the submission
             assignment_name (str): assignment name of the submission
-            timestamp_pulled (str): timestamp when the submission was pulled
-            submissions_dict (dict): Submissions dictionary
-            repo (Repo): git repository associated with the submission
+            submission_store (SubmissionStore): store of the submission logs
+            repo (git.Repo): git repository associated with the submission
         """
         self.__git_identifier = identifier
         self.__organization_name = organization_name
         self.__assignment_name = assignment_name
         self.__repo = repo
-        self.__commits = list(self.__repo.iter_commits())
+        # commit metadata is resolved lazily; the history is never loaded as a whole
+        self.__commit_latest = None
+        self.__commit_length = None
         
-        # Add the student to the submissions dictionary if their repository is being pulled for the first time
-        if self.__git_identifier not in submissions_dict['organizations'][self.__organization_name]['submission_history'][self.__assignment_name]['submissions']:
-            submissions_dict['organizations'][self.__organization_name]['submission_history'][self.__assignment_name]['submissions'][self.__git_identifier] = {'num_commits': 0, 'commit_hash': None}
+        # Add the student to the submission logs if their repository is being pulled for the first time
+        if self.__get_stored(submission_store) is None:
+            submission_store.update_submission(self.__organization_name, self.__assignment_name, self.__git_identifier, 0, None)
+
+    def __get_stored(self, submission_store) -> dict:
+        return submission_store.get_submission(self.__organization_name, self.__assignment_name, self.__git_identifier)
 
-    @synchronized
-    def update_submission_info(self, submissions_dict: dict):
-        """ Updates the submission information to a submission dictionary
+    def update_submission_info(self, submission_store):
+        """ Updates the submission information in the submission store
         
         Args:
-            submissions_dict (dict): Submissions dictionary
+            submission_store (SubmissionStore): store of the submission logs
         """  
-        submissions_dict['organizations'][self.__organization_name]['submission_history'][self.__assignment_name]['submissions'][self.__git_identifier]['num_commits'] = self.get_commit_length_latest()
-        submissions_dict['organizations'][self.__organization_name]['submission_history'][self.__assignment_name]['submissions'][self.__git_identifier]['commit_hash'] = self.get_commit_hash_latest()
+        submission_store.update_submission(self.__organization_name, self.__assignment_name, self.__git_identifier, self.get_commit_length_latest(), self.get_commit_hash_latest())
+
+    def record_pull(self, submission_store, timestamp_pulled:str, submitted:bool):
+        """Records this pull in the pull history of the submission store
+
+        Args:
+            submission_store (SubmissionStore): store of the submission logs
+            timestamp_pulled (str): timestamp when the submission was pulled
+            submitted (bool): whether or not there is a new submission
+        """
+        submission_store.record_pull(self.__organization_name, self.__assignment_name, self.__git_identifier, timestamp_pulled, self.get_commit_length_latest(), self.get_commit_hash_latest(), submitted)
 
     def get_commits(self):
-        return self.__commits
+        """Walks the commit history from the latest commit, one commit at a time
+
+        Yields:
+            Commit: commits of the repository (newest first)
+        """
+        if self.get_commit_latest() is None: return
+        yield from self.__repo.iter_commits()
     
     def get_commit_latest(self):
-        return self.__commits[0]
+        if self.__commit_latest is None:
+            try: self.__commit_latest = self.__repo.head.commit
+            except ValueError: return None # empty repository (HEAD points to an unborn branch)
+        return self.__commit_latest
     
     def get_commit_hash_latest(self):
-        return self.__commits[0].hexsha
+        commit = self.get_commit_latest()
+        return commit.hexsha if commit else None
     
-    def get_commit_hash_stored(self, submissions_dict:dict) -> str:
-        """Gets the commit hash stored in the submissions dictionary
+    def get_commit_hash_stored(self, submission_store) -> str:
+        """Gets the commit hash stored in the submission store
 
         Args:
-            submissions_dict (dict): Submissions dictionary
+            submission_store (SubmissionStore): store of the submission logs
 
         Returns:
             str: Commit hash
         """
-        return submissions_dict['organizations'][self.__organization_name]['submission_history'][self.__assignment_name]['submissions'][self.__git_identifier]['commit_hash']
+        return self.__get_stored(submission_store)['commit_hash']
 
     def get_commit_length_latest(self) -> int:
-        return len(self.__commits)
+        from git import GitCommandError
+        if self.__commit_length is None:
+            try: self.__commit_length = int(self.__repo.git.rev_list('--count', 'HEAD'))
+            except GitCommandError: self.__commit_length = 0 # empty repository
+        return self.__commit_length
     
-    def get_commit_length_stored(self, submissions_dict:dict) -> int:
-        """Gets the number of commits that is stored in the submissions dictionary
+    def get_commit_length_stored(self, submission_store) -> int:
+        """Gets the number of commits that is stored in the submission store
 
         Args:
-            submissions_dict (dict): Submissions Dictionary
+            submission_store (SubmissionStore): store of the submission logs
 
         Returns:
             int: number of commits stored for the user
         """
-        return submissions_dict['organizations'][self.__organization_name]['submission_history'][self.__assignment_name]['submissions'][self.__git_identifier]['num_commits']
+        return self.__get_stored(submission_store)['num_commits']
     
-    def is_submitted(self, submissions_dict:dict) -> bool:
+    def is_submitted(self, submission_store) -> bool:
         """Checks if there is a submission
 
         Returns:
             bool: Whether or not a submission is considered "submitted"
         """
-        if self.get_commit_length_latest() == 0 or str(self.__commits[0].author) in BAD_AUTHORS:
+        if self.get_commit_latest() is None or str(self.get_commit_latest().author) in BAD_AUTHORS:
             return False
         # checks if there are new commits from the last pull
-        if self.get_commit_hash_stored(submissions_dict) == self.get_commit_hash_latest():
+        if self.get_commit_hash_stored(submission_store) == self.get_commit_hash_latest():
             return False
         return True 
     
 
+def load_submissions(path:str=None) -> dict:
+    """Loads the submission logs from a yaml file
+
+    Args:
+        path (str): path of the yaml file (defaults to SUBMISSION_LOGS)
+
+    Returns:
+        dict: Submissions dictionary
+    """
+    config = dict()
+    with open(path or SUBMISSION_LOGS, 'r') as file:
+        config = yaml.load(file, Loader=YAML_LOADER) or dict()
+    if config.get('organizations') is None:
+        config['organizations'] = dict()
+    return config
+
+def add_assignment(submissions_dict:dict, organization_name, organization_identifier, timestamp_pulled, assignment_name) -> dict:
+    """Adds an organization and assignment to the submissions dictionary (if needed) and updates the time it was last pulled
+
+    Args:
+        submissions_dict (dict): Submissions dictionary
+        organization_name (str): Organization Name (full)
+        organization_identifier (str): Organization identifier
+        timestamp_pulled (str): timestamp that the submission is pulled at 
+        assignment_name (str): Name of the assignment
+
+    Returns:
+        dict: Submissions dictionary
+    """
+    config = submissions_dict
+    if organization_name not in config['organizations']:
+        config['organizations'][organization_name] = {
+            'identifier': organization_identifier, 
+            'submission_history': dict()
+        }
+    
+    # add new assignment
+    if assignment_name not in config['organizations'][organization_name]['submission_history']:
+        config['organizations'][organization_name]['submission_history'].update({
+            assignment_name: {
+                'last_pulled': None,
+                'submissions': dict()
+            } 
+        })
+        
+    config['organizations'][organization_name]['submission_history'][assignment_name]['last_pulled'] = timestamp_pulled
+    return config
+
 def import_submissions(organization_name, organization_identifier, timestamp_pulled, assignment_name) -> dict:
     """Imports submissions from a yaml file
 
@@ -106,41 +189,140 @@ def import_submissions(organization_name, organization_identifier, timestamp_pul
     Returns:
         dict: Submissions dictionary
     """
-    config = dict()
-    with open(SUBMISSION_LOGS, 'r') as file:
-        config = yaml.load(file, Loader=yaml.FullLoader)
-        
-        if config['organizations'] is None:
-            config['organizations'] = dict()
-        
-        if organization_name not in config['organizations']:
-            config['organizations'][organization_name] = {
-                'identifier': organization_identifier, 
-                'submission_history': dict()
-            }
-        
-        # add new assignment
-        if assignment_name not in config['organizations'][organization_name]['submission_history']:
-            config['organizations'][organization_name]['submission_history'].update({
-                assignment_name: {
-                    'last_pulled': None,
-                    'submissions': dict()
-                } 
-            })
-            
-        config['organizations'][organization_name]['submission_history'][assignment_name]['last_pulled'] = timestamp_pulled
-
-    return config 
-
-def save_submissions(submissions_dict: dict):
+    return add_assignment(load_submissions(), organization_name, organization_identifier, timestamp_pulled, assignment_name)
+
+def save_submissions(submissions_dict: dict, path:str=None):
     """Saves the modified submissions dictionary
 
     Args:
         submissions_dict (dict): Submissions dictionary
+        path (str): path of the yaml file (defaults to SUBMISSION_LOGS)
+    """
+    with open(path or SUBMISSION_LOGS, 'w') as file:
+        yaml.dump(submissions_dict, file, Dumper=YAML_DUMPER)
+
+
+def classify_git_stderr_line(line:str, stderr_dict:dict) -> dict:
+    """Adds the first message of each error type found in a line of git stderr to the stderr dictionary
+
+    Args:
+        line (str): a line (or any chunk) of stderr
+        stderr_dict (dict): stderr dictionary to update
+
+    Returns:
+        dict: the updated stderr dictionary
+    """
+    for error_type, pattern in GIT_STDERR_PATTERNS.items():
+        if error_type in stderr_dict: continue
+        match = pattern.search(line)
+        if match: stderr_dict[error_type] = match.group(1)
+    return stderr_dict
+
+def parse_git_stderr(stderr:str) -> dict:
+    """Retrieves the error messages from the stderr of a git command
+
+    Args:
+        stderr (str): stderr of the git command
+
+    Returns:
+        dict: the full `stderr` and the first message of each type of error (`err_error`, `err_remote`, `err_fatal`, `err_warning`)
+    """
+    return classify_git_stderr_line(stderr, {'stderr': stderr})
+
+def get_sparse_checkout_args(paths:list) -> list:
+    """Gets the `git sparse-checkout set` arguments that check out only the given paths.
+    Cone mode (fast, directory based) is used when every path is a directory, optionally ending with `/**`;
+    otherwise the paths are used as gitignore-style patterns
+
+    Args:
+        paths (list): graded paths of an assignment (i.e. `src/main/java/unit03/**`)
+
+    Returns:
+        list: arguments passed to git
     """
-    with open(SUBMISSION_LOGS, 'w') as file:
-        yaml.dump(submissions_dict, file)
+    directories = [path.strip().removesuffix('/**').removesuffix('/*').strip('/') for path in paths]
+    if all(directory and not any(char in directory for char in '*?[!') for directory in directories):
+        return ['sparse-checkout', 'set', '--cone', '--', *directories]
+    return ['sparse-checkout', 'set', '--no-cone', '--', *paths]
+
+def get_remote_head(clone_url:str, timeout:int=60) -> str:
+    """Resolves the HEAD commit of a remote repository without cloning it (`git ls-remote`)
 
+    Args:
+        clone_url (str): remote url of the repository
+        timeout (int): seconds to wait for the remote
+
+    Returns:
+        str: commit hash of the remote HEAD, or None if it cannot be resolved (missing or empty repository)
+    """
+    try:
+        result = subprocess.run(['git', 'ls-remote', clone_url, 'HEAD'], capture_output=True, text=True, timeout=timeout,
+                                env={**os.environ, 'GIT_TERMINAL_PROMPT': '0'})
+    except (subprocess.TimeoutExpired, OSError):
+        return None
+    if result.returncode != 0 or not result.stdout: return None
+    return result.stdout.split()[0]
+
+def get_remote_heads(clone_urls:dict, max_workers:int=16) -> dict:
+    """Resolves the HEAD commit of many remote repositories at once
+
+    Args:
+        clone_urls (dict): mapping of a key (i.e. git identifier) to the remote url of the repository
+        max_workers (int): number of `git ls-remote` calls running at the same time
+
+    Returns:
+        dict: mapping of the same keys to the remote HEAD commit hash (None if it could not be resolved)
+    """
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as executor:
+        heads = executor.map(get_remote_head, clone_urls.values())
+        return dict(zip(clone_urls.keys(), heads))
+
+def parse_deadline(deadline) -> datetime:
+    """Parses the deadline of an assignment. Deadlines without a timezone are in local time, and a date without a time is the end of that day
+
+    Args:
+        deadline (str | date | datetime): deadline from the config file (i.e. "2024-03-01 23:59")
+
+    Returns:
+        datetime: timezone aware deadline, or None if there is no deadline
+    """
+    if not deadline: return None
+    if isinstance(deadline, str):
+        from dateutil import parser as date_parser
+        deadline = date_parser.parse(deadline)
+    elif not isinstance(deadline, datetime): deadline = datetime.combine(deadline, time.max)
+    return deadline.astimezone() if deadline.tzinfo is None else deadline
+
+def get_deadline_commit_args(deadline:datetime) -> list:
+    """Gets the `git rev-list` arguments that find the last commit at or before the deadline (committer date).
+    rev-list walks back from HEAD and stops at the first match, so only the late commits are visited
+
+    Returns:
+        list: arguments passed to git (prints the commit hash, or nothing if every commit is late)
+    """
+    return ['rev-list', '-1', f"--before={deadline.isoformat()}", 'HEAD']
+
+def get_late_commit_args(deadline_commit:str) -> list:
+    """Gets the `git rev-list` arguments that count the commits made after the deadline commit
+
+    Args:
+        deadline_commit (str): last commit before the deadline (None if every commit is late)
+
+    Returns:
+        list: arguments passed to git (prints the number of late commits)
+    """
+    return ['rev-list', '--count', f"{deadline_commit}..HEAD" if deadline_commit else 'HEAD']
+
+def get_deadline_checkout_commands(deadline_commit:str, bare:bool=False) -> list:
+    """Gets the git commands that check out the last commit before the deadline on DEADLINE_BRANCH (or only point HEAD to it in a bare repository).
+    Without such a commit, HEAD points to the unborn DEADLINE_BRANCH, so the repository reads as having no submission
+
+    Returns:
+        list: git commands (list of arguments)
+    """
+    if deadline_commit and not bare: return [['checkout', '-q', '-B', DEADLINE_BRANCH, deadline_commit]]
+    commands = [['update-ref', f"refs/heads/{DEADLINE_BRANCH}", deadline_commit]] if deadline_commit else []
+    return commands + [['symbolic-ref', 'HEAD', f"refs/heads/{DEADLINE_BRANCH}"]]
 
 def parse_duration_string(delta_string:str):
     """Parses the duration string to a format that is datetime compatible
@@ -159,6 +341,7 @@ def parse_duration_string(delta_string:str):
     Returns:
         relativedelta: time interval that is datetime compatible (i.e. 90days 12hours)
     """
+    from dateutil.relativedelta import relativedelta
     duration = relativedelta()
     
     current_value = '' # parsing integer values
@@ -179,6 +362,116 @@ def parse_duration_string(delta_string:str):
                 current_value = ''
     return duration
 
+def parse_size_string(size_string:str) -> int:
+    """Parses a size string to a number of bytes
+
+    Args:
+        size_string (str): Size in string (B, KB, MB, GB or TB; case insensitive)
+
+            i.e.
+            - 500MB = 500 megabytes
+            - 20GB = 20 gigabytes
+            - 1.5TB = 1.5 terabytes
+
+    Returns:
+        int: size in bytes
+    """
+    units = {'b': 1, 'kb': 1024, 'mb': 1024 ** 2, 'gb': 1024 ** 3, 'tb': 1024 ** 4}
+    size_string = str(size_string).strip().lower()
+    number = size_string.rstrip('kmgtb')
+    unit = size_string[len(number):] or 'b'
+    if unit not in units: raise ValueError(f"Invalid size `{size_string}`")
+    return int(float(number) * units[unit])
+
+def get_directory_size(path:str) -> int:
+    """Gets the total size of the files in a directory
+
+    Args:
+        path (str): directory path
+
+    Returns:
+        int: size in bytes
+    """
+    total = 0
+    with os.scandir(path) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False): total += get_directory_size(entry.path)
+            elif entry.is_file(follow_symlinks=False): total += entry.stat(follow_symlinks=False).st_size
+    return total
+
+def hash_file(path:str, size:int) -> bytes:
+    """Hashes a file like `git hash-object` (sha1 of `blob <size>\\0<content>`), so it matches the blob ids read from git
+
+    Returns:
+        bytes: blob id
+    """
+    digest = hashlib.sha1(b'blob %d\0' % size)
+    with open(path, 'rb') as file:
+        while chunk := file.read(HASH_CHUNK_SIZE): digest.update(chunk)
+    return digest.digest()
+
+def get_blob_sizes(repo_path:str, blobs:set) -> dict:
+    """Reads the size of blobs in one `git cat-file --batch-check`
+
+    Returns:
+        dict: blob id -> size in bytes (blobs missing from the object database are left out)
+    """
+    if not blobs: return dict()
+    result = subprocess.run(['git', 'cat-file', '--batch-check=%(objectname) %(objectsize)'], cwd=repo_path, input='\n'.join(blobs) + '\n',
+                            capture_output=True, text=True)
+    sizes = dict()
+    for line in result.stdout.splitlines():
+        blob, _, size = line.partition(' ')
+        if size.isdigit(): sizes[blob] = int(size)
+    return sizes
+
+def dissociate_repository(repo_path:str) -> bool:
+    """Copies the objects borrowed from a reference repository (`--reference`) into the repository, so the reference can be deleted
+
+    Args:
+        repo_path (str): path of the repository (working tree)
+
+    Returns:
+        bool: whether or not the repository borrowed objects from a reference
+    """
+    alternates = f"{repo_path}/.git/objects/info/alternates"
+    if not os.path.isfile(alternates): return False
+    subprocess.run(['git', 'repack', '-a', '-d', '-q'], cwd=repo_path, check=True)
+    os.remove(alternates)
+    return True
+
+def dissociate_repositories(pull_path:str) -> int:
+    """Dissociates every repository of a pull folder (`<assignment>-<timestamp>`) from the assignment template
+
+    Args:
+        pull_path (str): path of the pull folder
+
+    Returns:
+        int: number of repositories that were dissociated
+    """
+    dissociated = 0
+    with os.scandir(pull_path) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False) and not entry.name.startswith('.') and dissociate_repository(entry.path):
+                dissociated += 1
+    return dissociated
+
+def verify_checkout(repo_path:str, head:str) -> bool:
+    """Checks that a checkout is complete: HEAD is at the expected commit and the working tree matches it (i.e. before resuming a pull)
+
+    Args:
+        repo_path (str): path of the repository (working tree)
+        head (str): commit that was checked out, None if nothing was (empty repository, or every commit after the deadline)
+
+    Returns:
+        bool: whether or not the checkout can be kept
+    """
+    if not os.path.isdir(f"{repo_path}/.git"): return False
+    result = subprocess.run(['git', 'rev-parse', '--verify', '-q', 'HEAD'], cwd=repo_path, capture_output=True, text=True)
+    if (result.stdout.strip() if result.returncode == 0 else None) != head: return False
+    # files of a sparse checkout outside of the graded paths are skipped, so they don't count as missing
+    return head is None or subprocess.run(['git', 'diff', '--quiet', 'HEAD', '--'], cwd=repo_path, capture_output=True).returncode == 0
+
 def get_file_creation_time(file_path):
     if platform.system() == 'Windows': creation_time = os.path.getctime(file_path)
     else:
@@ -189,64 +482,34 @@ def get_file_creation_time(file_path):
 
     return datetime.fromtimestamp(creation_time)
 
-def prune_local_repos(clone_output_path:str, delta_string:str, prompt_removal:bool):
-    """Removes local repositories that are cloned by the script
+def prune_local_repos(clone_output_path:str, delta_string:str, prompt_removal:bool, dry_run:bool=False, background:bool=False):
+    """Removes local repositories that are cloned by the script (see prune_utils.prune_local_repos)
 
     Args:
         clone_output_path (str): Output path to search and delete files
-        remove_before_timestamp (datetime): Remove folders older than this timestamp
+        delta_string (str): Remove folders older than this duration
         prompt_removal (bool): Determines whether a prompt is required to remove files from the local system
+        dry_run (bool): Only print what would be deleted
+        background (bool): Delete in a background process so the prompt returns right away
     """
-    
-    dirs_to_remove = dict()
-    searched_paths = set()
-    
-    timestamp_now = datetime.now()
-    remove_before_timestamp = timestamp_now - parse_duration_string(delta_string)
-    # grab files that are older than the timestamp
-    for dir_parent in os.listdir(clone_output_path):
-        directory_path = f"{clone_output_path}/{dir_parent}/"
-        for directory_name in os.listdir(directory_path):
-            full_path = f"{directory_path}{directory_name}/"
-            path_timestamp = get_file_creation_time(full_path)
-            
-            if remove_before_timestamp > path_timestamp: # remove everything before path_timestamp 
-                dirs_to_remove[directory_name] = {'created_timestamp': path_timestamp, 'full_path': full_path}
-                searched_paths.add(directory_path)
-    
-    if len(dirs_to_remove) == 0:
-        return
-    
-    print("--------------------DIRECTORIES TO DELETE----------------------")
-    print("Searched paths:")
-    for path in searched_paths: print(f"- {path}")
-    print()
-    print(f"Current timestamp         :  {timestamp_now}")
-    print(f"Deleting files older than :  {remove_before_timestamp}")
-    print(f"Difference                :  {delta_string}")
-    print("---------------------------------------------------------------")
-    for dir in dirs_to_remove:
-        print(f"- {dir} (created: {dirs_to_remove[dir]['created_timestamp']})")
-    print()
-    if prompt_removal:
-        prompt = input("Do you want to delete these files? (`yes` for yes; any other input for no): ")
-        if not prompt:
-            print("Not deleting the above files.")
-            return
-    
-    print("---------------------DELETING DIRECTORIES----------------------")
-    for dir in dirs_to_remove:
-        path = dirs_to_remove[dir]['full_path']
-        try: 
-            shutil.rmtree(path)
-        except Exception as e: 
-            print(f"(!) Cannot delete {path}\n{e}\n")
-            
-    print("Done!")
-
-
-def prune_old_submissions_logs(delta_string:str):
-    pass
+    import prune_utils
+    prune_utils.prune_local_repos(clone_output_path, delta_string, prompt_removal, dry_run, background)
+
+
+def prune_old_submissions_logs(delta_string:str, prompt_removal:bool=True, dry_run:bool=False, submission_store=None):
+    """Removes the submission logs of assignments that were last pulled before a duration (see prune_utils.prune_old_submissions_logs)
+
+    Args:
+        delta_string (str): Remove assignments last pulled before this duration
+        prompt_removal (bool): Determines whether a prompt is required to remove the logs
+        dry_run (bool): Only print what would be deleted
+        submission_store (SubmissionStore): store of the submission logs (defaults to the yaml submission logs)
+    """
+    import prune_utils
+    from submission_store import YamlSubmissionStore
+    store = submission_store or YamlSubmissionStore()
+    prune_utils.prune_old_submissions_logs(store, delta_string, prompt_removal, dry_run)
+    if submission_store is None: store.close()
     
 
 
@@ -0,0 +1,342 @@
+from datetime import datetime
+import repo_utils
+import abc
+import json
+import os
+import sqlite3
+import threading
+import yaml
+
+"""
+Pluggable storage for the submission logs
+
+- YamlSubmissionStore: the original `config/submissions.yml` document, rewritten as a whole when the store is closed
+- SqliteSubmissionStore: SQLite database in WAL mode. Every update is committed as soon as a clone finishes, and every pull
+  of every student is kept in a history table. The first time the database is created, the existing yaml logs are imported.
+
+Both stores share the same interface, so `repo_utils.Submission` and the clone script do not depend on the backend.
+"""
+
+SUBMISSION_DB = "config/submissions.db"
+
+class SubmissionStore(abc.ABC):
+    """Interface of a submission store. Submissions are keyed by (organization name, assignment name, git identifier)
+    """
+
+    @abc.abstractmethod
+    def begin_pull(self, organization_name:str, organization_identifier:str, assignment_name:str, timestamp_pulled:str):
+        """Registers a new pull of an assignment
+
+        Args:
+            organization_name (str): Organization Name (full)
+            organization_identifier (str): Organization identifier
+            assignment_name (str): Name of the assignment
+            timestamp_pulled (str): timestamp that the submissions are pulled at
+        """
+
+    @abc.abstractmethod
+    def get_submission(self, organization_name:str, assignment_name:str, identifier:str) -> dict:
+        """Gets the stored submission of a student
+
+        Returns:
+            dict: `num_commits`, `commit_hash` and any extra information of the submission, or None if the student has never been pulled
+        """
+
+    @abc.abstractmethod
+    def get_submissions(self, organization_name:str, assignment_name:str) -> dict:
+        """Gets the stored submissions of an assignment
+
+        Returns:
+            dict: mapping of the git identifier to the stored submission
+        """
+
+    @abc.abstractmethod
+    def update_submission(self, organization_name:str, assignment_name:str, identifier:str, num_commits:int, commit_hash:str):
+        """Inserts or updates the latest submission of a student
+        """
+
+    @abc.abstractmethod
+    def update_submission_info(self, organization_name:str, assignment_name:str, identifier:str, **info):
+        """Merges extra information (i.e. late commits, build results) into the stored submission of a student
+        """
+
+    def record_pull(self, organization_name:str, assignment_name:str, identifier:str, timestamp_pulled:str, num_commits:int, commit_hash:str, submitted:bool):
+        """Records the result of pulling a student's repository in the pull history
+        """
+        pass
+
+    @abc.abstractmethod
+    def get_assignments(self) -> list:
+        """Gets every assignment in the store
+
+        Returns:
+            list: assignments (dict of `organization`, `assignment`, `last_pulled` and `num_submissions`)
+        """
+
+    @abc.abstractmethod
+    def delete_assignment(self, organization_name:str, assignment_name:str):
+        """Deletes the submission logs (and pull history) of an assignment
+        """
+
+    @abc.abstractmethod
+    def to_dict(self) -> dict:
+        """Exports the store in the format of `config/submissions.yml`
+
+        Returns:
+            dict: Submissions dictionary
+        """
+
+    def export_yaml(self, path:str):
+        """Writes the store to a yaml file in the format of `config/submissions.yml`
+
+        Args:
+            path (str): path of the yaml file
+        """
+        with open(path, 'w') as file:
+            yaml.dump(self.to_dict(), file, Dumper=repo_utils.YAML_DUMPER)
+
+    def flush(self):
+        """Saves the pending changes without closing the store (i.e. after every poll of the watcher)
+        """
+        pass
+
+    def close(self):
+        """Saves and closes the store
+        """
+        pass
+
+
+class YamlSubmissionStore(SubmissionStore):
+    def __init__(self, path:str=None):
+        """Submission store backed by the submissions yaml file. Changes are only written when the store is closed
+
+        Args:
+            path (str): path of the yaml file (defaults to repo_utils.SUBMISSION_LOGS)
+        """
+        self.__path = path or repo_utils.SUBMISSION_LOGS
+        self.__lock = threading.Lock()
+        self.__submissions = repo_utils.load_submissions(self.__path)
+
+    def __get_assignment(self, organization_name:str, assignment_name:str) -> dict:
+        return self.__submissions['organizations'][organization_name]['submission_history'][assignment_name]
+
+    def begin_pull(self, organization_name:str, organization_identifier:str, assignment_name:str, timestamp_pulled:str):
+        with self.__lock:
+            repo_utils.add_assignment(self.__submissions, organization_name, organization_identifier, timestamp_pulled, assignment_name)
+
+    def get_submission(self, organization_name:str, assignment_name:str, identifier:str) -> dict:
+        return self.__get_assignment(organization_name, assignment_name)['submissions'].get(identifier)
+
+    def get_submissions(self, organization_name:str, assignment_name:str) -> dict:
+        return dict(self.__get_assignment(organization_name, assignment_name)['submissions'])
+
+    def update_submission(self, organization_name:str, assignment_name:str, identifier:str, num_commits:int, commit_hash:str):
+        with self.__lock:
+            submissions = self.__get_assignment(organization_name, assignment_name)['submissions']
+            submissions.setdefault(identifier, dict()).update({'num_commits': num_commits, 'commit_hash': commit_hash})
+
+    def update_submission_info(self, organization_name:str, assignment_name:str, identifier:str, **info):
+        with self.__lock:
+            submissions = self.__get_assignment(organization_name, assignment_name)['submissions']
+            submissions.setdefault(identifier, {'num_commits': 0, 'commit_hash': None}).update(info)
+
+    def get_assignments(self) -> list:
+        assignments = []
+        for organization_name, organization in self.__submissions['organizations'].items():
+            for assignment_name, assignment in (organization.get('submission_history') or dict()).items():
+                assignments.append({'organization': organization_name, 'assignment': assignment_name, 'last_pulled': assignment.get('last_pulled'),
+                                    'num_submissions': len(assignment.get('submissions') or dict())})
+        return assignments
+
+    def delete_assignment(self, organization_name:str, assignment_name:str):
+        with self.__lock:
+            self.__submissions['organizations'][organization_name]['submission_history'].pop(assignment_name, None)
+
+    def to_dict(self) -> dict:
+        return self.__submissions
+
+    def flush(self):
+        with self.__lock:
+            repo_utils.save_submissions(self.__submissions, self.__path)
+
+    def close(self):
+        self.flush()
+
+
+class SqliteSubmissionStore(SubmissionStore):
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS organizations (
+            name TEXT PRIMARY KEY,
+            identifier TEXT
+        );
+        CREATE TABLE IF NOT EXISTS assignments (
+            organization TEXT NOT NULL,
+            assignment TEXT NOT NULL,
+            last_pulled TEXT,
+            PRIMARY KEY (organization, assignment)
+        );
+        CREATE TABLE IF NOT EXISTS submissions (
+            organization TEXT NOT NULL,
+            assignment TEXT NOT NULL,
+            identifier TEXT NOT NULL,
+            num_commits INTEGER NOT NULL DEFAULT 0,
+            commit_hash TEXT,
+            info TEXT,
+            updated_at TEXT,
+            PRIMARY KEY (organization, assignment, identifier)
+        );
+        CREATE TABLE IF NOT EXISTS pull_history (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            organization TEXT NOT NULL,
+            assignment TEXT NOT NULL,
+            identifier TEXT NOT NULL,
+            timestamp_pulled TEXT NOT NULL,
+            num_commits INTEGER,
+            commit_hash TEXT,
+            submitted INTEGER
+        );
+        CREATE INDEX IF NOT EXISTS pull_history_submission ON pull_history (organization, assignment, identifier);
+    """
+
+    def __init__(self, path:str=None, yaml_path:str=None):
+        """Submission store backed by an SQLite database (WAL mode). Every change is committed immediately
+
+        Args:
+            path (str): path of the database (defaults to SUBMISSION_DB)
+            yaml_path (str): yaml submission logs imported once when the database is created (defaults to repo_utils.SUBMISSION_LOGS)
+        """
+        self.__path = path or SUBMISSION_DB
+        created = not os.path.exists(self.__path)
+        # a single connection shared by the clone workers; sqlite3 calls are serialized by the lock
+        self.__connection = sqlite3.connect(self.__path, check_same_thread=False)
+        self.__connection.row_factory = sqlite3.Row
+        self.__lock = threading.Lock()
+        with self.__lock:
+            self.__connection.execute("PRAGMA journal_mode=WAL")
+            self.__connection.execute("PRAGMA synchronous=NORMAL")
+            self.__connection.executescript(self.SCHEMA)
+
+        yaml_path = yaml_path or repo_utils.SUBMISSION_LOGS
+        if created and os.path.exists(yaml_path):
+            self.import_yaml(yaml_path)
+
+    def import_yaml(self, path:str):
+        """Imports the submission logs from a yaml file in the format of `config/submissions.yml`
+
+        Args:
+            path (str): path of the yaml file
+        """
+        submissions_dict = repo_utils.load_submissions(path)
+        with self.__lock, self.__connection:
+            for organization_name, organization in submissions_dict['organizations'].items():
+                self.__connection.execute("INSERT OR REPLACE INTO organizations (name, identifier) VALUES (?, ?)", (organization_name, organization.get('identifier')))
+                for assignment_name, assignment in (organization.get('submission_history') or dict()).items():
+                    self.__connection.execute("INSERT OR REPLACE INTO assignments (organization, assignment, last_pulled) VALUES (?, ?, ?)",
+                                              (organization_name, assignment_name, assignment.get('last_pulled')))
+                    for identifier, submission in (assignment.get('submissions') or dict()).items():
+                        info = {key: value for key, value in submission.items() if key not in ('num_commits', 'commit_hash')}
+                        self.__connection.execute("INSERT OR REPLACE INTO submissions (organization, assignment, identifier, num_commits, commit_hash, info) VALUES (?, ?, ?, ?, ?, ?)",
+                                                  (organization_name, assignment_name, identifier, submission.get('num_commits') or 0, submission.get('commit_hash'), json.dumps(info) if info else None))
+
+    def __execute(self, sql:str, parameters:tuple=()):
+        with self.__lock, self.__connection:
+            return self.__connection.execute(sql, parameters).fetchall()
+
+    @staticmethod
+    def __to_submission(row) -> dict:
+        submission = {'num_commits': row['num_commits'], 'commit_hash': row['commit_hash']}
+        if row['info']: submission.update(json.loads(row['info']))
+        return submission
+
+    def begin_pull(self, organization_name:str, organization_identifier:str, assignment_name:str, timestamp_pulled:str):
+        with self.__lock, self.__connection:
+            self.__connection.execute("INSERT INTO organizations (name, identifier) VALUES (?, ?) ON CONFLICT (name) DO UPDATE SET identifier = excluded.identifier",
+                                      (organization_name, organization_identifier))
+            self.__connection.execute("INSERT INTO assignments (organization, assignment, last_pulled) VALUES (?, ?, ?) ON CONFLICT (organization, assignment) DO UPDATE SET last_pulled = excluded.last_pulled",
+                                      (organization_name, assignment_name, timestamp_pulled))
+
+    def get_submission(self, organization_name:str, assignment_name:str, identifier:str) -> dict:
+        rows = self.__execute("SELECT num_commits, commit_hash, info FROM submissions WHERE organization = ? AND assignment = ? AND identifier = ?",
+                              (organization_name, assignment_name, identifier))
+        return self.__to_submission(rows[0]) if rows else None
+
+    def get_submissions(self, organization_name:str, assignment_name:str) -> dict:
+        rows = self.__execute("SELECT identifier, num_commits, commit_hash, info FROM submissions WHERE organization = ? AND assignment = ?",
+                              (organization_name, assignment_name))
+        return {row['identifier']: self.__to_submission(row) for row in rows}
+
+    def update_submission(self, organization_name:str, assignment_name:str, identifier:str, num_commits:int, commit_hash:str):
+        self.__execute("""INSERT INTO submissions (organization, assignment, identifier, num_commits, commit_hash, updated_at) VALUES (?, ?, ?, ?, ?, ?)
+                          ON CONFLICT (organization, assignment, identifier) DO UPDATE SET num_commits = excluded.num_commits, commit_hash = excluded.commit_hash, updated_at = excluded.updated_at""",
+                       (organization_name, assignment_name, identifier, num_commits, commit_hash, datetime.now().isoformat(timespec='seconds')))
+
+    def update_submission_info(self, organization_name:str, assignment_name:str, identifier:str, **info):
+        with self.__lock, self.__connection:
+            row = self.__connection.execute("SELECT info FROM submissions WHERE organization = ? AND assignment = ? AND identifier = ?",
+                                            (organization_name, assignment_name, identifier)).fetchone()
+            merged = json.loads(row['info']) if row and row['info'] else dict()
+            merged.update(info)
+            self.__connection.execute("""INSERT INTO submissions (organization, assignment, identifier, info, updated_at) VALUES (?, ?, ?, ?, ?)
+                                         ON CONFLICT (organization, assignment, identifier) DO UPDATE SET info = excluded.info, updated_at = excluded.updated_at""",
+                                      (organization_name, assignment_name, identifier, json.dumps(merged), datetime.now().isoformat(timespec='seconds')))
+
+    def record_pull(self, organization_name:str, assignment_name:str, identifier:str, timestamp_pulled:str, num_commits:int, commit_hash:str, submitted:bool):
+        with self.__lock, self.__connection:
+            # a resumed pull records the students the interrupted pull cloned again, the last record of a pull wins
+            self.__connection.execute("DELETE FROM pull_history WHERE organization = ? AND assignment = ? AND identifier = ? AND timestamp_pulled = ?",
+                                      (organization_name, assignment_name, identifier, timestamp_pulled))
+            self.__connection.execute("INSERT INTO pull_history (organization, assignment, identifier, timestamp_pulled, num_commits, commit_hash, submitted) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                      (organization_name, assignment_name, identifier, timestamp_pulled, num_commits, commit_hash, int(submitted)))
+
+    def get_pull_history(self, organization_name:str, assignment_name:str, identifier:str) -> list:
+        """Gets every recorded pull of a student's repository, oldest first
+
+        Returns:
+            list: pulls (dict of `timestamp_pulled`, `num_commits`, `commit_hash` and `submitted`)
+        """
+        rows = self.__execute("SELECT timestamp_pulled, num_commits, commit_hash, submitted FROM pull_history WHERE organization = ? AND assignment = ? AND identifier = ? ORDER BY id",
+                              (organization_name, assignment_name, identifier))
+        return [{**dict(row), 'submitted': bool(row['submitted'])} for row in rows]
+
+    def get_assignments(self) -> list:
+        rows = self.__execute("""SELECT a.organization, a.assignment, a.last_pulled, COUNT(s.identifier) AS num_submissions FROM assignments a
+                                 LEFT JOIN submissions s ON s.organization = a.organization AND s.assignment = a.assignment GROUP BY a.organization, a.assignment""")
+        return [{'organization': row['organization'], 'assignment': row['assignment'], 'last_pulled': row['last_pulled'], 'num_submissions': row['num_submissions']} for row in rows]
+
+    def delete_assignment(self, organization_name:str, assignment_name:str):
+        with self.__lock, self.__connection:
+            for table in ('assignments', 'submissions', 'pull_history'):
+                self.__connection.execute(f"DELETE FROM {table} WHERE organization = ? AND assignment = ?", (organization_name, assignment_name))
+
+    def to_dict(self) -> dict:
+        submissions_dict = {'organizations': dict()}
+        organizations = submissions_dict['organizations']
+        for row in self.__execute("SELECT name, identifier FROM organizations ORDER BY name"):
+            organizations[row['name']] = {'identifier': row['identifier'], 'submission_history': dict()}
+        for row in self.__execute("SELECT organization, assignment, last_pulled FROM assignments ORDER BY organization, assignment"):
+            organizations.setdefault(row['organization'], {'identifier': None, 'submission_history': dict()})
+            organizations[row['organization']]['submission_history'][row['assignment']] = {'last_pulled': row['last_pulled'], 'submissions': dict()}
+        for row in self.__execute("SELECT organization, assignment, identifier, num_commits, commit_hash, info FROM submissions ORDER BY organization, assignment, identifier"):
+            history = organizations.setdefault(row['organization'], {'identifier': None, 'submission_history': dict()})['submission_history']
+            assignment = history.setdefault(row['assignment'], {'last_pulled': None, 'submissions': dict()})
+            assignment['submissions'][row['identifier']] = self.__to_submission(row)
+        return submissions_dict
+
+    def close(self):
+        with self.__lock:
+            self.__connection.close()
+
+
+def open_submission_store(config:dict) -> SubmissionStore:
+    """Opens the submission store selected in the config file (`submission_store: yaml|sqlite`)
+
+    Args:
+        config (dict): parsed config file
+
+    Returns:
+        SubmissionStore: the submission store
+    """
+    backend = (config.get('submission_store') or 'yaml').lower()
+    if backend == 'sqlite': return SqliteSubmissionStore(config.get('submission_db_path') or SUBMISSION_DB)
+    if backend == 'yaml': return YamlSubmissionStore()
+    raise RuntimeError(f"Unknown submission store `{backend}` (expected `yaml` or `sqlite`)")
@@ -1,5 +1,11 @@
 import threading
 import functools
+import itertools
+import queue
+import time
+import logging
+
+logger = logging.getLogger(__name__)
 
 def synchronized(wrapped):
     lock = threading.Lock() # semaphore
@@ -9,4 +15,162 @@ def synchronized(wrapped):
         with lock:
             return wrapped(*args, **kwargs)
         
-    return _wrap
\ No newline at end of file
+    return _wrap
+
+
+class CloneScheduler:
+    """A bounded worker pool that runs clone jobs from a priority queue.
+
+    The number of jobs allowed to run at the same time adapts to the remote: the limit is halved when
+    the recent error rate or clone latency rises, and grows back by one slot after each healthy window
+    (additive increase, multiplicative decrease). The limit never exceeds `max_workers`.
+    """
+
+    def __init__(self, max_workers:int, window:int=10, max_error_rate:float=0.2, latency_factor:float=2.0, min_workers:int=1, on_progress=None, progress_every:int=25):
+        """
+        Args:
+            max_workers (int): Maximum number of concurrent jobs (`max_concurrent_clones` in config.yml)
+            window (int): Number of finished jobs considered when adjusting the concurrency limit
+            max_error_rate (float): Back off when more than this fraction of the window failed
+            latency_factor (float): Back off when the window's mean latency exceeds the baseline by this factor
+            min_workers (int): Lowest concurrency limit to back off to
+            on_progress (callable): Called with `stats()` every `progress_every` finished jobs
+            progress_every (int): How often `on_progress` is called
+        """
+        self.max_workers = max(1, int(max_workers))
+        self.min_workers = max(1, min(int(min_workers), self.max_workers))
+        self.limit = self.max_workers
+        self.__window = max(1, int(window))
+        self.__max_error_rate = max_error_rate
+        self.__latency_factor = latency_factor
+        self.__on_progress = on_progress
+        self.__progress_every = max(1, int(progress_every))
+
+        self.__queue = queue.PriorityQueue()
+        self.__sequence = itertools.count() # keeps FIFO order for jobs with the same priority
+        self.__condition = threading.Condition()
+        self.__workers = []
+        self.__active = 0
+        self.__closed = False
+
+        self.__recent = [] # (latency, failed) of the jobs finished in the current window
+        self.__baseline_latency = None
+        self.__started_at = None
+        self.completed = 0
+        self.failed = 0
+        self.backoffs = 0
+
+    def submit(self, job, priority:int=0):
+        """Queues a job. Jobs with a lower priority value run first
+
+        Args:
+            job (object): Any object with a `run()` method. The job is counted as failed if `run()` raises or returns False
+            priority (int): Priority of the job
+        """
+        self.__queue.put((priority, next(self.__sequence), job))
+
+    def start(self):
+        """Starts the worker threads
+        """
+        self.__started_at = time.monotonic()
+        for i in range(self.max_workers):
+            worker = threading.Thread(target=self.__work, name=f"clone-worker-{i}", daemon=True)
+            self.__workers.append(worker)
+            worker.start()
+
+    def join(self):
+        """Waits until every queued job has finished, then stops the workers
+        """
+        self.__queue.join()
+        with self.__condition:
+            self.__closed = True
+            self.__condition.notify_all()
+        for _ in self.__workers: self.__queue.put((float('inf'), next(self.__sequence), None))
+        for worker in self.__workers: worker.join()
+        self.__workers = []
+
+    def run(self, jobs, priority:int=0):
+        """Convenience method to queue a batch of jobs, run them and wait for them to finish
+
+        Args:
+            jobs (iterable): jobs to run
+            priority (int): priority of every job in the batch
+        """
+        for job in jobs: self.submit(job, priority)
+        self.start()
+        self.join()
+
+    def __work(self):
+        while True:
+            # wait for a free slot under the current concurrency limit before taking a job, so a job queued later with a
+            # higher priority is not held back by workers waiting on lower priority jobs
+            with self.__condition:
+                while self.__active >= self.limit and not self.__closed:
+                    self.__condition.wait()
+                self.__active += 1
+
+            _, _, job = self.__queue.get()
+            if job is None:
+                with self.__condition:
+                    self.__active -= 1
+                    self.__condition.notify_all()
+                self.__queue.task_done()
+                return
+
+            started = time.monotonic()
+            failed = False
+            try: failed = job.run() is False
+            except Exception:
+                # jobs are expected to handle their own errors: log what still gets through instead of losing it
+                logger.exception(f"Unexpected error in clone job {job!r}")
+                failed = True
+            latency = time.monotonic() - started
+
+            with self.__condition:
+                self.__active -= 1
+                self.__record(latency, failed)
+                report = self.__on_progress and self.completed % self.__progress_every == 0
+                self.__condition.notify_all()
+            if report: self.__on_progress(self.stats())
+            self.__queue.task_done()
+
+    def __record(self, latency:float, failed:bool):
+        """Records a finished job and adjusts the concurrency limit once the window is full. Must hold the condition lock
+        """
+        self.completed += 1
+        if failed: self.failed += 1
+        self.__recent.append((latency, failed))
+        if len(self.__recent) < self.__window: return
+
+        latencies = [latency for latency, failed in self.__recent if not failed]
+        error_rate = sum(1 for _, failed in self.__recent if failed) / len(self.__recent)
+        mean_latency = sum(latencies) / len(latencies) if latencies else None
+        self.__recent = []
+
+        if self.__baseline_latency is None and mean_latency is not None and error_rate <= self.__max_error_rate:
+            self.__baseline_latency = mean_latency
+
+        slow = mean_latency is not None and self.__baseline_latency is not None and mean_latency > self.__baseline_latency * self.__latency_factor
+        if error_rate > self.__max_error_rate or slow:
+            self.limit = max(self.min_workers, self.limit // 2)
+            self.backoffs += 1
+        elif self.limit < self.max_workers:
+            self.limit += 1
+
+    def stats(self) -> dict:
+        """Current queue depth, concurrency and throughput
+
+        Returns:
+            dict: scheduler statistics
+        """
+        elapsed = time.monotonic() - self.__started_at if self.__started_at else 0
+        return {
+            'queue_depth': self.__queue.qsize(),
+            'active': self.__active,
+            'limit': self.limit,
+            'completed': self.completed,
+            'failed': self.failed,
+            'backoffs': self.backoffs,
+            'elapsed': elapsed,
+            'throughput': self.completed / elapsed if elapsed else 0.0, # jobs per second
+        }
@@ -0,0 +1,263 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from git import GitCommandError
+import hashlib
+import hmac
+import json
+import logging
+import queue
+import random
+import diffstat
+import github_api
+import repo_utils
+import requests
+import threading
+import time
+
+"""
+Watch mode: keeps the mirror cache of every rostered repository in sync between pulls
+
+The watcher polls the remote HEAD of the watched repositories every `watch_interval` seconds (with jitter, so many watchers
+do not hit GitHub at the same time) and only fetches the mirrors whose HEAD changed. With the GitHub clone url, a poll first
+lists the repositories of the organization that were pushed to since the last poll (newest first, so paging stops at the
+first older repository) and only resolves those, so a poll costs as much as the number of changed repositories rather than
+the size of the roster. Push webhooks (`watch_webhook_port`) fetch a repository as soon as it is pushed to.
+
+The remote HEAD of every fetched repository is merged into the submission store (`remote_head`, `pushed_at`), and the
+organization is marked as watched (see MirrorCache), so a pull only has to materialize the mirrors. Mirrors that could not
+be resolved or fetched are listed in the marker, so pulls still fetch them, and they are resolved again by every poll until
+they are up to date. With `summarize_changes`,
+the diffstat since the stored commit is computed in the mirror right away (see diffstat), so the pull reads it from the cache.
+"""
+
+POLL_CLOCK_SKEW = 60 # seconds subtracted from the last poll when asking GitHub what was pushed since
+
+class SubmissionWatcher:
+    def __init__(self, repositories:dict, mirror_caches:dict, submission_store=None, interval:float=60, jitter:float=0.2,
+                 max_workers:int=8, github_client:github_api.GitHubClient=None, webhook_port:int=None, webhook_secret:str=None, logger:logging.Logger=None,
+                 diffstat_cache:diffstat.DiffstatCache=None):
+        """Watcher that keeps the mirrors of the watched repositories in sync
+
+        Args:
+            repositories (dict): (organization identifier, repository name) -> `organization` (dict from the config file), `assignment`, `identifier` and `clone_url`
+            mirror_caches (dict): organization identifier -> MirrorCache
+            submission_store (SubmissionStore): store updated with the remote HEAD of every fetched repository (students that were pulled before)
+            interval (float): seconds between polls
+            jitter (float): fraction of the interval every poll is randomly moved by
+            max_workers (int): number of repositories resolved or fetched at the same time
+            github_client (GitHubClient): GitHub API client used to list recently pushed repositories (None to resolve every repository with `git ls-remote`)
+            webhook_port (int): port of the push webhook endpoint (None to disable)
+            webhook_secret (str): secret of the webhook, checked against `X-Hub-Signature-256` when set
+            logger (logging.Logger): logger of the watcher
+            diffstat_cache (DiffstatCache): cache the changes of every fetched repository since its stored commit are computed into, so the next pull reads them from it (None to skip)
+        """
+        self.repositories = {key: dict(repository, head=None) for key, repository in repositories.items()}
+        self.mirror_caches = mirror_caches
+        self.submission_store = submission_store
+        self.interval = interval
+        self.jitter = jitter
+        self.max_workers = max(1, max_workers)
+        self.github_client = github_client
+        self.webhook_port = webhook_port
+        self.webhook_secret = webhook_secret
+        self.logger = logger or logging.getLogger(__name__)
+        self.diffstat_cache = diffstat_cache
+        self.polls = 0
+        self.fetched = 0
+        self.__last_poll = None # time of the last successful poll (epoch seconds)
+        self.__stale = set() # mirrored repositories that could not be resolved or fetched
+        self.__pushed = queue.Queue() # repositories reported by the webhook
+        self.__stopped = threading.Event()
+        self.__server = None
+
+    def seed(self):
+        """Reads the HEAD of every existing mirror, so the first poll only fetches repositories that changed since the last run
+        """
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            heads = executor.map(lambda key: self.mirror_caches[key[0]].get_head(key[1]), self.repositories)
+            for key, head in zip(list(self.repositories), heads): self.repositories[key]['head'] = head
+
+    def get_pushed_repositories(self, organization_identifier:str, since:float) -> set:
+        """Lists the repositories of an organization that were pushed to since a time (GitHub API, most recently pushed first)
+
+        Args:
+            organization_identifier (str): GitHub organization identifier
+            since (float): epoch seconds
+
+        Returns:
+            set: names of the pushed repositories, or None if GitHub could not be reached
+        """
+        pushed = set()
+        params = {'sort': 'pushed', 'direction': 'desc', 'per_page': github_api.PER_PAGE, 'page': 1}
+        while True:
+            # the first page is a conditional request: nothing was pushed if GitHub answers 304 Not Modified
+            try: repositories = self.github_client.get(f"orgs/{organization_identifier}/repos", params)
+            except (github_api.GitHubAPIError, requests.RequestException): return None
+            for repository in repositories:
+                if not repository.get('pushed_at'): continue
+                if datetime.strptime(repository['pushed_at'], '%Y-%m-%dT%H:%M:%SZ').replace(tzinfo=timezone.utc).timestamp() < since: return pushed
+                pushed.add(repository['name'])
+            if len(repositories) < params['per_page']: return pushed
+            params['page'] += 1
+
+    def get_poll_candidates(self) -> list:
+        """Gets the repositories whose HEAD has to be resolved by the next poll
+
+        Returns:
+            list: keys of the repositories (every repository on the first poll, or when GitHub cannot list the pushed repositories)
+        """
+        if not self.github_client or self.__last_poll is None: return list(self.repositories)
+        candidates = list(self.__stale)
+        for organization_identifier in {key[0] for key in self.repositories}:
+            pushed = self.get_pushed_repositories(organization_identifier, self.__last_poll - POLL_CLOCK_SKEW)
+            if pushed is None: candidates.extend(key for key in self.repositories if key[0] == organization_identifier)
+            else: candidates.extend(key for key in self.repositories if key[0] == organization_identifier and key[1] in pushed)
+        return list(dict.fromkeys(candidates))
+
+    def poll(self) -> list:
+        """Resolves the remote HEAD of the candidate repositories (`git ls-remote`) and fetches the ones that changed
+
+        Returns:
+            list: keys of the fetched repositories
+        """
+        started = time.time()
+        candidates = self.get_poll_candidates()
+        heads = repo_utils.get_remote_heads({key: self.repositories[key]['clone_url'] for key in candidates}, self.max_workers)
+        changed = [key for key, head in heads.items() if head and head != self.repositories[key]['head']]
+        # repositories without a mirror are cloned by the pull anyway, only existing mirrors can be stale
+        unresolved = {key for key, head in heads.items() if not head and self.repositories[key]['head']}
+        self.__stale = (self.__stale - set(candidates)) | unresolved
+        fetched = self.fetch(changed)
+        self.__last_poll = started
+        self.polls += 1
+        self.mark_watched()
+        self.logger.info(f"Poll {self.polls}: resolved {len(candidates)}/{len(self.repositories)} repositories, fetched {len(fetched)} in {time.time() - started:.1f}s.")
+        return fetched
+
+    def fetch(self, keys:list) -> list:
+        """Fetches repositories into their mirror and records their new HEAD in the submission store
+
+        Returns:
+            list: keys of the repositories that were fetched
+        """
+        if not keys: return []
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            results = list(executor.map(self.__fetch_repository, keys))
+        fetched = [key for key, ok in zip(keys, results) if ok]
+        self.fetched += len(fetched)
+        failed = {key for key, ok in zip(keys, results) if not ok}
+        self.__stale = (self.__stale - set(fetched)) | failed
+        if failed: self.mark_watched(touch=False) # between polls, so pulls do not wait for the next poll to fetch them
+        if self.submission_store: self.submission_store.flush()
+        return fetched
+
+    def mark_watched(self, touch:bool=True):
+        """Marks the mirrors of every organization as up to date, except the stale ones (see MirrorCache.mark_watched)
+        """
+        for organization_identifier, mirror_cache in self.mirror_caches.items():
+            mirror_cache.mark_watched([key[1] for key in self.__stale if key[0] == organization_identifier], touch)
+
+    def __fetch_repository(self, key:tuple) -> bool:
+        repository = self.repositories[key]
+        mirror_cache = self.mirror_caches[key[0]]
+        try: mirror_cache.sync(key[1], repository['clone_url'])
+        except GitCommandError as gce:
+            self.logger.info(f"Could not fetch {key[1]}: {gce.stderr.strip()}")
+            return False
+        repository['head'] = mirror_cache.get_head(key[1])
+        self.logger.info(f"Fetched {key[1]} ({repository['head']})")
+        self.record(repository)
+        return True
+
+    def record(self, repository:dict):
+        """Merges the remote HEAD of a repository into the stored submission of the student (students that were never pulled are left to the first pull)
+        """
+        if not self.submission_store: return
+        organization_name = repository['organization']['name']
+        try: stored = self.submission_store.get_submission(organization_name, repository['assignment'], repository['identifier'])
+        except KeyError: stored = None # assignment that was never pulled (yaml store)
+        if stored is None: return
+        if self.diffstat_cache:
+            # the mirror has both commits, the pull then finds the diffstat of a new submission in the cache
+            mirror_path = self.mirror_caches[repository['organization']['identifier']].get_mirror_path(f"{repository['assignment']}-{repository['identifier']}")
+            diffstat.get_diffstat(mirror_path, stored['commit_hash'], repository['head'], self.diffstat_cache, repository.get('paths'))
+        self.submission_store.update_submission_info(organization_name, repository['assignment'], repository['identifier'],
+                                                     remote_head=repository['head'], pushed_at=datetime.now().isoformat(timespec='seconds'))
+
+    def get_next_poll_delay(self) -> float:
+        return self.interval * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    def push(self, organization_identifier:str, repository_name:str) -> bool:
+        """Queues a pushed repository to be fetched (webhook)
+
+        Returns:
+            bool: whether the repository is watched
+        """
+        key = (organization_identifier, repository_name)
+        if key not in self.repositories: return False
+        self.__pushed.put(key)
+        return True
+
+    def __get_pushed(self, timeout:float) -> list:
+        """Waits for pushed repositories until the timeout, then drains the queue so pushes that arrive together are fetched together
+        """
+        try: keys = [self.__pushed.get(timeout=max(0, timeout))]
+        except queue.Empty: return []
+        while True:
+            try: keys.append(self.__pushed.get_nowait())
+            except queue.Empty: return list(dict.fromkeys(keys))
+
+    def start_webhook(self) -> int:
+        """Starts the push webhook endpoint in a background thread
+
+        Returns:
+            int: port the endpoint listens on
+        """
+        self.__server = ThreadingHTTPServer(('', self.webhook_port), WebhookHandler)
+        self.__server.watcher = self
+        self.webhook_port = self.__server.server_address[1] # when port 0 picked a free port
+        threading.Thread(target=self.__server.serve_forever, daemon=True).start()
+        return self.webhook_port
+
+    def run(self):
+        """Polls and fetches until `stop` is called (or Ctrl+C)
+        """
+        self.seed()
+        if self.webhook_port is not None: self.logger.info(f"Listening for push webhooks on port {self.start_webhook()}.")
+        try:
+            while not self.__stopped.is_set():
+                self.poll()
+                next_poll = time.monotonic() + self.get_next_poll_delay()
+                while not self.__stopped.is_set() and time.monotonic() < next_poll:
+                    self.fetch(self.__get_pushed(min(1, next_poll - time.monotonic())))
+        finally:
+            if self.__server: self.__server.shutdown()
+
+    def stop(self):
+        self.__stopped.set()
+
+
+class WebhookHandler(BaseHTTPRequestHandler):
+    """GitHub push webhook endpoint (`POST /` with the `push` event payload)
+    """
+    def do_POST(self):
+        watcher = self.server.watcher
+        body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        if watcher.webhook_secret:
+            signature = 'sha256=' + hmac.new(watcher.webhook_secret.encode(), body, hashlib.sha256).hexdigest()
+            if not hmac.compare_digest(signature, self.headers.get('X-Hub-Signature-256') or ''): return self.__respond(401)
+        if self.headers.get('X-GitHub-Event', 'push') != 'push': return self.__respond(204) # i.e. ping
+        try:
+            repository = json.loads(body)['repository']
+            watched = watcher.push(repository['owner']['login'], repository['name'])
+        except (ValueError, KeyError, TypeError): return self.__respond(400)
+        self.__respond(202 if watched else 204)
+
+    def __respond(self, status:int):
+        self.send_response(status)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        self.server.watcher.logger.debug(f"Webhook: {format % args}")